@@ -0,0 +1,146 @@
+from timeit import default_timer as timer
+
+import subprocess
+import platform
+import datetime
+import json
+import os
+
+# Folder of the benchmark histories, relative to the repository root
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def measure(setup, repeat=5):
+	"""Time a benchmark. The setup function is called before every repetition and
+	returns the function to time, which returns the number of performed operations.
+
+	Parameters
+	----------
+		setup : callable
+			build the benchmark state and return the function to time
+		repeat : int
+			number of repetitions
+
+	Returns
+	-------
+		dict
+			number of operations, best and median wall time of a repetition and best
+			time per operation in nanoseconds
+
+	"""
+	times = []
+	for i in range(repeat):
+		run = setup()
+		t0 = timer()
+		ops = run()
+		times.append(timer() - t0)
+	times.sort()
+	return {
+		'ops':ops,
+		'best':times[0],
+		'median':times[len(times)//2],
+		'ns_per_op':1e9*times[0]/max(ops, 1)
+	}
+
+
+def gitCommit():
+	"""Identify the benchmarked code.
+
+	Returns
+	-------
+		str
+			current git commit, None if it cannot be determined
+
+	"""
+	try:
+		return subprocess.check_output(
+			['git', 'rev-parse', '--short', 'HEAD'],
+			stderr = open(os.devnull, 'w')
+		).strip().decode()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+
+def loadHistory(name):
+	"""Load the history of a benchmark suite.
+
+	Parameters
+	----------
+		name : str
+			benchmark suite name
+
+	Returns
+	-------
+		list
+			previous runs, the oldest first
+
+	"""
+	path = os.path.join(RESULTS, name + '.json')
+	if not os.path.exists(path):
+		return []
+	with open(path) as f:
+		return json.load(f)
+
+
+def saveRun(name, results, **info):
+	"""Append a run to the history of a benchmark suite.
+
+	Parameters
+	----------
+		name : str
+			benchmark suite name
+		results : dict
+			the keys are the benchmark names, the values their measures
+		info : dict
+			additional run metadata
+
+	Returns
+	-------
+		dict
+			the saved run
+
+	"""
+	run = {
+		'date':datetime.datetime.now().isoformat(),
+		'commit':gitCommit(),
+		'python':platform.python_version(),
+		'machine':platform.node(),
+		'results':results
+	}
+	run.update(info)
+	history = loadHistory(name)
+	history.append(run)
+	if not os.path.exists(RESULTS):
+		os.makedirs(RESULTS)
+	with open(os.path.join(RESULTS, name + '.json'), 'w') as f:
+		json.dump(history, f, indent=1, sort_keys=True)
+	return run
+
+
+def compare(previous, results, key='ns_per_op'):
+	"""Compare the results of a run with a previous one.
+
+	Parameters
+	----------
+		previous : dict
+			previous run, None if there is no previous run
+		results : dict
+			the keys are the benchmark names, the values their measures
+		key : str
+			compared measure
+
+	Returns
+	-------
+		dict
+			the keys are the benchmark names, the values the relative change of the
+			measure. None if the benchmark is not in the previous run
+
+	"""
+	change = {}
+	for name in results:
+		if previous is None or name not in previous['results']:
+			change[name] = None
+		else:
+			old = previous['results'][name][key]
+			change[name] = (results[name][key] - old)/old if old else None
+	return change
@@ -0,0 +1,349 @@
+from timeit import default_timer as timer
+
+import subprocess
+import argparse
+import tempfile
+import resource
+import shutil
+import json
+import time
+import sys
+import os
+
+import numpy as np
+
+from benchmark import RESULTS, saveRun
+
+# Repository root, where static.py and dynamic.py are
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Swept values. Each parameter is swept with the others at their base value, the
+# first value of each list
+SWEEP = {
+	'conv':[1e-4, 1e-3, 1e-2, 1e-1],
+	'servers':[15, 50, 150],
+	'simtime':[21600, 86400, 259200]
+}
+
+# Measures compared with the baseline and their default relative tolerances. The
+# simulations are seeded, so any change of the processed events is a change of the
+# simulated behaviour rather than a performance regression
+TOLERANCE = {
+	'wall':.25,
+	'rss':.15,
+	'events':0.
+}
+
+
+def child(kind, exp, conv, servers, simtime):
+	"""Run static.py or dynamic.py with the provided parameters and print the measures
+	as JSON. The lib.config values are overridden before the simulator modules are
+	imported, so all of them see the new values. The simulation runs in a temporary
+	folder and its output is discarded.
+
+	Parameters
+	----------
+		kind : str
+			'static' or 'dynamic'
+		exp : int
+			simulation scenario
+		conv : float
+			percentage of the daily internet users using the CDN
+		servers : int
+			number of deployed servers per country of the dynamic simulator
+		simtime : int
+			seconds of simulation
+
+	"""
+	sys.path.insert(0, ROOT)
+	import lib.config as config
+	import simpy
+
+	config.CONV = conv
+	config.DAILY_USERS = {
+		u:int(config.POPULATION[u]*conv) for u in config.POPULATION
+	}
+	config.SIMTIME = simtime
+	config.SERVERS_DYN = {u:servers for u in config.COUNTRY}
+	config.START_ACTIVE = {
+		u:min(config.START_ACTIVE[u], servers) for u in config.COUNTRY
+	}
+	config.MIN_ACTIVE = {
+		u:min(config.MIN_ACTIVE[u], servers) for u in config.COUNTRY
+	}
+
+	events = [0]
+	step = simpy.core.Environment.step
+	def countedStep(env):
+		events[0] += 1
+		step(env)
+	simpy.core.Environment.step = countedStep
+
+	script = os.path.join(ROOT, '{}.py'.format(kind))
+	cwd = os.getcwd()
+	tmp = tempfile.mkdtemp()
+	os.mkdir(os.path.join(tmp, 'output'))
+	os.chdir(tmp)
+	stdout = sys.stdout
+	sys.stdout = open(os.devnull, 'w')
+	sys.argv = [script, str(exp)]
+	namespace = {'__name__':'__main__', '__file__':script}
+	try:
+		t0 = timer()
+		execfile(script, namespace)
+		wall = timer() - t0
+	finally:
+		sys.stdout = stdout
+		os.chdir(cwd)
+		shutil.rmtree(tmp)
+
+	now = namespace['env'].now
+	print json.dumps({
+		'wall':wall,
+		'rss':resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.,
+		'events':events[0],
+		'simtime':now,
+		'speed':now/wall
+	})
+
+
+def spawn(kind, exp, params, timeout):
+	"""Run a simulation in a new interpreter, so the peak memory of each run is measured
+	separately.
+
+	Parameters
+	----------
+		kind : str
+			'static' or 'dynamic'
+		exp : int
+			simulation scenario
+		params : dict
+			values of the swept parameters
+		timeout : float
+			wall time after which the run is killed, in seconds
+
+	Returns
+	-------
+		dict
+			measures of the run, None if it was killed or it failed
+
+	"""
+	cmd = [
+		sys.executable, os.path.abspath(__file__), '--child', kind, str(exp),
+		repr(params['conv']), str(params['servers']), str(params['simtime'])
+	]
+	proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+	t0 = timer()
+	while proc.poll() is None:
+		if timer() - t0 > timeout:
+			proc.kill()
+			proc.wait()
+			return None
+		time.sleep(.05)
+	out = proc.stdout.read().strip()
+	if proc.returncode != 0 or not out:
+		return None
+	return json.loads(out.splitlines()[-1])
+
+
+def runName(kind, exp, params):
+	"""Name of a run, used as key in the histories and in the baseline.
+
+	"""
+	return "{}0{} conv={:g} servers={} simtime={}".format(
+		kind, exp, params['conv'], params['servers'], params['simtime']
+	)
+
+
+def fitScaling(points):
+	"""Fit a power law y = a*x^b through the measures of a sweep.
+
+	Parameters
+	----------
+		points : list
+			(x, y) pairs, at least two of them with distinct x
+
+	Returns
+	-------
+		float
+			exponent b, None if it cannot be fitted
+
+	"""
+	points = [(x, y) for x, y in points if x > 0 and y > 0]
+	if len(set(x for x, y in points)) < 2:
+		return None
+	x, y = np.log(np.array(points)).T
+	return float(np.polyfit(x, y, 1)[0])
+
+
+def regressions(baseline, results, tolerance):
+	"""Compare the results with a baseline.
+
+	Parameters
+	----------
+		baseline : dict
+			the keys are the run names, the values their measures
+		results : dict
+			the keys are the run names, the values their measures
+		tolerance : dict
+			maximum relative increase of each measure
+
+	Returns
+	-------
+		list
+			(run, measure, baseline value, new value) of the regressions
+
+	"""
+	found = []
+	for name in sorted(results):
+		old = baseline.get(name)
+		new = results[name]
+		if old is None:
+			continue
+		if new is None:
+			found.append((name, 'timeout', 'ok', 'killed'))
+			continue
+		for key, tol in sorted(tolerance.items()):
+			if key == 'events':
+				changed = abs(new[key] - old[key]) > tol*old[key]
+			else:
+				changed = new[key] > (1 + tol)*old[key]
+			if changed:
+				found.append((name, key, old[key], new[key]))
+	return found
+
+
+if __name__ == '__main__':
+	if len(sys.argv) == 7 and sys.argv[1] == '--child':
+		child(
+			sys.argv[2],
+			int(sys.argv[3]),
+			float(sys.argv[4]),
+			int(sys.argv[5]),
+			int(sys.argv[6])
+		)
+		exit()
+
+	parser = argparse.ArgumentParser(
+		description="""End-to-end scaling benchmark. static.py and dynamic.py are run
+		while sweeping the converted population (CONV), the number of deployed servers
+		per country of the dynamic simulator (SERVERS_DYN) and the simulated horizon
+		(SIMTIME), one parameter at a time. Wall time, peak RSS, processed events and
+		simulation speed are recorded for each run, a power law is fitted through each
+		sweep and the results are compared with the stored baseline."""
+	)
+	parser.add_argument('--kind', nargs='+', default=['static', 'dynamic'],
+		choices=['static', 'dynamic'], help='simulators to run')
+	parser.add_argument('--exp', type=int, default=1, help='simulation scenario')
+	for key in ('conv', 'servers', 'simtime'):
+		parser.add_argument('--' + key, nargs='+',
+			type=float if key == 'conv' else int, default=SWEEP[key],
+			help='swept values, the first one is the base value')
+	parser.add_argument('--timeout', type=float, default=600,
+		help='wall time budget of a run in seconds. Larger values of a sweep are \
+		skipped once a run exceeds it')
+	for key in sorted(TOLERANCE):
+		parser.add_argument('--tol-' + key, type=float, default=TOLERANCE[key],
+			help='relative tolerance of the {} regressions'.format(key))
+	parser.add_argument('--baseline', default=os.path.join(RESULTS, 'macro_baseline.json'),
+		help='baseline file')
+	parser.add_argument('--save-baseline', action='store_true',
+		help='store the results as the new baseline')
+	args = parser.parse_args()
+
+	sweep = {
+		'conv':sorted(args.conv),
+		'servers':sorted(args.servers),
+		'simtime':sorted(args.simtime)
+	}
+	base = {
+		'conv':args.conv[0],
+		'servers':args.servers[0],
+		'simtime':args.simtime[0]
+	}
+	tolerance = {key:getattr(args, 'tol_' + key) for key in TOLERANCE}
+
+	results = {}
+	fits = []
+	print "{:<50}{:>10}{:>10}{:>12}{:>12}{:>12}".format(
+		'run', 'wall [s]', 'rss [MB]', 'events', 'events/s', 'sim s/s'
+	)
+	for kind in args.kind:
+		for key in ('conv', 'servers', 'simtime'):
+			# the number of deployed servers does not affect the static simulator
+			if kind == 'static' and key == 'servers':
+				continue
+			points = {'wall':[], 'rss':[], 'events':[]}
+			killed = False
+			for value in sweep[key]:
+				params = dict(base)
+				params[key] = value
+				name = runName(kind, args.exp, params)
+				if name in results:
+					res = results[name]
+				elif killed:
+					res = None
+				else:
+					res = spawn(kind, args.exp, params, args.timeout)
+					results[name] = res
+					if res is None:
+						print "{:<50}{:>10}".format(name, 'killed')
+					else:
+						print "{:<50}{:>10.2f}{:>10.1f}{:>12}{:>12.0f}{:>12.1f}".format(
+							name,
+							res['wall'],
+							res['rss'],
+							res['events'],
+							res['events']/res['wall'],
+							res['speed']
+						)
+					sys.stdout.flush()
+				if res is None:
+					killed = True
+					continue
+				for measure in points:
+					points[measure].append((value, res[measure]))
+			fits.append((kind, key, {m:fitScaling(points[m]) for m in points}))
+
+	print
+	print "Scaling exponents, measure ~ parameter^b"
+	print "{:<10}{:<10}{:>10}{:>10}{:>10}".format('kind', 'param', 'wall', 'rss', 'events')
+	for kind, key, fit in fits:
+		print "{:<10}{:<10}{:>10}{:>10}{:>10}".format(kind, key, *[
+			'-' if fit[m] is None else '{:.2f}'.format(fit[m])
+			for m in ('wall', 'rss', 'events')
+		])
+
+	print
+	for kind in args.kind:
+		usable = [
+			c for c in sweep['conv']
+			if results.get(runName(kind, args.exp, dict(base, conv=c))) is not None
+		]
+		print "{}: largest CONV within {:.0f} s: {}".format(
+			kind, args.timeout, '{:g}'.format(max(usable)) if usable else 'none'
+		)
+
+	saveRun('macro', results, timeout=args.timeout)
+
+	status = 0
+	if os.path.exists(args.baseline):
+		with open(args.baseline) as f:
+			found = regressions(json.load(f), results, tolerance)
+		print
+		if found:
+			print "Regressions against {}".format(args.baseline)
+			for name, key, old, new in found:
+				print "{:<50}{:>10}: {} -> {}".format(name, key, old, new)
+			status = 1
+		else:
+			print "No regressions against {}".format(args.baseline)
+
+	if args.save_baseline:
+		if not os.path.exists(os.path.dirname(args.baseline)):
+			os.makedirs(os.path.dirname(args.baseline))
+		with open(args.baseline, 'w') as f:
+			json.dump(results, f, indent=1, sort_keys=True)
+		print "Baseline saved to {}".format(args.baseline)
+
+	exit(status)
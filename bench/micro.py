@@ -0,0 +1,379 @@
+import subprocess
+import tempfile
+import shutil
+import sys
+import os
+
+# Repository root, where static.py and dynamic.py are
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import simpy
+
+import lib.network_static as network_static
+import lib.network_dynamic as network_dynamic
+from lib import client_static, client_dynamic
+from lib import server_static, server_dynamic
+from lib import stats_static, stats_dynamic
+from lib.scenario import Scenario
+from lib.policy import POLICIES, get
+from lib.config import *
+
+from benchmark import measure, loadHistory, saveRun, compare
+
+# Number of servers per country of the synthetic racks
+RACKS = [1, 15, 100]
+
+# Number of concurrent clients of the routing benchmarks
+N_CLIENTS = 100
+
+# Number of requests of the server benchmarks and calls of the method benchmarks
+N_OPS = 20000
+
+# Simulated seconds of the arrival benchmarks
+ARRIVAL_TIME = 4*3600
+
+# Number of intervals saved by the dataframe benchmarks, i.e. one simulated day
+N_INTERVALS = 72
+
+# Number of interpreters started by the cold start benchmarks
+N_STARTS = 5
+
+# Cold start budget in seconds, i.e. interpreter start up and imports of a run
+STARTUP_BUDGET = .3
+
+# Modules which must not be loaded when the simulator starts
+HEAVY_MODULES = ['pandas', 'matplotlib']
+
+
+def scenario():
+	"""New scenario with the lib.config values. Its random number generators start from
+	the seed, so every repetition draws the same numbers.
+
+	"""
+	return Scenario(VERBOSE=False)
+
+
+def makeRack(kind, n_srv, sc, exp=1):
+	"""Build a rack with the same number of servers in each country. The dynamic servers
+	are all active.
+
+	Parameters
+	----------
+		kind : str
+			'static' or 'dynamic'
+		n_srv : int
+			number of servers per country
+		sc : Scenario
+			simulation configuration
+		exp : int
+			wake up strategy of the dynamic servers
+
+	Returns
+	-------
+		dict
+			the keys are the countries, the values are the servers rack
+
+	"""
+	rack = {}
+	cnt = 0
+	for u in COUNTRY:
+		rack[u] = []
+		for i in range(n_srv):
+			cnt += 1
+			if kind == 'static':
+				rack[u].append(server_static.Server(u, cnt, sc))
+			else:
+				rack[u].append(server_dynamic.Server(u, cnt, exp, sc))
+	if kind == 'dynamic':
+		for u in COUNTRY:
+			for server in rack[u]:
+				server.server_list = rack
+				server.in_idle = False
+	return rack
+
+
+def serverProcess(kind):
+	"""Serve N_OPS requests with a single local server. A new request is sent every
+	10 ms, so a few requests are served concurrently.
+
+	"""
+	def setup():
+		sc = scenario()
+		env = simpy.Environment()
+		server = makeRack(kind, 1, sc)['China'][0]
+		sizes = [sc.random.uniform(MIN_REQ, MAX_REQ) for i in range(N_OPS)]
+
+		def send():
+			for size in sizes:
+				env.process(server.process(size, env, 'China'))
+				yield env.timeout(.01)
+
+		def run():
+			env.process(send())
+			env.run()
+			return N_OPS
+		return run
+	return setup
+
+
+def clientRouting(kind, n_srv):
+	"""Serve the sessions of N_CLIENTS clients starting together. Every request sorts the
+	local rack, so the cost depends on the rack size.
+
+	"""
+	def setup():
+		sc = scenario()
+		env = simpy.Environment()
+		rack = makeRack(kind, n_srv, sc)
+		if kind == 'static':
+			stat = stats_static.Stats(sc)
+			clients = [
+				client_static.Client(env, COUNTRY[i%5], i, rack, stat, 1, scenario=sc)
+				for i in range(N_CLIENTS)
+			]
+		else:
+			stat = stats_dynamic.Stats(sc)
+			clients = [
+				client_dynamic.Client(env, COUNTRY[i%5], i, rack, stat, scenario=sc)
+				for i in range(N_CLIENTS)
+			]
+		n_req = sum(cl.k for cl in clients)
+
+		def run():
+			env.run()
+			return n_req
+		return run
+	return setup
+
+
+def wakeUp(exp, n_srv):
+	"""Call Server.wakeUp with every server active, the worst case in which all the
+	racks are scanned.
+
+	"""
+	def setup():
+		server = makeRack('dynamic', n_srv, scenario(), exp)['China'][0]
+
+		def run():
+			for i in range(N_OPS):
+				server.wakeUp('Brazil')
+			return N_OPS
+		return run
+	return setup
+
+
+def policyDeploy(exp, n_srv):
+	"""Call Policy.deploy, as a static client does when all the servers are busy.
+
+	"""
+	def setup():
+		sc = scenario()
+		rack = makeRack('static', n_srv, sc)
+		strategy = get(exp, sc)
+
+		def run():
+			for i in range(N_OPS):
+				strategy.deploy('Brazil', rack)
+			return N_OPS
+		return run
+	return setup
+
+
+def plannerPlace(exp, n_srv):
+	"""Call Planner.place, as a static client does when all the servers are busy.
+
+	"""
+	def setup():
+		sc = scenario()
+		rack = makeRack('static', n_srv, sc)
+		planner = get(exp, sc).planner(rack)
+
+		def run():
+			for i in range(N_OPS):
+				planner.place('Brazil')
+			return N_OPS
+		return run
+	return setup
+
+
+def minActiveServ(n_srv):
+	"""Call Server.minActiveServ, which counts the active local servers.
+
+	"""
+	def setup():
+		server = makeRack('dynamic', n_srv, scenario())['China'][0]
+
+		def run():
+			for i in range(N_OPS):
+				server.minActiveServ()
+			return N_OPS
+		return run
+	return setup
+
+
+def networkArrival(kind):
+	"""Generate the Chinese arrivals of ARRIVAL_TIME simulated seconds. The clients are
+	replaced by a stub, so only the arrival rate computation and the inter-arrival
+	timeouts are measured.
+
+	"""
+	module = network_static if kind == 'static' else network_dynamic
+	arrivals = []
+
+	class Stub:
+		def __init__(self, env, key, cl_id, rack, stat, *args, **kwargs):
+			self.rack_list = rack
+			arrivals.append(cl_id)
+
+	def setup():
+		sc = scenario()
+		del arrivals[:]
+		env = simpy.Environment()
+		if kind == 'static':
+			net = module.Network(stats_static.Stats(sc), sc)
+			gen = net.arrival(env, DAILY_USERS['China'], 'China', 1)
+		else:
+			net = module.Network(stats_dynamic.Stats(sc), 1, sc)
+			gen = net.arrival(env, DAILY_USERS['China'], 'China')
+
+		def run():
+			client = module.Client
+			module.Client = Stub
+			try:
+				env.process(gen)
+				env.run(until=ARRIVAL_TIME)
+			finally:
+				module.Client = client
+			return len(arrivals)
+		return run
+	return setup
+
+
+def createDF(kind):
+	"""Save N_INTERVALS rows with Stats.createDF. The file is written in a temporary
+	folder.
+
+	"""
+	def setup():
+		sc = scenario()
+		rack = makeRack(kind, 1, sc)
+		if kind == 'static':
+			stat = stats_static.Stats(sc)
+		else:
+			stat = stats_dynamic.Stats(sc)
+
+		def run():
+			cwd = os.getcwd()
+			tmp = tempfile.mkdtemp()
+			os.mkdir(os.path.join(tmp, 'output'))
+			os.chdir(tmp)
+			try:
+				for i in range(N_INTERVALS):
+					if kind == 'static':
+						stat.createDF(str(i), 1., 100., 1., stat.nServers(rack), 1)
+					else:
+						stat.createDF(str(i), 1., 100., 1., 1, 1, 1, 1, 1, 5, 1)
+			finally:
+				os.chdir(cwd)
+				shutil.rmtree(tmp)
+			return N_INTERVALS
+		return run
+	return setup
+
+
+def coldStart(args):
+	"""Start N_STARTS new interpreters with the provided arguments.
+
+	"""
+	def setup():
+		def run():
+			with open(os.devnull, 'w') as devnull:
+				for i in range(N_STARTS):
+					subprocess.check_call([sys.executable] + args, stdout=devnull, cwd=ROOT)
+			return N_STARTS
+		return run
+	return setup
+
+
+def importCheck(kind):
+	"""Arguments of an interpreter importing the modules of a simulator run. The
+	interpreter fails if a heavy module is loaded.
+
+	"""
+	return ['-c', "import sys, simpy, lib.network_{0}, lib.stats_{0}, lib.trace, "
+		"lib.profiler; assert not set({1}) & set(sys.modules)".format(kind, HEAVY_MODULES)]
+
+
+# Benchmark names and setup functions
+BENCHMARKS = [
+	('server.process.static', serverProcess('static')),
+	('server.process.dynamic', serverProcess('dynamic'))
+]
+for n in RACKS:
+	BENCHMARKS.append(('client.routing.static[n={}]'.format(n), clientRouting('static', n)))
+	BENCHMARKS.append(('client.routing.dynamic[n={}]'.format(n), clientRouting('dynamic', n)))
+for n in RACKS:
+	# every registered strategy, so custom policies are compared side by side
+	for exp in sorted(POLICIES):
+		BENCHMARKS.append(('server.wakeUp.exp{}[n={}]'.format(exp, n), wakeUp(exp, n)))
+		BENCHMARKS.append(('policy.deploy.exp{}[n={}]'.format(exp, n), policyDeploy(exp, n)))
+		BENCHMARKS.append(('planner.place.exp{}[n={}]'.format(exp, n), plannerPlace(exp, n)))
+	BENCHMARKS.append(('server.minActiveServ[n={}]'.format(n), minActiveServ(n)))
+BENCHMARKS += [
+	('network.arrival.static', networkArrival('static')),
+	('network.arrival.dynamic', networkArrival('dynamic')),
+	('stats.createDF.static', createDF('static')),
+	('stats.createDF.dynamic', createDF('dynamic')),
+	('startup.static.usage', coldStart(['static.py'])),
+	('startup.dynamic.usage', coldStart(['dynamic.py'])),
+	('startup.static.import', coldStart(importCheck('static'))),
+	('startup.dynamic.import', coldStart(importCheck('dynamic')))
+]
+
+
+if __name__ == '__main__':
+	if '-h' in sys.argv or '--help' in sys.argv:
+		print "usage: python bench/micro.py [<benchmark> ...]"
+		print """
+Run the microbenchmarks of the simulator hot paths, or only the ones whose name
+contains one of the provided strings. The results are appended to
+bench/results/micro.json and compared with the previous run.
+		"""
+		exit()
+
+	# latest measure of each benchmark, so partial runs are compared too
+	previous = {'results':{}}
+	for run in loadHistory('micro'):
+		previous['results'].update(run['results'])
+	selected = [
+		(name, setup) for name, setup in BENCHMARKS
+		if len(sys.argv) == 1 or any(s in name for s in sys.argv[1:])
+	]
+
+	results = {}
+	print "{:<34}{:>10}{:>12}{:>14}{:>10}".format(
+		'benchmark', 'ops', 'best [ms]', 'ns/op', 'change'
+	)
+	for name, setup in selected:
+		results[name] = measure(setup)
+		change = compare(previous, {name:results[name]})[name]
+		print "{:<34}{:>10}{:>12.2f}{:>14.0f}{:>10}".format(
+			name,
+			results[name]['ops'],
+			1e3*results[name]['best'],
+			results[name]['ns_per_op'],
+			'' if change is None else '{:+.1%}'.format(change)
+		)
+		sys.stdout.flush()
+
+	saveRun('micro', results)
+
+	over = [
+		name for name in results
+		if name.startswith('startup.') and results[name]['ns_per_op'] > 1e9*STARTUP_BUDGET
+	]
+	for name in sorted(over):
+		print "{} is over the {:.0f} ms cold start budget".format(name, 1e3*STARTUP_BUDGET)
+	if over:
+		exit(1)
@@ -1,40 +1,160 @@
-import matplotlib.pyplot as plt
-import numpy as np
-import simpy
-import math
 import sys
-import os
 
-from lib.network_dynamic import Network
-from lib.stats_dynamic import Stats
-from lib.config import*
+# The --profile, --cprofile, --steady, --hybrid, --live, --quiet, --db=<path> and
+# --prometheus=<port> options can be placed anywhere
+args = [a for a in sys.argv[1:] if a not in (
+	'--profile', '--cprofile', '--steady', '--hybrid', '--live', '--quiet'
+) and not a.startswith(('--db=', '--prometheus='))]
+profile = '--profile' in sys.argv
+cprofile = '--cprofile' in sys.argv
+steady = '--steady' in sys.argv
+hybrid = '--hybrid' in sys.argv
+live = '--live' in sys.argv
+quiet = '--quiet' in sys.argv
+port = ([a[13:] for a in sys.argv[1:] if a.startswith('--prometheus=')] or [None])[-1]
+database = ([a[5:] for a in sys.argv[1:] if a.startswith('--db=')] or [None])[-1]
 
-env = simpy.Environment()
-stat = Stats()
-
-if len(sys.argv)!=2:
-	print "usage: python dynamic.py <exp>"
+if len(args) not in (1, 2) or (hybrid and len(args) == 2) or (profile and cprofile):
+	print "usage: python dynamic.py <exp> [<trace>] [--profile] [--steady] [--hybrid] [--live]"
+	print "\t[--cprofile] [--quiet] [--db=<path>] [--prometheus=<port>]"
 	print """
 Dynamic server allocation. Three simulation scenarios (exp):
 1 - Servers are woken up with respect to the distance
 2 - Servers are woken up with respect to the minimum cost
-3 - Servers are woken up with respect to the maximum people	
+3 - Servers are woken up with respect to the maximum people
+
+The synthetic workload is replaced by a request log if a trace is provided. The log
+is either a binary trace or a .csv file with 'time,region,session,size' columns.
+The --profile option times the simulator hot paths. A per-phase breakdown is printed
+at the end of the run. The --cprofile option runs the simulation under cProfile and
+saves its dump in the output folder. The two options cannot be combined, as cProfile
+would slow down the timed phases.
+The --steady option deletes the initial transient, estimates the steady-state means
+with batch-means confidence intervals of whole days and stops the run once they reach
+the target precision (STEADY_* parameters in lib/config.py).
+The --hybrid option advances the low-traffic hours with a fluid approximation and
+simulates the others event by event (HYBRID_* parameters in lib/config.py). It
+cannot be combined with a trace.
+The --db option records the run, its parameters and its dataframe in a SQLite
+database (created if missing), which several runs can share.
+The --live option publishes the progress of the run in shared memory, where
+monitor.py shows it together with the other live runs.
+The --prometheus option serves the gauges and counters of the run in the Prometheus
+text format at http://127.0.0.1:<port>/metrics. The --quiet option suppresses the
+statistics printed at every acquisition.
 	"""
 	exit()
 else:
+	# The simulator is imported after the arguments check, so the usage message is
+	# printed without loading NumPy and SimPy
+	import simpy
+
+	from lib.network_dynamic import Network
+	from lib.client_dynamic import Client
+	from lib.server_dynamic import Server
+	from lib.profiler import Profiler
+	from lib.trace import TraceReader
+	from lib.stats_dynamic import Stats
+	from lib.convergence import Convergence
+	from lib.scenario import Scenario
+	from lib.hybrid import Hybrid
+
+	# The simulation parameters are the lib.config ones
+	sc = Scenario(VERBOSE=False) if quiet else Scenario()
+	env = simpy.Environment()
+	stat = Stats(sc)
+	exp = int(args[0])
+	if profile:
+		prof = Profiler()
+		prof.attach(env, {
+			'Network':Network, 
+			'Client':Client, 
+			'Server':Server, 
+			'Stats':Stats
+		})
+	
 	# CDN initialization
-	net = Network(stat, int(sys.argv[1]))
+	net = Network(stat, exp, sc)
+
+	if len(args) == 2:
+		# Replay the request log
+		env.process(net.replay(env, TraceReader(args[1], scenario=sc)))
+	elif hybrid:
+		# Switch between the fluid and the discrete-event engines
+		engine = Hybrid(net, 'dynamic', exp)
+		engine.start(env)
+	else:
+		# Define a process for each country
+		for u in sc.COUNTRY:
+			env.process(net.arrival(
+				env, 
+				sc.DAILY_USERS[u], 
+				u
+			))
 
-	# Define a process for each country
-	for u in COUNTRY:
-		env.process(net.arrival(
-			env, 
-			DAILY_USERS[u], 
-			u
-		))
+	if steady:
+		analysis = Convergence(
+			sc.STEADY_METRICS,
+			sc.STEADY_PRECISION,
+			sc.STEADY_CONFIDENCE,
+			sc.STEADY_BATCHES,
+			sc.STEADY_MIN_ROWS,
+			period = 24*60//sc.INTERACQ if sc.STEADY_DAILY else 1
+		)
+		until = analysis.attach(env, stat, sc.SIMTIME)
+	else:
+		until = sc.SIMTIME
+	if database is not None:
+		from lib.database import Database
+		db = Database(database, sc.DB_BATCH, sc.DB_TIMEOUT)
+		run = db.begin(sc, 'dynamic', exp)
+		stat.listeners.append(db.listener(run))
+	if live:
+		from lib.metrics import Publisher
+		publisher = Publisher("dynamic {} seed {}".format(exp, sc.SEED), sc)
+		publisher.attach(env, stat)
+	if port is not None:
+		from lib.exporter import Exporter
+		exporter = Exporter(net, 'dynamic', exp, int(port))
+		exporter.attach(env)
 
 	# Sart simulation
-	print ("0{}:00:00 - Simulation Started".format(START))
-	env.run(until=SIMTIME)
+	print ("0{}:00:00 - Simulation Started".format(sc.START))
+	if profile:
+		prof.begin()
+	if cprofile:
+		import cProfile
+		cprof = cProfile.Profile()
+		cprof.enable()
+	try:
+		env.run(until=until)
+	finally:
+		# the run is closed in the database even if the simulation raises or is
+		# interrupted
+		if cprofile:
+			cprof.disable()
+		if profile:
+			prof.end()
+		if live:
+			publisher.close()
+		if port is not None:
+			exporter.close()
+		if database is not None:
+			db.end(run)
+			db.close()
 	# Simulation ended
 	print "Simulation Ended"
+	if database is not None:
+		print "run {} recorded in {}".format(run, database)
+	if steady:
+		print analysis.report()
+	if hybrid:
+		print engine.report()
+	
+	if profile:
+		breakdown = prof.report(env)
+		print breakdown
+		with open("output/profile_dynamic0{}.txt".format(exp), "w") as f:
+			f.write(breakdown + "\n")
+	if cprofile:
+		cprof.dump_stats("output/profile_dynamic0{}.prof".format(exp))
@@ -0,0 +1,34 @@
+import time
+import sys
+
+from lib.generator import TraceGenerator
+from lib.trace import TraceWriter
+
+if len(sys.argv) not in (2, 4):
+	print "usage: python generate.py <trace> [<sizes> <sessions>]"
+	print """
+Generate a synthetic binary request log covering SIMTIME seconds. The log can be
+replayed by both simulators: python static.py <exp> <trace>
+Request sizes (sizes) and session lengths (sessions) distributions:
+uniform - sizes in [MIN_REQ, MAX_REQ], sessions of [10, 100] requests (default)
+pareto  - bounded Pareto distributions with shape TAIL_ALPHA
+	"""
+	exit()
+else:
+	if len(sys.argv) == 4:
+		gen = TraceGenerator(sys.argv[2], sys.argv[3])
+	else:
+		gen = TraceGenerator()
+	writer = TraceWriter(sys.argv[1])
+
+	start = time.time()
+	n_req = gen.generate(writer)
+	writer.close()
+	elapsed = time.time() - start
+
+	print "{} sessions, {} requests written to {}".format(
+		gen.n_sess,
+		n_req,
+		sys.argv[1]
+	)
+	print "{:.2f} s - {:.0f} requests/s".format(elapsed, n_req/max(elapsed, 1e-9))
@@ -0,0 +1,307 @@
+import math
+import re
+import os
+
+import numpy as np
+
+from lib.convergence import tQuantile
+
+# Columns of the global metrics, and of the metrics given for each country too, with
+# the '{}.' prefix. The active servers are 'act.s.' in the dynamic dataframe and
+# 'servers' in the static one, both are loaded as 'servers'. The session time quantile
+# is only in the dataframes of the runs with a SESSION_QUANTILE
+METRICS = ['avg.sess.time', 'q.sess.time', 'local.req', 'tot.cost', 'servers', 'cl']
+COUNTRY_METRICS = ['servers', 'cl']
+RENAME = {'tot.act.s.':'servers', 'tot.servers':'servers', 'tot.cl':'cl'}
+
+# Strategy of a dataframe, from the name of its .csv file
+PATTERN = re.compile(r'2_(static|dynamic)0(\d+)')
+
+
+def column(name):
+	"""Name of a dataframe column in the aggregated runs.
+
+	Parameters
+	----------
+		name : str
+			column of a static or dynamic dataframe
+
+	Returns
+	-------
+		str
+			aggregated column, e.g. 'servers' or 'China.servers', None if the column
+			is not aggregated
+
+	"""
+	if name in RENAME:
+		return RENAME[name]
+	if name in METRICS:
+		return name
+	country, sep, metric = name.partition('.')
+	if metric == 'act.s.':
+		metric = 'servers'
+	if sep and metric in COUNTRY_METRICS:
+		return "{}.{}".format(country, metric)
+	return None
+
+
+def strategy(path):
+	"""Strategy of a .csv dataframe, e.g. 'static 1' for output/2_static01.csv.
+
+	Parameters
+	----------
+		path : str
+			path of the .csv file
+
+	Returns
+	-------
+		str
+			strategy label, the file name if it does not follow the simulators naming
+
+	"""
+	match = PATTERN.search(os.path.basename(path))
+	if match is None:
+		return os.path.splitext(os.path.basename(path))[0]
+	return "{} {}".format(match.group(1), int(match.group(2)))
+
+
+def stack(runs):
+	"""Align the runs on the interval index. Each run is a dictionary of columns, the
+	shorter runs and the missing columns are padded with NaN.
+
+	Parameters
+	----------
+		runs : list
+			the runs of a strategy, each one a dictionary of 1D arrays
+
+	Returns
+	-------
+		dict
+			the keys are the columns, the values are (runs, intervals) arrays
+
+	"""
+	length = max(len(col) for run in runs for col in run.values())
+	names = set(name for run in runs for name in run)
+	group = {}
+	for name in names:
+		values = np.full((len(runs), length), np.nan)
+		for i, run in enumerate(runs):
+			if name in run:
+				values[i, :len(run[name])] = run[name]
+		group[name] = values
+	return group
+
+
+def loadCSV(paths):
+	"""Load the .csv dataframes of many runs, grouped by strategy. The dataframes of a
+	strategy are the files with the same name in different folders, e.g. the output
+	folders of the runs of a sweep.
+
+	Parameters
+	----------
+		paths : list
+			paths of the .csv files
+
+	Returns
+	-------
+		dict
+			the keys are the strategies, the values are the aligned columns of their
+			runs, as returned by stack()
+
+	"""
+	# imported here to keep the start up fast when only databases are read
+	import pandas as pd
+	runs = {}
+	for path in paths:
+		df = pd.read_csv(path, index_col=0)
+		run = {}
+		for name in df.columns:
+			agg = column(name)
+			if agg is not None:
+				run[agg] = df[name].values.astype(np.float64)
+		runs.setdefault(strategy(path), []).append(run)
+	return dict((label, stack(runs[label])) for label in runs)
+
+
+def loadDatabase(path):
+	"""Load all the runs of a lib.database file, grouped by strategy, with a single query.
+
+	Parameters
+	----------
+		path : str
+			path of the database
+
+	Returns
+	-------
+		dict
+			the keys are the strategies, the values are the aligned columns of their
+			runs, as returned by stack()
+
+	"""
+	import sqlite3
+	conn = sqlite3.connect(path)
+	try:
+		records = conn.execute(
+			"SELECT r.kind || ' ' || r.exp, m.run, m.row, m.name, m.value "
+			"FROM metrics m JOIN runs r ON r.id = m.run"
+		).fetchall()
+	finally:
+		conn.close()
+	if not records:
+		return {}
+	labels, run_ids, rows, names, values = zip(*records)
+	labels = np.array(labels)
+	run_ids = np.array(run_ids)
+	rows = np.array(rows)
+	values = np.array(values, dtype=np.float64)
+	agg_names = dict((name, column(name)) for name in set(names))
+	names = np.array([agg_names[name] or '' for name in names])
+
+	groups = {}
+	for label in np.unique(labels):
+		sel = labels == label
+		ids, run_idx = np.unique(run_ids[sel], return_inverse=True)
+		# position of each record among the runs of the strategy
+		pos = np.zeros(len(labels), dtype=np.int64)
+		pos[sel] = run_idx
+		length = rows[sel].max() + 1
+		group = {}
+		for name in np.unique(names[sel]):
+			if not name:
+				continue
+			cell = sel & (names == name)
+			col = np.full((len(ids), length), np.nan)
+			col[pos[cell], rows[cell]] = values[cell]
+			group[str(name)] = col
+		groups[str(label)] = group
+	return groups
+
+
+def summarize(groups, confidence, quantiles):
+	"""Aggregates of each strategy and column. The mean and its confidence interval are
+	computed over the runs, from the mean of each run over its intervals, the quantiles
+	over all the intervals of all the runs.
+
+	Parameters
+	----------
+		groups : dict
+			aligned columns of each strategy
+		confidence : float
+			confidence level of the intervals
+		quantiles : list
+			probabilities of the quantiles
+
+	Returns
+	-------
+		list
+			dictionaries with 'strategy', 'metric', 'runs', 'mean', 'ci' (half-width,
+			NaN with a single run) and a 'q<p>' key for each quantile, by strategy
+			and metric
+
+	"""
+	summary = []
+	for label in sorted(groups):
+		for name in sorted(groups[label], key=lambda n:('.' in n and n not in METRICS, n)):
+			values = groups[label][name]
+			means = np.nanmean(values, axis=1)
+			means = means[~np.isnan(means)]
+			n = len(means)
+			if n == 0:
+				continue
+			half = float('nan')
+			if n > 1:
+				half = tQuantile((1 + confidence)/2, n - 1)*means.std(ddof=1)/math.sqrt(n)
+			res = {
+				'strategy':label,
+				'metric':name,
+				'runs':n,
+				'mean':means.mean(),
+				'ci':half
+			}
+			flat = values[~np.isnan(values)]
+			for p, q in zip(quantiles, np.percentile(flat, [100*p for p in quantiles])):
+				res['q{:g}'.format(p)] = q
+			summary.append(res)
+	return summary
+
+
+def table(summary, quantiles):
+	"""Text table of the aggregates.
+
+	Parameters
+	----------
+		summary : list
+			aggregates, as returned by summarize()
+		quantiles : list
+			probabilities of the quantiles
+
+	Returns
+	-------
+		str
+			one line per strategy and metric
+
+	"""
+	keys = ['q{:g}'.format(p) for p in quantiles]
+	lines = ["{:<16}{:<18}{:>6}{:>12}{:>11}".format(
+		'strategy', 'metric', 'runs', 'mean', '+/-'
+	) + "".join("{:>11}".format(key) for key in keys)]
+	for res in summary:
+		lines.append("{:<16}{:<18}{:>6}{:>12.4f}{:>11.4f}".format(
+			res['strategy'], res['metric'], res['runs'], res['mean'], res['ci']
+		) + "".join("{:>11.4f}".format(res[key]) for key in keys))
+	return "\n".join(lines)
+
+
+def plot(groups, names, confidence, folder):
+	"""Plot the mean of the runs of each strategy per interval, with its confidence
+	band. A .png figure per metric is saved, the metrics of no strategy are skipped.
+
+	Parameters
+	----------
+		groups : dict
+			aligned columns of each strategy
+		names : list
+			metrics to plot
+		confidence : float
+			confidence level of the bands
+		folder : str
+			folder of the figures
+
+	Returns
+	-------
+		list
+			paths of the saved figures
+
+	"""
+	import matplotlib
+	matplotlib.use('Agg')
+	import matplotlib.pyplot as plt
+
+	saved = []
+	for name in names:
+		if not any(name in groups[label] for label in groups):
+			continue
+		fig, ax = plt.subplots()
+		for label in sorted(groups):
+			if name not in groups[label]:
+				continue
+			values = groups[label][name]
+			n = (~np.isnan(values)).sum(axis=0)
+			mean = np.nanmean(values, axis=0)
+			x = np.arange(len(mean))
+			ax.plot(x, mean, label=label)
+			if values.shape[0] > 1:
+				std = np.nanstd(values, axis=0, ddof=1)
+				half = np.array([
+					tQuantile((1 + confidence)/2, k - 1)*s/math.sqrt(k) if k > 1 else 0.
+					for k, s in zip(n, std)
+				])
+				ax.fill_between(x, mean - half, mean + half, alpha=.25)
+		ax.set_xlabel('interval')
+		ax.set_ylabel(name)
+		ax.legend()
+		path = os.path.join(folder, "report_{}.png".format(name.replace('.', '_').strip('_')))
+		fig.savefig(path)
+		plt.close(fig)
+		saved.append(path)
+	return saved
@@ -0,0 +1,510 @@
+from array import array
+
+import numpy as np
+
+import lib.config as config
+
+
+class Catalog:
+	"""Catalog of the objects requested by the clients. The object popularity follows a
+	Zipf distribution: the object of rank i is requested with probability proportional
+	to 1/i^ZIPF_ALPHA. Object sizes are uniformly distributed in [MIN_REQ, MAX_REQ].
+	All the data is stored in NumPy arrays shared by the whole CDN, and the requested
+	objects are drawn in batches, so large catalogs stay cheap in memory and time.
+
+	Parameters
+	----------
+		n_obj : int
+			number of objects in the catalog
+		alpha : float
+			exponent of the Zipf popularity
+		seed : int
+			seed of the random number generator
+		min_req : float
+			minimum object size in bits
+		max_req : float
+			maximum object size in bits
+
+	Attributes
+	----------
+		n_obj : int
+			number of objects in the catalog
+		cdf : numpy.ndarray
+			cumulative popularity of the objects sorted by rank
+		size : numpy.ndarray
+			object sizes in bits
+		rng : numpy.random.RandomState
+			random number generator
+		batch : list
+			objects drawn in advance, the last one is returned first
+
+	Methods
+	-------
+		sample()
+			draw a requested object
+
+	"""
+	def __init__(self, n_obj=config.CATALOG_SIZE, alpha=config.ZIPF_ALPHA, seed=config.SEED,
+			min_req=config.MIN_REQ, max_req=config.MAX_REQ):
+		self.n_obj = n_obj
+		self.rng = np.random.RandomState(seed)
+
+		self.cdf = np.cumsum(np.arange(1, n_obj + 1, dtype=np.float64)**-alpha)
+		self.cdf /= self.cdf[-1]
+		self.size = self.rng.uniform(min_req, max_req, n_obj).astype(np.float32)
+		self.batch = []
+
+
+	def sample(self):
+		"""Draw a requested object according to the Zipf popularity.
+
+		Returns
+		-------
+			int
+				object identification number, i.e. its popularity rank
+
+		"""
+		if not self.batch:
+			u = self.rng.random_sample(1 << 16)
+			self.batch = np.searchsorted(self.cdf, u, side='right').tolist()
+		return self.batch.pop()
+
+
+class Cache:
+	"""Base class of the object caches. A cache stores up to 'size' objects in fixed
+	slots. The slots are linked in doubly linked lists whose links are kept in compact
+	arrays shared by all the lists of the cache, so every list operation is O(1) and
+	no object is allocated per cached entry apart from the index entry.
+	Each policy defines its lists (e.g. recency or frequency queues, ghost queues) and
+	implements the access() method.
+
+	Parameters
+	----------
+		size : int
+			number of cached objects
+		n_slots : int
+			number of slots, ghost entries included
+
+	Attributes
+	----------
+		size : int
+			number of cached objects
+		index : dict
+			the keys are the objects, the values are their slots
+		key : array.array
+			object stored in each slot
+		prev : array.array
+			previous slot in the list, towards the most recent entry
+		next : array.array
+			next slot in the list, towards the least recent entry
+		where : array.array
+			list each slot belongs to
+		head : dict
+			most recent slot of each list
+		tail : dict
+			least recent slot of each list
+		length : dict
+			number of slots of each list
+		free : array.array
+			stack of the unused slots
+		hits : int
+			number of hits
+		lookups : int
+			number of lookups
+
+	Methods
+	-------
+		lookup(obj)
+			look up an object and update the hit counters
+		access(obj)
+			look up an object and update the cache state
+		push(l, s)
+			insert a slot at the head of a list
+		remove(s)
+			remove a slot from its list
+		pop(l)
+			remove the least recent slot of a list
+		alloc(obj)
+			store an object in a free slot
+		release(s)
+			forget the object stored in a slot
+
+	"""
+	def __init__(self, size, n_slots):
+		self.size = size
+		self.index = {}
+		self.key = array('i', [-1])*n_slots
+		self.prev = array('i', [-1])*n_slots
+		self.next = array('i', [-1])*n_slots
+		self.where = array('i', [-1])*n_slots
+		self.free = array('i', range(n_slots - 1, -1, -1))
+		self.head = {}
+		self.tail = {}
+		self.length = {}
+		self.hits = 0
+		self.lookups = 0
+
+
+	def lookup(self, obj):
+		"""Look up an object and update the hit counters.
+
+		Parameters
+		----------
+			obj : int
+				object identification number
+
+		Returns
+		-------
+			bool
+				True if the object was cached, False otherwise
+
+		"""
+		self.lookups += 1
+		if self.access(obj):
+			self.hits += 1
+			return True
+		return False
+
+
+	def access(self, obj):
+		raise NotImplementedError
+
+
+	def push(self, l, s):
+		"""Insert a slot at the head of a list.
+
+		Parameters
+		----------
+			l : int
+				list identification number
+			s : int
+				slot
+
+		"""
+		head = self.head.get(l, -1)
+		self.prev[s] = -1
+		self.next[s] = head
+		if head != -1:
+			self.prev[head] = s
+		else:
+			self.tail[l] = s
+		self.head[l] = s
+		self.where[s] = l
+		self.length[l] = self.length.get(l, 0) + 1
+
+
+	def remove(self, s):
+		"""Remove a slot from its list.
+
+		Parameters
+		----------
+			s : int
+				slot
+
+		"""
+		l = self.where[s]
+		prev = self.prev[s]
+		nxt = self.next[s]
+		if prev != -1:
+			self.next[prev] = nxt
+		else:
+			self.head[l] = nxt
+		if nxt != -1:
+			self.prev[nxt] = prev
+		else:
+			self.tail[l] = prev
+		self.where[s] = -1
+		self.length[l] -= 1
+
+
+	def pop(self, l):
+		"""Remove the least recent slot of a list.
+
+		Parameters
+		----------
+			l : int
+				list identification number
+
+		Returns
+		-------
+			int
+				removed slot
+
+		"""
+		s = self.tail[l]
+		self.remove(s)
+		return s
+
+
+	def alloc(self, obj):
+		"""Store an object in a free slot.
+
+		Parameters
+		----------
+			obj : int
+				object identification number
+
+		Returns
+		-------
+			int
+				slot of the object
+
+		"""
+		s = self.free.pop()
+		self.key[s] = obj
+		self.index[obj] = s
+		return s
+
+
+	def release(self, s):
+		"""Forget the object stored in a slot. The slot must not belong to any list.
+
+		Parameters
+		----------
+			s : int
+				slot
+
+		"""
+		del self.index[self.key[s]]
+		self.key[s] = -1
+		self.free.append(s)
+
+
+class LRUCache(Cache):
+	"""Least Recently Used cache. A single recency list is kept, a hit moves the object
+	to its head and a miss evicts its tail.
+
+	"""
+	def __init__(self, size):
+		Cache.__init__(self, size, size)
+
+
+	def access(self, obj):
+		s = self.index.get(obj)
+		if s is not None:
+			self.remove(s)
+			self.push(0, s)
+			return True
+
+		if len(self.index) >= self.size:
+			self.release(self.pop(0))
+		self.push(0, self.alloc(obj))
+		return False
+
+
+class LFUCache(Cache):
+	"""Least Frequently Used cache. There is a recency list for each access frequency
+	and the minimum frequency is tracked, so both hits and evictions are O(1). Ties are
+	broken by recency.
+
+	Attributes
+	----------
+		freq : array.array
+			access frequency of the object in each slot
+		min_freq : int
+			minimum access frequency among the cached objects
+
+	"""
+	def __init__(self, size):
+		Cache.__init__(self, size, size)
+		self.freq = array('i', [0])*size
+		self.min_freq = 0
+
+
+	def access(self, obj):
+		s = self.index.get(obj)
+		if s is not None:
+			f = self.freq[s]
+			self.remove(s)
+			if self.drop(f) and f == self.min_freq:
+				self.min_freq = f + 1
+			self.freq[s] = f + 1
+			self.push(f + 1, s)
+			return True
+
+		if len(self.index) >= self.size:
+			self.release(self.pop(self.min_freq))
+			self.drop(self.min_freq)
+		s = self.alloc(obj)
+		self.freq[s] = 1
+		self.push(1, s)
+		self.min_freq = 1
+		return False
+
+
+	def drop(self, f):
+		"""Forget the list of a frequency if it is empty, so the number of lists does not
+		grow with the access counts.
+
+		Parameters
+		----------
+			f : int
+				access frequency
+
+		Returns
+		-------
+			bool
+				True if the list was empty, False otherwise
+
+		"""
+		if self.length[f] > 0:
+			return False
+		del self.length[f], self.head[f], self.tail[f]
+		return True
+
+
+class ARCCache(Cache):
+	"""Adaptive Replacement Cache. The resident objects are split between T1 (seen once
+	recently) and T2 (seen at least twice), whose evicted keys are remembered in the
+	ghost lists B1 and B2. Ghost hits adapt the target size p of T1.
+
+	Attributes
+	----------
+		p : float
+			target size of the T1 list
+
+	"""
+	T1, T2, B1, B2 = 0, 1, 2, 3
+
+	def __init__(self, size):
+		Cache.__init__(self, size, 2*size)
+		for l in (self.T1, self.T2, self.B1, self.B2):
+			self.length[l] = 0
+		self.p = 0.
+
+
+	def access(self, obj):
+		T1, T2, B1, B2 = self.T1, self.T2, self.B1, self.B2
+		c = self.size
+		s = self.index.get(obj)
+
+		if s is not None:
+			l = self.where[s]
+			if l == T1 or l == T2:
+				self.remove(s)
+				self.push(T2, s)
+				return True
+
+			# ghost hit: adapt the target and bring the object back in T2
+			if l == B1:
+				self.p = min(c, self.p + max(self.length[B2]/float(self.length[B1]), 1))
+			else:
+				self.p = max(0, self.p - max(self.length[B1]/float(self.length[B2]), 1))
+			self.remove(s)
+			self.replace(l == B2)
+			self.push(T2, s)
+			return False
+
+		l1 = self.length[T1] + self.length[B1]
+		total = l1 + self.length[T2] + self.length[B2]
+		if l1 == c:
+			if self.length[T1] < c:
+				self.release(self.pop(B1))
+				self.replace(False)
+			else:
+				self.release(self.pop(T1))
+		elif total >= c:
+			if total == 2*c:
+				self.release(self.pop(B2))
+			self.replace(False)
+		self.push(T1, self.alloc(obj))
+		return False
+
+
+	def replace(self, in_b2):
+		"""Evict a resident object to the tail of the ghost lists.
+
+		Parameters
+		----------
+			in_b2 : bool
+				True if the requested object was found in B2
+
+		"""
+		t1 = self.length[self.T1]
+		if t1 > 0 and (t1 > self.p or (in_b2 and t1 == self.p)):
+			self.push(self.B1, self.pop(self.T1))
+		elif self.length[self.T2] > 0:
+			self.push(self.B2, self.pop(self.T2))
+		else:
+			self.push(self.B1, self.pop(self.T1))
+
+
+class S3FIFOCache(Cache):
+	"""S3-FIFO cache. New objects enter a small FIFO queue S holding 10% of the cache;
+	objects accessed more than once while in S are promoted to the main FIFO queue M, the others
+	are evicted and their keys are kept in the ghost queue G. Objects found in G enter M
+	directly. M evicts with a 2 bits clock: an object with a positive frequency is
+	reinserted with a decreased frequency.
+
+	Attributes
+	----------
+		freq : array.array
+			access frequency of the object in each slot, capped to 3
+		small : int
+			capacity of the small queue
+
+	"""
+	S, M, G = 0, 1, 2
+
+	def __init__(self, size):
+		Cache.__init__(self, size, 2*size)
+		for l in (self.S, self.M, self.G):
+			self.length[l] = 0
+		self.freq = array('i', [0])*(2*size)
+		self.small = max(1, size//10)
+
+
+	def access(self, obj):
+		s = self.index.get(obj)
+		if s is not None:
+			if self.where[s] != self.G:
+				self.freq[s] = min(self.freq[s] + 1, 3)
+				return True
+			# ghost hit, the entry leaves G before any eviction
+			self.remove(s)
+
+		while self.length[self.S] + self.length[self.M] >= self.size:
+			self.evict()
+
+		if s is not None:
+			self.freq[s] = 0
+			self.push(self.M, s)
+		else:
+			s = self.alloc(obj)
+			self.freq[s] = 0
+			self.push(self.S, s)
+		return False
+
+
+	def evict(self):
+		"""Evict an object from the small queue if it is over its capacity, from the main
+		queue otherwise.
+
+		"""
+		if self.length[self.S] >= self.small or self.length[self.M] == 0:
+			s = self.pop(self.S)
+			if self.freq[s] > 1:
+				self.freq[s] = 0
+				self.push(self.M, s)
+			else:
+				if self.length[self.G] >= self.size - self.small:
+					self.release(self.pop(self.G))
+				self.push(self.G, s)
+		else:
+			while True:
+				s = self.pop(self.M)
+				if self.freq[s] > 0:
+					self.freq[s] -= 1
+					self.push(self.M, s)
+				else:
+					self.release(s)
+					break
+
+
+# Cache policies selectable with the CACHE_POLICY parameter of the lib.config file
+CACHES = {
+	'lru': LRUCache,
+	'lfu': LFUCache,
+	'arc': ARCCache,
+	's3fifo': S3FIFOCache
+}
@@ -0,0 +1,529 @@
+from multiprocessing import Pool
+
+import json
+import os
+
+from lib.scenario import Scenario, simulate
+from lib.optimizer import Abort
+from lib.database import parameters, configHash, encode
+
+# Rack sizes searched by the planner. START_ACTIVE follows them, so it is part of the
+# configuration of a candidate too
+SEARCHED = ['SERVERS_DYN', 'START_ACTIVE', 'MIN_ACTIVE']
+
+# Parameters which do not change the outcome of a run, left out of the cache context
+NEUTRAL = ['VERBOSE', 'SESSION_QUANTILE', 'SERVERS_STA']
+NEUTRAL_PREFIXES = ('PLAN_', 'OPT_', 'DB_', 'METRICS_', 'REPORT_')
+
+
+class Violation(Abort):
+	"""Abort of a run as soon as an interval violates the SLA, i.e. the session time
+	quantile of the interval exceeds the target. The first intervals are the warm up of
+	the CDN and are not checked. It has the interface of the Convergence class, so it
+	is given to simulate() as the output analysis of the run.
+
+	Parameters
+	----------
+		limit : float
+			maximum session time quantile in seconds
+		warmup : int
+			number of intervals which are not checked
+
+	Attributes
+	----------
+		worst : float
+			largest quantile of the checked intervals
+
+	"""
+	def __init__(self, limit, warmup):
+		Abort.__init__(self, limit, 1., warmup + 1)
+		self.worst = 0.
+
+
+	def update(self, row):
+		"""Collect a row and abort the run if its session time quantile is over the limit.
+
+		Parameters
+		----------
+			row : dict
+				new dataframe row
+
+		"""
+		self.rows += 1
+		if self.rows < self.min_rows or self.done.triggered:
+			return
+		self.worst = max(self.worst, row['q.sess.time'])
+		if self.worst > self.limit:
+			self.aborted = True
+			self.done.succeed()
+
+
+def evaluate(job):
+	"""Simulate a candidate rack sizing until the end or the first interval violating
+	the SLA. Module level function, so it can be run by the worker processes.
+
+	Parameters
+	----------
+		job : tuple
+			candidate id, lib.config overrides, exp, hybrid flag, SLA parameters
+			(limit, warmup) and path of the database recording the run
+
+	Returns
+	-------
+		dict
+			'id', 'feasible', 'worst' (largest quantile of the checked intervals),
+			'rows' and 'cost' (mean total cost per hour)
+
+	"""
+	cand_id, values, exp, hybrid, sla, database = job
+	sc = Scenario(**values)
+	check = Violation(*sla)
+	res = simulate(sc, 'dynamic', exp, convergence=check, hybrid=hybrid, database=database)
+	rows = len(res['time'])
+	return {
+		'id':cand_id,
+		'feasible':not check.aborted,
+		'worst':check.worst,
+		'rows':rows,
+		'cost':float(res['tot.cost'].mean()) if rows else float('inf')
+	}
+
+
+def dominates(a, b):
+	"""True if the rack sizing a has at least the servers of b in every rack."""
+	return all(a[key] >= b[key] for key in b)
+
+
+class Outcomes:
+	"""Outcomes of the simulated rack sizings, kept in a JSON file and shared by the
+	searches of the same scenario. An outcome is the largest session time quantile of
+	the checked intervals and whether the run reached its end, so it answers any
+	target: a complete run under the target is feasible, a run with an interval over
+	the target is not. The answer extends to the sizings it dominates: more servers
+	in every rack than a feasible sizing are feasible, fewer servers than an infeasible
+	one are infeasible.
+
+	Parameters
+	----------
+		path : str
+			path of the JSON file, None to keep the outcomes in memory only
+		context : str
+			hash of the parameters of the scenario, apart from the searched ones
+
+	Attributes
+	----------
+		path : str
+			path of the JSON file
+		context : str
+			hash of the scenario
+		entries : list
+			outcomes of the scenario: dictionaries with 'point', 'worst' and 'complete'
+		others : list
+			outcomes of the other scenarios found in the file, written back unchanged
+
+	Methods
+	-------
+		lookup(point, target)
+			feasibility of a rack sizing known from the previous runs
+		add(point, worst, complete)
+			record the outcome of a run
+		save()
+			write the outcomes to the JSON file
+
+	"""
+	def __init__(self, path, context):
+		self.path = path
+		self.context = context
+		self.entries = []
+		self.others = []
+		if path is not None and os.path.exists(path):
+			with open(path) as f:
+				for entry in json.load(f):
+					if entry['context'] == context:
+						self.entries.append(entry)
+					else:
+						self.others.append(entry)
+
+
+	def lookup(self, point, target):
+		"""Feasibility of a rack sizing known from the previous runs.
+
+		Parameters
+		----------
+			point : dict
+				number of servers of each searched rack
+			target : float
+				maximum session time quantile in seconds
+
+		Returns
+		-------
+			bool
+				True if feasible, False if infeasible, None if unknown
+
+		"""
+		for entry in self.entries:
+			if entry['complete'] and entry['worst'] <= target and dominates(point, entry['point']):
+				return True
+			if entry['worst'] > target and dominates(entry['point'], point):
+				return False
+		return None
+
+
+	def add(self, point, worst, complete):
+		"""Record the outcome of a run.
+
+		Parameters
+		----------
+			point : dict
+				number of servers of each searched rack
+			worst : float
+				largest session time quantile of the checked intervals
+			complete : bool
+				True if the run reached its end
+
+		"""
+		self.entries.append({
+			'context':self.context,
+			'point':point,
+			'worst':worst,
+			'complete':complete
+		})
+
+
+	def save(self):
+		"""Write the outcomes to the JSON file, through a temporary file so a reader never
+		finds it half written."""
+		if self.path is None:
+			return
+		tmp = self.path + '.tmp'
+		with open(tmp, 'w') as f:
+			json.dump(self.others + self.entries, f)
+		os.rename(tmp, self.path)
+
+
+class CapacityPlanner:
+	"""Search of the fewest servers per country of the dynamic CDN keeping the
+	PLAN_QUANTILE quantile of the session time of every interval under a target.
+	SERVERS_DYN is searched first, then MIN_ACTIVE with the racks found.
+	The static CDN is not supported: it deploys a new server whenever all of them are
+	busy, so its initial rack size does not bound the servers it uses.
+	The countries are bisected in parallel, each one with the other racks kept at
+	their current size, and the reductions of a round are then verified together.
+	As the countries share their servers, the reductions can fail together: the
+	largest one alone is kept then, which falls back to a coordinate descent. The
+	failed sizes remain lower bounds, as the other racks only shrink.
+	A candidate is aborted at the first interval over the target, and the outcomes of
+	the runs are reused, so a later search with another target or from another
+	starting sizing only simulates the sizings it cannot deduce.
+
+	Parameters
+	----------
+		scenario : Scenario
+			configuration, the search starts from its rack sizes
+		exp : int
+			wake up strategy identification number
+		target : float
+			maximum session time quantile in seconds, PLAN_TARGET if None
+		workers : int
+			number of worker processes
+		hybrid : bool
+			True to simulate the candidates with the hybrid fluid/discrete-event engine
+		database : str
+			path of a lib.database SQLite file where the runs are recorded, None to
+			record nothing
+
+	Attributes
+	----------
+		sc : Scenario
+			configuration
+		target : float
+			maximum session time quantile in seconds
+		outcomes : Outcomes
+			outcomes of the runs of the scenario
+		trials : list
+			rack sizings checked by the search, with their feasibility and whether
+			they were simulated
+		best : dict
+			fewest servers of each rack found, None if even PLAN_MAX servers violate
+			the target
+
+	Methods
+	-------
+		start()
+			rack sizing of the scenario
+		normalize(point)
+			rack sizing with START_ACTIVE and MIN_ACTIVE within the racks
+		overrides(point)
+			lib.config overrides of a rack sizing
+		check(points)
+			feasibility of rack sizings
+		bound(point, keys)
+			grow racks until the target is met
+		descend(point, keys)
+			shrink racks by parallel bisection
+		run()
+			run the search
+		report()
+			summary of the search
+
+	"""
+	def __init__(self, scenario, exp=1, target=None, workers=None, hybrid=False,
+			database=None):
+		self.sc = scenario
+		self.exp = exp
+		self.target = scenario.PLAN_TARGET if target is None else target
+		self.workers = workers
+		self.hybrid = hybrid
+		self.database = database
+		self.trials = []
+		self.best = None
+		self.pool = None
+
+		params = dict(
+			(key, value) for key, value in parameters(scenario).items()
+			if key not in SEARCHED and key not in NEUTRAL
+			and not key.startswith(NEUTRAL_PREFIXES)
+		)
+		params['kind'] = encode('dynamic')
+		params['exp'] = encode(exp)
+		params['hybrid'] = encode(hybrid)
+		params['quantile'] = encode(scenario.PLAN_QUANTILE)
+		params['warmup'] = encode(scenario.PLAN_WARMUP)
+		self.outcomes = Outcomes(scenario.PLAN_CACHE, configHash(params))
+
+
+	def start(self):
+		"""Rack sizing of the scenario.
+
+		Returns
+		-------
+			dict
+				number of servers of each searched rack, e.g. 'SERVERS_DYN.China'
+
+		"""
+		point = {}
+		for name in SEARCHED:
+			for u in self.sc.COUNTRY:
+				point["{}.{}".format(name, u)] = getattr(self.sc, name)[u]
+		return self.normalize(point)
+
+
+	def normalize(self, point):
+		"""Rack sizing with MIN_ACTIVE within the deployed servers and START_ACTIVE
+		between them.
+
+		Parameters
+		----------
+			point : dict
+				number of servers of each searched rack
+
+		Returns
+		-------
+			dict
+				normalized copy of the sizing
+
+		"""
+		point = dict(point)
+		for u in self.sc.COUNTRY:
+			deployed = point['SERVERS_DYN.' + u]
+			point['MIN_ACTIVE.' + u] = min(point['MIN_ACTIVE.' + u], deployed)
+			point['START_ACTIVE.' + u] = min(
+				max(point['START_ACTIVE.' + u], point['MIN_ACTIVE.' + u]), deployed
+			)
+		return point
+
+
+	def overrides(self, point):
+		"""lib.config overrides of a rack sizing.
+
+		Parameters
+		----------
+			point : dict
+				number of servers of each searched rack
+
+		Returns
+		-------
+			dict
+				overrides of the scenario, with the sizing and the session time quantile
+
+		"""
+		values = dict(
+			(key, value) for key, value in self.sc.values.items() if key not in SEARCHED
+		)
+		for key, n in point.items():
+			name, sep, u = key.partition('.')
+			values.setdefault(name, {})[u] = n
+		values['SESSION_QUANTILE'] = self.sc.PLAN_QUANTILE
+		values['VERBOSE'] = False
+		return values
+
+
+	def check(self, points):
+		"""Feasibility of rack sizings. The sizings deduced from the previous outcomes are
+		not simulated, the others are simulated in parallel.
+
+		Parameters
+		----------
+			points : list
+				rack sizings
+
+		Returns
+		-------
+			list
+				True for each feasible sizing
+
+		"""
+		known = [self.outcomes.lookup(point, self.target) for point in points]
+		sla = (self.target, self.sc.PLAN_WARMUP)
+		jobs = [
+			(i, self.overrides(point), self.exp, self.hybrid, sla, self.database)
+			for i, point in enumerate(points) if known[i] is None
+		]
+		for res in self.pool.map(evaluate, jobs, chunksize=1):
+			known[res['id']] = res['feasible']
+			self.outcomes.add(points[res['id']], res['worst'], res['feasible'])
+		if jobs:
+			self.outcomes.save()
+		simulated = set(job[0] for job in jobs)
+		for i, point in enumerate(points):
+			self.trials.append((point, known[i], i in simulated))
+		return known
+
+
+	def bound(self, point, keys):
+		"""Grow racks until the target is met, doubling them up to PLAN_MAX servers.
+
+		Parameters
+		----------
+			point : dict
+				starting rack sizing
+			keys : list
+				racks which can grow
+
+		Returns
+		-------
+			dict
+				feasible rack sizing, None if the largest one is not feasible
+
+		"""
+		while not self.check([point])[0]:
+			if all(point[key] >= self.sc.PLAN_MAX for key in keys):
+				return None
+			point = dict(point)
+			for key in keys:
+				point[key] = min(2*max(point[key], 1), self.sc.PLAN_MAX)
+			point = self.normalize(point)
+		return point
+
+
+	def descend(self, point, keys):
+		"""Shrink racks of a feasible sizing by parallel bisection. Each round tries the
+		middle of the interval of every rack left to search, with the other racks at
+		their current size, then verifies the feasible reductions together.
+
+		Parameters
+		----------
+			point : dict
+				feasible rack sizing
+			keys : list
+				racks to shrink
+
+		Returns
+		-------
+			dict
+				feasible rack sizing where no rack can shrink alone
+
+		"""
+		lo = dict((key, 1) for key in keys)
+		hi = dict((key, point[key]) for key in keys)
+		while True:
+			searched = [key for key in keys if lo[key] < hi[key]]
+			if not searched:
+				return point
+			trials = []
+			for key in searched:
+				trial = dict(point)
+				trial[key] = (lo[key] + hi[key])//2
+				trials.append(self.normalize(trial))
+			accepted = []
+			for key, trial, feasible in zip(searched, trials, self.check(trials)):
+				if feasible:
+					hi[key] = trial[key]
+					accepted.append((key, trial))
+				else:
+					lo[key] = trial[key] + 1
+			if len(accepted) == 1:
+				point = accepted[0][1]
+			elif accepted:
+				merged = dict(point)
+				for key, trial in accepted:
+					merged[key] = hi[key]
+				merged = self.normalize(merged)
+				if self.check([merged])[0]:
+					point = merged
+				else:
+					# the reductions fail together, keep the largest one
+					key, trial = max(accepted, key=lambda a:point[a[0]] - hi[a[0]])
+					for other, t in accepted:
+						if other != key:
+							hi[other] = point[other]
+					point = trial
+
+
+	def run(self):
+		"""Run the search.
+
+		Returns
+		-------
+			dict
+				fewest servers of each rack, None if even PLAN_MAX servers violate the
+				target
+
+		"""
+		self.pool = Pool(self.workers)
+		try:
+			point = self.start()
+			phases = [
+				["{}.{}".format(name, u) for u in self.sc.COUNTRY]
+				for name in ('SERVERS_DYN', 'MIN_ACTIVE')
+			]
+			point = self.bound(point, phases[0])
+			if point is not None:
+				for keys in phases:
+					point = self.descend(point, keys)
+			self.best = point
+		finally:
+			self.pool.close()
+			self.pool.join()
+			self.pool = None
+		return self.best
+
+
+	def report(self):
+		"""Summary of the search.
+
+		Returns
+		-------
+			str
+				checked sizings, simulated ones and fewest servers of each rack
+
+		"""
+		lines = ["{} sizings checked, {} simulated, {} deduced from previous runs".format(
+			len(self.trials),
+			sum(1 for trial in self.trials if trial[2]),
+			sum(1 for trial in self.trials if not trial[2])
+		)]
+		quantile = "q{:g}".format(self.sc.PLAN_QUANTILE)
+		if self.best is None:
+			lines.append("no sizing up to {} servers keeps {} sess.time <= {} s".format(
+				self.sc.PLAN_MAX, quantile, self.target
+			))
+			return "\n".join(lines)
+		lines.append("fewest servers keeping {} sess.time <= {} s:".format(
+			quantile, self.target
+		))
+		for name in SEARCHED:
+			lines.append("  {} = {}".format(name, dict(
+				(u, self.best["{}.{}".format(name, u)]) for u in self.sc.COUNTRY
+			)))
+		return "\n".join(lines)
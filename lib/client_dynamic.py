@@ -1,10 +1,8 @@
 from lib.server_dynamic import Server
-from lib.config import *
+from lib.scenario import default
 
 import simpy as sp
-import random
-
-random.seed(SEED)
+import numpy as np
 
 class Client:
 	"""Create a new client and start its session. A session is made of a number of requests
@@ -23,6 +21,16 @@ class Client:
 			list of servers located in each country
 		stat : instance
 			instance of the Stats class used to analyze performances and results
+		requests : collections.deque
+			(timestamp, size) pairs of the requests of a replayed session. If None, the
+			number of requests and their sizes are randomly generated
+		catalog : Catalog
+			catalog of the requested objects. None if the caches are disabled
+		scenario : Scenario
+			simulation configuration. The lib.config values are used if None
+		delay : float
+			seconds between the creation of the client and the start of its session,
+			with the batched arrivals
 			
 	Attributes
 	----------
@@ -32,16 +40,27 @@ class Client:
 			country of the client
 		cl_id : int
 			client identification number
+		rng : random.Random
+			stream of the number and the size of the requests of the session
 		rack_list : dict
 			list of servers located in each country
 		req_size : float
 			client request size
 		k : int
 			number of client requests
+		requests : collections.deque
+			(timestamp, size) pairs of the requests of a replayed session, each one is
+			sent at its timestamp
+		catalog : Catalog
+			catalog of the requested objects
+		obj : int
+			object requested by the client
 		session_time : float
 			total time spent by a client in the system
 		stat : instance
 			instance of the Stats class used to analyze performances and results
+		sc : Scenario
+			simulation configuration
 	
 	Methods
 	-------
@@ -49,15 +68,25 @@ class Client:
 			start the session of each client and assigns the requests to the servers
 			
 	"""
-	def __init__(self, env, key, cl_id, rack, stat):
+	def __init__(self, env, key, cl_id, rack, stat, requests=None, catalog=None,
+			scenario=None, delay=0):
 		self.key = key
-		self.k = random.randint(10,100)
+		self.requests = requests
+		self.catalog = catalog
+		self.sc = scenario or default()
+		self.obj = None
+		self.rng = self.sc.streams.session(key, cl_id)
+		if requests is None:
+			self.k = self.rng.randint(10,100)
+		else:
+			self.k = len(requests)
 		self.env = env
 		self.req_size = 0
 		self.cl_id = cl_id
 		self.rack_list = rack
 		self.session_time = .0
 		self.stat = stat
+		self.delay = delay
 
 		self.env.process(self.startSession())
 
@@ -87,12 +116,25 @@ class Client:
 				The process is the 'processing' method of the Server class
 			
 		"""
+		if self.delay > 0:
+			# batched arrival: the session starts later in the bucket
+			yield self.env.timeout(self.delay)
 		self.time_ref = self.env.now
 		
 		while self.k > 0:
+			if self.requests is not None and self.requests[0][0] > self.env.now:
+				# replayed request: wait for its logged timestamp
+				yield self.env.timeout(self.requests[0][0] - self.env.now)
 			retry_cnt = 0
 			self.stat.nOfReq()
-			self.req_size = random.uniform(MIN_REQ, MAX_REQ)
+			if self.catalog is not None:
+				self.obj = self.catalog.sample()
+			if self.requests is not None:
+				self.req_size = self.requests.popleft()[1]
+			elif self.obj is not None:
+				self.req_size = float(self.catalog.size[self.obj])
+			else:
+				self.req_size = self.rng.uniform(self.sc.MIN_REQ, self.sc.MAX_REQ)
 			self.busy = True
 			self.retry = False
 			
@@ -117,22 +159,23 @@ class Client:
 						yield self.env.process(server.process(
 							self.req_size, 
 							self.env, 
-							self.key
+							self.key,
+							self.obj
 						))
 						break
 			
 				# if the local servers are busy check the other countries
 				if self.busy == True:
-					cl_row = COUNTRY.index(self.key)
+					cl_row = self.sc.COUNTRY.index(self.key)
 					# sort the countries in an ascending way with respect to their distance 
 					# from the client region
-					temp_row = np.sort(DISTANCES[cl_row,:])
+					temp_row = np.sort(self.sc.DISTANCES[cl_row,:])
 					# look for available foreign servers
 					for item in temp_row:
 						if item != 0:
 							# sort the foreign server list according to their 
 							# available capacity
-							country = COUNTRY[np.where(temp_row == item)[0][0]]
+							country = self.sc.COUNTRY[np.where(temp_row == item)[0][0]]
 							self.rack_list[country] = sorted(
 								self.rack_list[country], 
 								reverse = True, 
@@ -151,7 +194,8 @@ class Client:
 									yield self.env.process(server.process(
 										self.req_size, 
 										self.env, 
-										country
+										country,
+										self.obj
 									))
 									break
 				
@@ -160,6 +204,8 @@ class Client:
 					yield self.env.timeout(.05)
 					retry_cnt+=1
 					self.retry = True
+					if retry_cnt == 1:
+						self.stat.n_retry += 1
 					if retry_cnt == 1 and self.key=='China':
 						"""
 						print 'Server busy. req id: {}-{}'.format(
@@ -183,4 +229,4 @@ class Client:
 			
 			# estimate the session time for each client
 			if self.k == 0:
-				self.stat.estimateSessionTime(self.env.now - time_ref)
+				self.stat.estimateSessionTime(self.env.now - self.time_ref)
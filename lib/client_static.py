@@ -1,17 +1,16 @@
 from lib.server_static import Server
-from lib.config import *
+from lib.scenario import default
+from lib import policy
 
 import simpy as sp
-import random
-
-random.seed(SEED)
+import numpy as np
 
 class Client:
 	"""Create a new client and start its session. A session is made of a number of requests
 	belonging to [10, 100]. When all the client's requests are served, the client leaves the 
 	system. 
-	If all the countries have busy servers, a new server is deployed by using 3
-	criteria:
+	If all the countries have busy servers, a new server is deployed by using the 
+	strategies of the lib.policy registry:
 	exp : 1 - Distance-based one.
 	exp : 2 - Cost-based one.
 	exp : 3 - People-based one.
@@ -30,6 +29,19 @@ class Client:
 			instance of the Stats class used to analyze performances and results
 		exp : int
 			deploy strategy identification number
+		requests : collections.deque
+			(timestamp, size) pairs of the requests of a replayed session. If None, the
+			number of requests and their sizes are randomly generated
+		catalog : Catalog
+			catalog of the requested objects. None if the caches are disabled
+		scenario : Scenario
+			simulation configuration. The lib.config values are used if None
+		delay : float
+			seconds between the creation of the client and the start of its session,
+			with the batched arrivals
+		planner : Planner
+			placement of the new servers, shared by all the clients of the network. If
+			None, a planner of the rack is created for the client
 			
 	Attributes
 	----------
@@ -39,6 +51,8 @@ class Client:
 			country of the client
 		cl_id : int
 			client identification number
+		rng : random.Random
+			stream of the number and the size of the requests of the session
 		rack_list : dict
 			list of servers located in each country
 		req_size : float
@@ -47,33 +61,52 @@ class Client:
 			number of client requests
 		exp : int
 			deploy strategy identification number
+		requests : collections.deque
+			(timestamp, size) pairs of the requests of a replayed session, each one is
+			sent at its timestamp
+		catalog : Catalog
+			catalog of the requested objects
+		obj : int
+			object requested by the client
 		session_time : float
 			total time spent by a client in the system
 		stat : instance
 			instance of the Stats class used to analyze performances and results
+		sc : Scenario
+			simulation configuration
+		policy : Policy
+			deploy strategy, shared by all the clients of the scenario
+		planner : Planner
+			placement of the new servers
 	
 	Methods
 	-------
 		startSession()
 			start the session of each client and assigns the requests to the servers
-		costCheck()
-			find the best country where the new server will be deployed with respect to
-			the minimum maintaining cost
-		peopleCheck()
-			find the best country where the new server will be deployed with respect to
-			the number of inhabitants
 			
 	"""
-	def __init__(self, env, key, cl_id, rack, stat, exp):
+	def __init__(self, env, key, cl_id, rack, stat, exp, requests=None, catalog=None,
+			scenario=None, delay=0, planner=None):
 		self.key = key
-		self.k = random.randint(10,100)
+		self.requests = requests
+		self.catalog = catalog
+		self.sc = scenario or default()
+		self.obj = None
+		self.rng = self.sc.streams.session(key, cl_id)
+		if requests is None:
+			self.k = self.rng.randint(10,100)
+		else:
+			self.k = len(requests)
 		self.env = env
 		self.req_size = 0
 		self.cl_id = cl_id
 		self.rack_list = rack
 		self.session_time = .0
 		self.exp = exp
+		self.policy = policy.get(exp, self.sc)
+		self.planner = planner or self.policy.planner(rack)
 		self.stat = stat
+		self.delay = delay
 
 		self.env.process(self.startSession())
 	
@@ -115,12 +148,25 @@ class Client:
 				The process is the 'processing' method of the Server class
 			
 		"""
+		if self.delay > 0:
+			# batched arrival: the session starts later in the bucket
+			yield self.env.timeout(self.delay)
 		time_ref = self.env.now
 		
 		while self.k > 0:
+			if self.requests is not None and self.requests[0][0] > self.env.now:
+				# replayed request: wait for its logged timestamp
+				yield self.env.timeout(self.requests[0][0] - self.env.now)
 			self.stat.nOfReq()
-			# define the request size
-			self.req_size = random.uniform(MIN_REQ, MAX_REQ)
+			# define the requested object and the request size
+			if self.catalog is not None:
+				self.obj = self.catalog.sample()
+			if self.requests is not None:
+				self.req_size = self.requests.popleft()[1]
+			elif self.obj is not None:
+				self.req_size = float(self.catalog.size[self.obj])
+			else:
+				self.req_size = self.rng.uniform(self.sc.MIN_REQ, self.sc.MAX_REQ)
 			
 			self.busy = True
 			
@@ -142,21 +188,22 @@ class Client:
 					yield self.env.process(server.process(
 						self.req_size, 
 						self.env, 
-						self.key
+						self.key,
+						self.obj
 					))
 					break
 			
 			# if the local servers are busy check the other countries
 			if self.busy == True:
-				cl_row = COUNTRY.index(self.key)
+				cl_row = self.sc.COUNTRY.index(self.key)
 				# sort the countries in an ascending way with respect to their distance 
 				# from the client region
-				temp_row = np.sort(DISTANCES[cl_row,:])
+				temp_row = np.sort(self.sc.DISTANCES[cl_row,:])
 				# look for available foreign servers
 				for item in temp_row:
 					if item != 0:
 						# sort the foreign server list according to their available capacity
-						country = COUNTRY[np.where(temp_row == item)[0][0]]
+						country = self.sc.COUNTRY[np.where(temp_row == item)[0][0]]
 						self.rack_list[country] = sorted(
 							self.rack_list[country], 
 							reverse = True, 
@@ -172,64 +219,31 @@ class Client:
 								yield self.env.process(server.process(
 									self.req_size, 
 									self.env, 
-									country
+									country,
+									self.obj
 								))
 								break
 				
-				# all the servers are busy, create a new local server
+				# all the servers are busy, deploy a new server following the strategy
 				if self.busy == True:
-					# deploy new server with respect to distance
-					if self.exp == 1:
-						serv_id = self.rack_list[self.key][-1].serv_id + 1
-						# update the local servers rack list
-						self.rack_list[self.key].append(Server(self.key, serv_id))
-						server = self.rack_list[self.key][-1]
-						print "\t   new server added in {}".format(self.key)
-						# update the number of request served locally
-						self.stat.localReq()
-						
-						# the new local server serves the client
-						yield self.env.process(server.process(
-							self.req_size, 
-							self.env, 
-							self.key
-						))
-					
-					# deploy new server with respect to cost	
-					elif self.exp == 2:
-						serv_id = self.rack_list[self.key][-1].serv_id + 1
-						next_serv = self.costCheck()
-						# update the local servers rack list
-						self.rack_list[next_serv].append(Server(next_serv, serv_id))
-						server = self.rack_list[next_serv][-1]
+					next_serv, serv_id = self.planner.place(self.key)
+					# update the servers rack list
+					self.rack_list[next_serv].append(
+						Server(next_serv, serv_id, self.sc, self.env.now)
+					)
+					server = self.rack_list[next_serv][-1]
+					if self.sc.VERBOSE:
 						print "\t   new server added in {}".format(next_serv)
-						# update the number of request served locally
-						self.stat.localReq()
-						
-						# the new local server serves the client
-						yield self.env.process(server.process(
-							self.req_size, 
-							self.env, 
-							self.key
-						))
+					# update the number of request served locally
+					self.stat.localReq()
 					
-					# deploy new server with respect to people
-					elif self.exp == 3:
-						serv_id = self.rack_list[self.key][-1].serv_id + 1
-						next_serv = self.peopleCheck()
-						# update the local servers rack list
-						self.rack_list[next_serv].append(Server(next_serv, serv_id))
-						server = self.rack_list[next_serv][-1]
-						print "\t   new server added in {}".format(next_serv)
-						# update the number of request served locally
-						self.stat.localReq()
-						
-						# the new local server serves the client
-						yield self.env.process(server.process(
-							self.req_size, 
-							self.env, 
-							self.key
-						))
+					# the new server serves the client
+					yield self.env.process(server.process(
+						self.req_size, 
+						self.env, 
+						self.key,
+						self.obj
+					))
 			
 			# update the remaining request number			
 			self.k -= 1
@@ -237,86 +251,3 @@ class Client:
 			# estimate the session time for each client
 			if self.k == 0:
 				self.stat.estimateSessionTime(self.env.now - time_ref)
-				
-	def costCheck(self):
-		"""Sort the countries with respect to the minimum mantaining cost of a server.
-		people in the countries hosting the servers.
-		The new server is deployed in the country identified with the minimum mantaining 
-		cost. The countries are roundly chosen until all the countries don't have the same 
-		number of servers.
-		
-		Returns
-		-------
-			min_country : str
-				country where the new server will be deployed
-				
-		"""	
-		min_flag = False
-		max_n_serv = 0
-		min_cost_list = []
-		for u in COUNTRY:
-			if len(self.rack_list[u]) > max_n_serv:
-				max_n_serv = len(self.rack_list[u])
-		
-		for u in COUNTRY:
-			min_cost_list.append([COSTS[u], u])
-		
-		min_cost_list = sorted(
-			min_cost_list,
-			key = lambda x:x[0]
-		)
-		
-		for i in range(5):
-			min_country = min_cost_list[i][1]
-			if len(self.rack_list[min_country]) < max_n_serv:
-				min_flag = True
-				return min_country
-		
-		if min_flag == False:
-			for i in range(5):
-				min_country = min_cost_list[i][1]
-				if len(self.rack_list[min_country]) == max_n_serv:
-					break
-			return min_country
-			
-	def peopleCheck(self):
-		"""Sort the countries with respect to the minimum mantaining cost of a server.
-		people in the countries hosting the servers.
-		The new server is deployed in the country identified with the maximum number of
-		inhabitants. The countries are roundly chosen until all the countries don't have the 
-		same number of servers.
-		
-		Returns
-		-------
-			max_country : str
-				country where the new server will be deployed
-				
-		"""	
-		max_flag = False
-		max_n_serv = 0
-		max_people_list = []
-		for u in COUNTRY:
-			if len(self.rack_list[u]) > max_n_serv:
-				max_n_serv = len(self.rack_list[u])
-		
-		for u in COUNTRY:
-			max_people_list.append([DAILY_USERS[u], u])
-		
-		max_people_list = sorted(
-			max_people_list,
-			reverse = True,
-			key = lambda x:x[0]
-		)
-
-		for i in range(5):
-			max_country = max_people_list[i][1]
-			if len(self.rack_list[max_country]) < max_n_serv:
-				max_flag = True
-				return max_country
-		
-		if max_flag == False:
-			for i in range(5):
-				max_country = max_people_list[i][1]
-				if len(self.rack_list[max_country]) == max_n_serv:
-					break
-			return max_country
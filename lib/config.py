@@ -3,6 +3,9 @@ import numpy as np
 # Random seed used in all the codes
 SEED = 126
 
+# Print the statistics at every acquisition and the deployed servers
+VERBOSE = True
+
 # Starting hour of the simulation. 
 # e.g. if the simulation starts at 00:00, START = 0
 # The hours are in the '24' hours format.
@@ -51,13 +54,14 @@ DISTANCES = np.array([
 # Only a small percentage the daily internet users per country uses the CDN.
 # CONV/100 [%], so the 0.1% of the people is CONV = 1e-3 
 CONV = 1e-3 
-DAILY_USERS = {
-	'China':int(829367947*CONV),
-	'India':int(560347554*CONV),
-	'USA':int(292090854*CONV),
-	'Brazil':int(149206801*CONV),
-	'Japan':int(118845120*CONV)
+POPULATION = {
+	'China':829367947,
+	'India':560347554,
+	'USA':292090854,
+	'Brazil':149206801,
+	'Japan':118845120
 }
+DAILY_USERS = {u:int(POPULATION[u]*CONV) for u in POPULATION}
 
 # Requests size: [4MB, 40MB]
 MIN_REQ = 3.2e7
@@ -138,3 +142,146 @@ TIMEZONE = {
 	'Japan':7,
 	'China':6
 }
+
+# Number of records read at once when a request log is replayed.
+# Binary logs are memory-mapped, so only the replayed chunk is paged in
+TRACE_CHUNK = 1000000
+
+# Heavy-tailed workload of the trace generator. Request sizes and session lengths
+# follow bounded Pareto distributions with shape TAIL_ALPHA, the lower bounds are
+# MIN_REQ and 10 requests
+TAIL_ALPHA = 1.2
+MAX_TAIL_REQ = 3.2e9
+MAX_TAIL_SESSION = 1000
+
+# Content caching. CACHE_POLICY is the eviction policy of the server caches: 'lru',
+# 'lfu', 'arc' or 's3fifo'. The caches are disabled if CACHE_POLICY = None.
+# CACHE_SIZE is the number of objects stored by each server
+CACHE_POLICY = None
+CACHE_SIZE = 10000
+
+# Object catalog. The popularity of the objects follows a Zipf distribution with
+# exponent ZIPF_ALPHA
+CATALOG_SIZE = 1000000
+ZIPF_ALPHA = .8
+
+# A cache miss adds the round trip time to the origin [s] and the object transfer
+# from the origin, whose link capacity is expressed in bits per second
+ORIGIN_RTT = .1
+ORIGIN_CAPACITY = 1e10
+
+# Convergence-based early termination (--steady option). The initial transient is
+# detected with MSER-5 on the STEADY_METRICS columns and their steady-state means are
+# estimated with STEADY_BATCHES batch means, the first check is done after
+# STEADY_MIN_ROWS acquisitions. The run stops once every confidence interval at the
+# STEADY_CONFIDENCE level is narrower than STEADY_PRECISION times its mean. The
+# columns must be per-interval values: 'local.req' is cumulative since the start.
+# If STEADY_DAILY = True each batch covers whole days of the TRAFFIC profile, so the
+# first check needs STEADY_BATCHES days. Set it to False only for a flat TRAFFIC
+STEADY_METRICS = ['avg.sess.time']
+STEADY_PRECISION = .02
+STEADY_CONFIDENCE = .95
+STEADY_BATCHES = 10
+STEADY_MIN_ROWS = 36
+STEADY_DAILY = True
+
+# Rare-event splitting (rare.py). The global utilization of the CDN is checked every
+# SPLIT_DT seconds and a trajectory is split in SPLIT_FACTOR copies when it first
+# crosses each of the SPLIT_LEVELS. The probability of the rare event within SIMTIME is
+# averaged over SPLIT_ROOTS root trajectories, with a SPLIT_CONFIDENCE interval
+SPLIT_LEVELS = [.5, .7, .85, .95]
+SPLIT_FACTOR = 4
+SPLIT_DT = 1
+SPLIT_ROOTS = 10
+SPLIT_CONFIDENCE = .95
+
+# Hybrid fluid/discrete-event simulation (--hybrid option). An hour is advanced with a
+# fluid approximation, in steps of HYBRID_STEP seconds, if the expected peak load of
+# every active server stays below HYBRID_MARGIN times the capacity it can take before
+# its wake-up threshold (dynamic) or its SERVER_LIMIT (static). The other hours are
+# simulated event by event
+HYBRID_MARGIN = .5
+HYBRID_STEP = 60
+
+# Threshold and rack sizing optimizer (optimize.py). OPT_CANDIDATES configurations are
+# evaluated by successive halving over OPT_RUNGS rungs keeping 1/OPT_ETA of them at each
+# rung, the last rung simulates SIMTIME seconds. The average session time must not
+# exceed OPT_MAX_SESSION seconds. A run is aborted after OPT_ABORT_ROWS acquisitions if
+# the mean of its average session times exceeds OPT_ABORT times the limit
+OPT_CANDIDATES = 36
+OPT_ETA = 3
+OPT_RUNGS = 3
+OPT_MAX_SESSION = 2.
+OPT_ABORT = 1.5
+OPT_ABORT_ROWS = 6
+
+# Bandwidth model of the servers. If BANDWIDTH_SHARING = False the transfer time of a
+# request is fixed at its arrival as its size over the available capacity of the
+# server. If True the concurrent transfers share the capacity fairly (processor
+# sharing) and their end moves with every arrival and departure
+BANDWIDTH_SHARING = False
+
+# Bounded memory mode for long horizons. If WINDOW = None the whole dataframe is kept
+# in memory and the .csv file is rewritten at every acquisition. With an integer only
+# the last WINDOW rows are kept, each new row is appended to the .csv file and the
+# 'rss' column reports the resident memory of the simulator in MB
+WINDOW = None
+
+# Experiment database (--db option, lib/database.py). The dataframe rows are inserted
+# DB_BATCH at a time, a write waits at most DB_TIMEOUT seconds for another process
+DB_BATCH = 50
+DB_TIMEOUT = 30.
+
+# Cross-run report (report.py). Confidence level of the intervals of the means and
+# probabilities of the quantiles
+REPORT_CONFIDENCE = .95
+REPORT_QUANTILES = [.05, .5, .95]
+
+# Random streams. If RNG_STREAMS = False all the clients and servers share one
+# generator and the arrivals another one, so every draw depends on the order of the
+# events. If True each country arrival process, session and server has its own stream
+# derived from SEED and from its identity (lib/rng.py), so a run is reproduced by any
+# engine creating the same entities
+RNG_STREAMS = False
+
+# Batched arrivals. If ARRIVAL_BUCKET = None the clients of each country arrive one by
+# one, after integer Poisson inter-arrival times. With a number of seconds, each
+# arrival process wakes up once per bucket, draws the Poisson number of sessions of
+# the bucket and starts them at uniform offsets within it
+ARRIVAL_BUCKET = None
+
+# Live metrics (--live option, monitor.py). The runs publish their counters in a
+# shared region of METRICS_SLOTS slots, in /dev/shm/cdn-metrics if METRICS_FILE = None.
+# The simulated time and the events are published every METRICS_PERIOD simulated
+# seconds, the monitor flags a run not updated for METRICS_STALE wall clock seconds
+METRICS_FILE = None
+METRICS_SLOTS = 64
+METRICS_PERIOD = 60
+METRICS_STALE = 30
+
+# Time-weighted server usage. If SERVER_USAGE = True each server integrates its used
+# capacity, in-flight requests and state over time, and the dataframe gets per country
+# the utilization and in-flight requests per server averaged over each interval
+# (.util, .queue) and, for the dynamic allocation, the fraction of server time in idle
+# and under the wake-up threshold (.idle, .near.max). The same values of each server,
+# with its time in every state, are written to the output/*_servers.csv long table,
+# a row per interval and server
+SERVER_USAGE = False
+
+# Session time quantile. If SESSION_QUANTILE = None only the average session time of
+# each interval is reported. With a probability, e.g. .99, the dataframe gets the
+# 'q.sess.time' column with that quantile of the session times of the clients which
+# finished in the interval
+SESSION_QUANTILE = None
+
+# Capacity planner (plan.py). The fewest servers per country of the dynamic CDN
+# (SERVERS_DYN then MIN_ACTIVE) keeping the PLAN_QUANTILE quantile of the session time
+# of every interval under PLAN_TARGET seconds are searched, for the CONV and TRAFFIC
+# of the scenario. The first PLAN_WARMUP intervals are not checked, and a rack is never
+# grown beyond PLAN_MAX servers. The outcomes of the runs are kept in PLAN_CACHE, None
+# to keep nothing, and reused by the later searches of the same scenario
+PLAN_TARGET = 5.
+PLAN_QUANTILE = .99
+PLAN_WARMUP = 3
+PLAN_MAX = 64
+PLAN_CACHE = 'output/plan_cache.json'
@@ -0,0 +1,304 @@
+import math
+
+import numpy as np
+
+
+def mser(series, batch=5):
+	"""Detect the end of the initial transient with the MSER-5 rule. The series is
+	averaged in batches of 'batch' observations and the truncation point minimizes the
+	marginal standard error of the remaining batch means. Only the first half of the
+	series is considered, as a truncation beyond it means that the series is too short.
+
+	Parameters
+	----------
+		series : array_like
+			observations in time order
+		batch : int
+			number of observations per batch
+
+	Returns
+	-------
+		int
+			number of observations to delete from the beginning of the series
+
+	"""
+	series = np.asarray(series, dtype=np.float64)
+	m = len(series)//batch
+	if m < 2:
+		return 0
+	z = series[:m*batch].reshape(m, batch).mean(axis=1)
+
+	# sums of the batch means and of their squares from each batch to the end
+	s1 = np.cumsum(z[::-1])[::-1]
+	s2 = np.cumsum((z*z)[::-1])[::-1]
+	n = np.arange(m, 0, -1, dtype=np.float64)
+	stat = (s2 - s1*s1/n)/(n*n)
+
+	d = int(np.argmin(stat[:m//2 + 1]))
+	return d*batch
+
+
+def normalQuantile(p):
+	"""Quantile of the standard normal distribution, found by bisection on its
+	cumulative distribution function.
+
+	Parameters
+	----------
+		p : float
+			probability in (0, 1)
+
+	Returns
+	-------
+		float
+			quantile
+
+	"""
+	low, high = -10., 10.
+	for i in range(60):
+		mid = (low + high)/2
+		if .5*(1 + math.erf(mid/math.sqrt(2))) < p:
+			low = mid
+		else:
+			high = mid
+	return (low + high)/2
+
+
+def tQuantile(p, df):
+	"""Quantile of the Student's t distribution, by the Cornish-Fisher expansion around
+	the normal quantile. The error is below 1e-3 for 4 or more degrees of freedom.
+
+	Parameters
+	----------
+		p : float
+			probability in (0, 1)
+		df : int
+			degrees of freedom
+
+	Returns
+	-------
+		float
+			quantile
+
+	"""
+	z = normalQuantile(p)
+	v = float(df)
+	return (
+		z
+		+ (z**3 + z)/(4*v)
+		+ (5*z**5 + 16*z**3 + 3*z)/(96*v**2)
+		+ (3*z**7 + 19*z**5 + 17*z**3 - 15*z)/(384*v**3)
+		+ (79*z**9 + 776*z**7 + 1482*z**5 - 1920*z**3 - 945*z)/(92160*v**4)
+	)
+
+
+def batchMeans(series, n_batches, confidence, period=1):
+	"""Confidence interval of the steady-state mean by the method of the batch means.
+	The series is split in n_batches contiguous batches of equal size, a multiple of
+	period, and the first observations which do not fill the batches are dropped.
+	With a periodic input, e.g. the hourly TRAFFIC, each batch then covers whole
+	cycles and the batch means are not biased by the time of the day.
+
+	Parameters
+	----------
+		series : array_like
+			steady-state observations in time order
+		n_batches : int
+			number of batches
+		confidence : float
+			confidence level of the interval
+		period : int
+			number of observations of a cycle of the input
+
+	Returns
+	-------
+		tuple
+			mean and half-width of the confidence interval. The half-width is infinite
+			if there are less cycles than batches
+
+	"""
+	series = np.asarray(series, dtype=np.float64)
+	size = len(series)//n_batches//period*period
+	if size == 0:
+		return (series.mean() if len(series) else float('nan')), float('inf')
+	means = series[len(series) - size*n_batches:].reshape(n_batches, size).mean(axis=1)
+	half = tQuantile((1 + confidence)/2, n_batches - 1)*means.std(ddof=1)/math.sqrt(n_batches)
+	return means.mean(), half
+
+
+class Convergence:
+	"""Output analysis of a single long run. The Stats rows are collected as they are
+	produced; the initial transient is detected with MSER-5 on every monitored column
+	and the longest one is deleted. The steady-state mean of each column is estimated
+	with a batch-means confidence interval and the run can be stopped as soon as every
+	interval is narrower than the target relative precision.
+	The batches cover whole periods of the input, so with the daily TRAFFIC profile a
+	run is only checked once it has n_batches steady-state days.
+
+	Parameters
+	----------
+		columns : list
+			monitored dataframe columns
+		precision : float
+			target relative half-width of the confidence intervals
+		confidence : float
+			confidence level of the intervals
+		n_batches : int
+			number of batches of the batch means
+		min_rows : int
+			number of rows collected before the first check
+		stop : bool
+			True to stop the run at the target precision, False to only estimate
+		period : int
+			number of rows of a cycle of the input, e.g. the rows of a day. 1 for a
+			stationary input
+
+	Attributes
+	----------
+		series : dict
+			the keys are the columns, the values are the collected values
+		times : list
+			timestamps of the collected rows
+		warmup : int
+			number of deleted rows
+		estimates : dict
+			the keys are the columns, the values are (mean, half-width) pairs
+		converged : bool
+			True if the target precision was reached
+		done : simpy.events.Event
+			triggered at convergence when stop is True, or at the end of the run
+
+	Methods
+	-------
+		attach(env, stat, simtime)
+			collect the rows of a Stats instance and return the event ending the run
+		update(row)
+			collect a row and check the precision
+		analyze()
+			delete the transient and estimate the steady-state means
+		report()
+			summary of the output analysis
+
+	"""
+	def __init__(self, columns, precision, confidence, n_batches, min_rows, stop=True,
+			period=1):
+		self.columns = columns
+		self.precision = precision
+		self.confidence = confidence
+		self.n_batches = n_batches
+		self.period = period
+		self.min_rows = max(min_rows, 2*n_batches, n_batches*period)
+		self.stop = stop
+		self.series = dict((col, []) for col in columns)
+		self.times = []
+		self.warmup = 0
+		self.estimates = {}
+		self.converged = False
+		self.done = None
+
+
+	def attach(self, env, stat, simtime):
+		"""Collect the rows of a Stats instance.
+
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SimPy Environment class
+			stat : instance
+				instance of the Stats class
+			simtime : float
+				seconds of simulation, the run ends there if it does not converge
+
+		Returns
+		-------
+			simpy.events.Event
+				event ending the run, to be used as env.run(until=...)
+
+		"""
+		self.done = env.event()
+		stat.listeners.append(self.update)
+
+		def horizon():
+			yield env.timeout(simtime)
+			if not self.done.triggered:
+				self.done.succeed()
+		env.process(horizon())
+		return self.done
+
+
+	def update(self, row):
+		"""Collect a row and check whether the target precision is reached.
+
+		Parameters
+		----------
+			row : dict
+				new dataframe row
+
+		"""
+		for col in self.columns:
+			self.series[col].append(row[col])
+		self.times.append(row['time'])
+		if len(self.times) < self.min_rows or self.converged:
+			return
+
+		self.analyze()
+		if self.converged and self.stop and self.done is not None:
+			if not self.done.triggered:
+				self.done.succeed()
+
+
+	def analyze(self):
+		"""Delete the initial transient and estimate the steady-state means.
+
+		Returns
+		-------
+			bool
+				True if every confidence interval meets the target precision
+
+		"""
+		self.warmup = max(mser(self.series[col]) for col in self.columns)
+		self.converged = True
+		for col in self.columns:
+			mean, half = batchMeans(
+				self.series[col][self.warmup:],
+				self.n_batches,
+				self.confidence,
+				self.period
+			)
+			self.estimates[col] = (mean, half)
+			if not half <= self.precision*abs(mean):
+				self.converged = False
+		return self.converged
+
+
+	def report(self):
+		"""Summary of the output analysis.
+
+		Returns
+		-------
+			str
+				deleted transient and confidence interval of each monitored column
+
+		"""
+		if not self.estimates:
+			self.analyze()
+		lines = ["steady state: {} of {} intervals deleted as transient{}".format(
+			self.warmup,
+			len(self.times),
+			" (until {})".format(self.times[self.warmup - 1]) if self.warmup else ""
+		)]
+		for col in self.columns:
+			mean, half = self.estimates[col]
+			lines.append("{:<16}{:>14.4f} +/- {:<12.4f}({:.1%} at {:.0%})".format(
+				col,
+				mean,
+				half,
+				half/abs(mean) if mean else float('inf'),
+				self.confidence
+			))
+		if self.converged:
+			lines.append("target precision {:.1%} reached at {}".format(
+				self.precision, self.times[-1]
+			))
+		else:
+			lines.append("target precision {:.1%} not reached".format(self.precision))
+		return "\n".join(lines)
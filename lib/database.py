@@ -0,0 +1,371 @@
+from timeit import default_timer as timer
+
+import numpy as np
+
+import sqlite3
+import hashlib
+import json
+import time
+
+# Tables of the experiment database. A run is a simulation, its parameters are all the
+# lib.config values, stored as JSON text, and its metrics are the dataframe rows in
+# long format: one record per run, row and column
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+	id INTEGER PRIMARY KEY,
+	hash TEXT NOT NULL,
+	kind TEXT NOT NULL,
+	exp INTEGER NOT NULL,
+	seed INTEGER,
+	started REAL NOT NULL,
+	wall REAL,
+	rows INTEGER
+);
+CREATE TABLE IF NOT EXISTS params (
+	run INTEGER NOT NULL REFERENCES runs(id),
+	name TEXT NOT NULL,
+	value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+	run INTEGER NOT NULL REFERENCES runs(id),
+	row INTEGER NOT NULL,
+	time TEXT NOT NULL,
+	name TEXT NOT NULL,
+	value REAL
+);
+CREATE INDEX IF NOT EXISTS runs_kind_exp ON runs(kind, exp);
+CREATE INDEX IF NOT EXISTS runs_hash ON runs(hash);
+CREATE INDEX IF NOT EXISTS params_name_value ON params(name, value, run);
+CREATE INDEX IF NOT EXISTS metrics_run_name ON metrics(run, name, row);
+"""
+
+
+def encode(value):
+	"""JSON text of a parameter value, with the NumPy arrays and scalars converted and
+	the dictionary keys sorted, so equal values have the same text.
+
+	Parameters
+	----------
+		value : object
+			lib.config parameter value
+
+	Returns
+	-------
+		str
+			JSON text
+
+	"""
+	def convert(obj):
+		if isinstance(obj, (np.ndarray, np.generic)):
+			return obj.tolist()
+		raise TypeError("not serializable: {!r}".format(obj))
+	return json.dumps(value, sort_keys=True, default=convert)
+
+
+def parameters(scenario):
+	"""lib.config parameters of a scenario.
+
+	Parameters
+	----------
+		scenario : Scenario
+			simulation configuration
+
+	Returns
+	-------
+		dict
+			the keys are the parameter names, the values their JSON text
+
+	"""
+	return dict(
+		(key, encode(getattr(scenario, key))) for key in dir(scenario) if key.isupper()
+	)
+
+
+def configHash(params):
+	"""Hash of a configuration, equal for the runs with the same parameters.
+
+	Parameters
+	----------
+		params : dict
+			parameters as returned by parameters()
+
+	Returns
+	-------
+		str
+			hexadecimal SHA-1 digest
+
+	"""
+	digest = hashlib.sha1()
+	for key in sorted(params):
+		digest.update("{}={}\n".format(key, params[key]))
+	return digest.hexdigest()
+
+
+class Database:
+	"""Local SQLite store of the simulation runs. Each run records its configuration
+	hash, parameters, seed, wall time and the dataframe rows, so the runs can be found
+	by configuration and compared without reading the .csv files.
+	The database is in WAL mode and every write is a short immediate transaction, so
+	several processes (e.g. the workers of a sweep) can record their runs at the same
+	time, each one with its own Database instance. The rows are buffered and inserted
+	DB_BATCH at a time.
+
+	Parameters
+	----------
+		path : str
+			path of the database file, created if missing
+		batch : int
+			number of dataframe rows inserted per transaction
+		timeout : float
+			seconds a write waits for the lock held by another process
+
+	Attributes
+	----------
+		path : str
+			path of the database file
+		batch : int
+			number of dataframe rows inserted per transaction
+		conn : sqlite3.Connection
+			connection to the database, in autocommit mode
+		pending : list
+			metrics records waiting to be inserted
+		rows : dict
+			the keys are the run ids being recorded, the values their number of rows
+		started : dict
+			the keys are the run ids being recorded, the values their start time
+
+	Methods
+	-------
+		begin(scenario, kind, exp)
+			record a new run and return its id
+		listener(run)
+			function recording the dataframe rows of a run
+		record(run, row)
+			buffer a dataframe row
+		flush()
+			insert the buffered rows
+		end(run)
+			insert the last rows and record the wall time of a run
+		find(kind, exp, values)
+			ids of the runs with some parameter values
+		metrics(run)
+			dataframe of a run
+		close()
+			close the connection
+
+	"""
+	def __init__(self, path, batch=50, timeout=30.):
+		self.path = path
+		self.batch = batch
+		self.conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+		self.conn.execute("PRAGMA journal_mode=WAL")
+		self.conn.execute("PRAGMA synchronous=NORMAL")
+		# created under the write lock, as the workers of a sweep open the database at
+		# the same time
+		self.transaction([(sql, ()) for sql in SCHEMA.split(';') if sql.strip()])
+		self.pending = []
+		self.rows = {}
+		self.started = {}
+
+
+	def transaction(self, statements):
+		"""Execute statements in an immediate transaction, which takes the write lock at
+		the start, so two writers never deadlock upgrading a read lock.
+
+		Parameters
+		----------
+			statements : list
+				(sql, parameters) pairs, parameters being a list of tuples for
+				executemany or a tuple for execute
+
+		Returns
+		-------
+			sqlite3.Cursor
+				cursor of the last statement
+
+		"""
+		cur = self.conn.cursor()
+		cur.execute("BEGIN IMMEDIATE")
+		try:
+			for sql, args in statements:
+				if isinstance(args, list):
+					cur.executemany(sql, args)
+				else:
+					cur.execute(sql, args)
+			cur.execute("COMMIT")
+		except:
+			cur.execute("ROLLBACK")
+			raise
+		return cur
+
+
+	def begin(self, scenario, kind, exp):
+		"""Record a new run with its parameters.
+
+		Parameters
+		----------
+			scenario : Scenario
+				simulation configuration
+			kind : str
+				'static' or 'dynamic'
+			exp : int
+				deploy or wake up strategy identification number
+
+		Returns
+		-------
+			int
+				run id
+
+		"""
+		params = parameters(scenario)
+		cur = self.conn.cursor()
+		cur.execute("BEGIN IMMEDIATE")
+		try:
+			cur.execute(
+				"INSERT INTO runs (hash, kind, exp, seed, started) VALUES (?, ?, ?, ?, ?)",
+				(configHash(params), kind, exp, scenario.SEED, time.time())
+			)
+			run = cur.lastrowid
+			cur.executemany(
+				"INSERT INTO params (run, name, value) VALUES (?, ?, ?)",
+				[(run, key, params[key]) for key in sorted(params)]
+			)
+			cur.execute("COMMIT")
+		except:
+			cur.execute("ROLLBACK")
+			raise
+		self.rows[run] = 0
+		self.started[run] = timer()
+		return run
+
+
+	def listener(self, run):
+		"""Function recording the dataframe rows of a run, to be added to the listeners
+		of a Stats instance.
+
+		Parameters
+		----------
+			run : int
+				run id
+
+		Returns
+		-------
+			callable
+				function called with each new dataframe row
+
+		"""
+		return lambda row: self.record(run, row)
+
+
+	def record(self, run, row):
+		"""Buffer a dataframe row, and insert the buffered rows every batch rows.
+
+		Parameters
+		----------
+			run : int
+				run id
+			row : dict
+				dataframe row, with its 'time'
+
+		"""
+		idx = self.rows[run]
+		now = row['time']
+		for name, value in row.items():
+			if name != 'time':
+				self.pending.append((run, idx, now, name, float(value)))
+		self.rows[run] = idx + 1
+		if (idx + 1) % self.batch == 0:
+			self.flush()
+
+
+	def flush(self):
+		"""Insert the buffered rows in a single transaction."""
+		if self.pending:
+			self.transaction([(
+				"INSERT INTO metrics (run, row, time, name, value) VALUES (?, ?, ?, ?, ?)",
+				self.pending
+			)])
+			self.pending = []
+
+
+	def end(self, run):
+		"""Insert the last rows of a run and record its wall time and number of rows.
+
+		Parameters
+		----------
+			run : int
+				run id
+
+		"""
+		self.flush()
+		self.transaction([(
+			"UPDATE runs SET wall = ?, rows = ? WHERE id = ?",
+			(timer() - self.started.pop(run), self.rows.pop(run), run)
+		)])
+
+
+	def find(self, kind=None, exp=None, **values):
+		"""Ids of the runs of a simulator and strategy with some parameter values, e.g.
+		find('dynamic', 2, CONV=1e-2).
+
+		Parameters
+		----------
+			kind : str
+				'static' or 'dynamic', None for both
+			exp : int
+				strategy identification number, None for all
+			values : dict
+				lib.config parameter values
+
+		Returns
+		-------
+			list
+				run ids, in order of start
+
+		"""
+		sql = "SELECT id FROM runs WHERE 1"
+		args = []
+		if kind is not None:
+			sql += " AND kind = ?"
+			args.append(kind)
+		if exp is not None:
+			sql += " AND exp = ?"
+			args.append(exp)
+		for key in sorted(values):
+			sql += " AND id IN (SELECT run FROM params WHERE name = ? AND value = ?)"
+			args.extend((key, encode(values[key])))
+		return [run for (run,) in self.conn.execute(sql + " ORDER BY id", args)]
+
+
+	def metrics(self, run):
+		"""Dataframe of a run, as returned by lib.scenario.simulate().
+
+		Parameters
+		----------
+			run : int
+				run id
+
+		Returns
+		-------
+			dict
+				the keys are the dataframe columns, the values are NumPy arrays with a
+				value per acquisition interval. The 'time' column holds the timestamps
+
+		"""
+		times = {}
+		columns = {}
+		for row, now, name, value in self.conn.execute(
+			"SELECT row, time, name, value FROM metrics WHERE run = ? ORDER BY name, row",
+			(run,)
+		):
+			times[row] = now
+			columns.setdefault(name, []).append(value)
+		results = dict((name, np.array(columns[name])) for name in columns)
+		results['time'] = np.array([times[row] for row in sorted(times)])
+		return results
+
+
+	def close(self):
+		"""Insert the buffered rows and close the connection."""
+		self.flush()
+		self.conn.close()
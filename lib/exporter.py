@@ -0,0 +1,221 @@
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from timeit import default_timer as timer
+
+import threading
+
+from lib.metrics import EventCounter
+
+# Exported metrics: name, type and help text
+METRICS = [
+	('cdn_simulated_seconds', 'gauge', 'Simulated time'),
+	('cdn_simulation_speed', 'gauge', 'Simulated seconds per wall clock second'),
+	('cdn_events_total', 'counter', 'SimPy events processed'),
+	('cdn_events_per_second', 'gauge', 'SimPy events processed per wall clock second'),
+	('cdn_sessions_total', 'counter', 'Client sessions started'),
+	('cdn_requests_total', 'counter', 'Requests sent by the clients'),
+	('cdn_retries_total', 'counter', 'Requests which found all the servers busy'),
+	('cdn_local_request_ratio', 'gauge', 'Fraction of the requests served locally'),
+	('cdn_avg_session_seconds', 'gauge', 'Average session time of the last interval'),
+	('cdn_cost_usd_per_hour', 'gauge', 'Total maintaining cost of the active servers'),
+	('cdn_active_servers', 'gauge', 'Servers accepting requests'),
+	('cdn_available_capacity_bps', 'gauge', 'Available capacity of the active servers')
+]
+
+
+class Exporter:
+	"""Local HTTP endpoint exposing the gauges and counters of a running simulation in
+	the Prometheus text format, at http://127.0.0.1:<port>/metrics. The simulation
+	thread only copies the values in a snapshot every METRICS_PERIOD simulated seconds
+	and at every dataframe row, the text is formatted by the server thread when the
+	endpoint is scraped.
+
+	Parameters
+	----------
+		net : Network
+			instance of the Network class
+		kind : str
+			'static' or 'dynamic'
+		exp : int
+			deploy or wake up strategy identification number
+		port : int
+			port of the endpoint
+
+	Attributes
+	----------
+		net : Network
+			instance of the Network class
+		stat : instance
+			instance of the Stats class of the network
+		sc : Scenario
+			simulation configuration
+		sessions : float
+			sessions started up to the last dataframe row
+		row : dict
+			values taken from the last dataframe row
+		labels : str
+			labels of all the metrics, identifying the run
+		snapshot : dict
+			last published values, replaced as a whole so the server thread always
+			reads a consistent one
+		counter : EventCounter
+			events processed by the simulation
+		server : HTTPServer
+			HTTP server, run by a daemon thread
+
+	Methods
+	-------
+		attach(env)
+			publish the values of a simulation
+		update(row)
+			publish a new dataframe row
+		tick(env)
+			publish the server states and the simulation speed
+		render()
+			text of the metrics
+		close()
+			stop the HTTP server
+
+	"""
+	def __init__(self, net, kind, exp, port):
+		self.net = net
+		self.stat = net.stat
+		self.sc = net.sc
+		self.kind = kind
+		self.labels = 'kind="{}",exp="{}",seed="{}"'.format(kind, exp, self.sc.SEED)
+		self.sessions = 0
+		self.row = {}
+		self.snapshot = {}
+
+		exporter = self
+
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				if self.path != '/metrics':
+					self.send_error(404)
+					return
+				body = exporter.render()
+				self.send_response(200)
+				self.send_header('Content-Type', 'text/plain; version=0.0.4')
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, format, *args):
+				pass
+
+		self.server = HTTPServer(('127.0.0.1', port), Handler)
+		thread = threading.Thread(target=self.server.serve_forever)
+		thread.daemon = True
+		thread.start()
+
+
+	def attach(self, env):
+		"""Publish the values of a simulation.
+
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SimPy Environment class
+
+		"""
+		self.counter = EventCounter(env)
+		self.stat.listeners.append(self.update)
+		env.process(self.tick(env))
+
+
+	def update(self, row):
+		"""Publish a new dataframe row.
+
+		Parameters
+		----------
+			row : dict
+				new dataframe row
+
+		"""
+		self.sessions += row['tot.cl']
+		self.row = {
+			'cdn_sessions_total':self.sessions,
+			'cdn_avg_session_seconds':row['avg.sess.time'],
+			'cdn_cost_usd_per_hour':row['tot.cost']
+		}
+		snapshot = dict(self.snapshot)
+		snapshot.update(self.row)
+		self.snapshot = snapshot
+
+
+	def tick(self, env):
+		"""Every METRICS_PERIOD simulated seconds publish the server states, the counters
+		and the simulation speed.
+
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SimPy Environment class
+
+		Yields
+		------
+			simpy.events.Timeout
+				after METRICS_PERIOD seconds
+
+		"""
+		last, last_now, last_events = timer(), env.now, self.counter.count
+		while True:
+			yield env.timeout(self.sc.METRICS_PERIOD)
+			wall, n = timer(), self.counter.count
+			values = dict(self.row)
+			values['cdn_simulated_seconds'] = env.now
+			values['cdn_events_total'] = n
+			if wall > last:
+				values['cdn_simulation_speed'] = (env.now - last_now)/(wall - last)
+				values['cdn_events_per_second'] = (n - last_events)/(wall - last)
+			values['cdn_requests_total'] = self.stat.n_req
+			if hasattr(self.stat, 'n_retry'):
+				values['cdn_retries_total'] = self.stat.n_retry
+			values['cdn_local_request_ratio'] = self.stat.local_req_perc/100.
+
+			active = {}
+			capacity = {}
+			for u in self.sc.COUNTRY:
+				servers = [
+					server for server in self.net.s[u]
+					if self.kind == 'static' or not (server.in_idle or server.completing)
+				]
+				active[u] = len(servers)
+				capacity[u] = sum(server.available_capacity for server in servers)
+			values['cdn_active_servers'] = active
+			values['cdn_available_capacity_bps'] = capacity
+			self.snapshot = values
+			last, last_now, last_events = wall, env.now, n
+
+
+	def render(self):
+		"""Text of the metrics in the Prometheus exposition format.
+
+		Returns
+		-------
+			str
+				one HELP and TYPE comment per metric, one sample per metric and country
+
+		"""
+		values = self.snapshot
+		lines = []
+		for name, kind, text in METRICS:
+			if name not in values:
+				continue
+			lines.append("# HELP {} {}".format(name, text))
+			lines.append("# TYPE {} {}".format(name, kind))
+			value = values[name]
+			if isinstance(value, dict):
+				for u in sorted(value):
+					lines.append('{}{{{},country="{}"}} {!r}'.format(
+						name, self.labels, u, float(value[u])
+					))
+			else:
+				lines.append('{}{{{}}} {!r}'.format(name, self.labels, float(value)))
+		return "\n".join(lines) + "\n"
+
+
+	def close(self):
+		"""Stop the HTTP server."""
+		self.server.shutdown()
+		self.server.server_close()
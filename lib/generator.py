@@ -0,0 +1,207 @@
+import numpy as np
+
+from lib.scenario import default
+from lib.trace import TRACE_DTYPE
+
+
+class TraceGenerator:
+	"""Generate a synthetic request log in bulk. The workload follows the same model of
+	the simulator: in each simulated hour the number of sessions started in a country is
+	a Poisson random variable whose mean is given by the country daily users and the
+	hourly traffic at the local time. The session start times are uniformly distributed
+	in the hour, all the requests of a session share its start time.
+	The sessions are generated one hour at a time, sorted by start time and split into
+	chunks of at most 'chunk' requests, so the memory needed does not depend on the
+	trace length.
+
+	Parameters
+	----------
+		sizes : str
+			request size distribution. 'uniform' in [MIN_REQ, MAX_REQ] or 'pareto', a
+			bounded Pareto in [MIN_REQ, MAX_TAIL_REQ]
+		sessions : str
+			session length distribution. 'uniform' in [10, 100] or 'pareto', a bounded
+			Pareto in [10, MAX_TAIL_SESSION]
+		seed : int
+			seed of the random number generator, SEED if None
+		chunk : int
+			maximum number of requests generated at once, TRACE_CHUNK if None
+		scenario : Scenario
+			workload configuration. The lib.config values are used if None
+
+	Attributes
+	----------
+		sizes : str
+			request size distribution
+		sessions : str
+			session length distribution
+		rng : numpy.random.RandomState
+			random number generator
+		chunk : int
+			maximum number of requests generated at once
+		n_sess : int
+			number of generated sessions
+		sc : Scenario
+			workload configuration
+
+	Methods
+	-------
+		generate(writer, simtime)
+			generate the requests up to the provided simulated time
+		sessionLengths(n)
+			draw the number of requests of n sessions
+		requestSizes(n)
+			draw the size of n requests
+		boundedPareto(u, low, high)
+			turn uniform samples into bounded Pareto samples
+
+	"""
+	def __init__(self, sizes='uniform', sessions='uniform', seed=None, chunk=None,
+			scenario=None):
+		self.sc = scenario or default()
+		if sizes not in ('uniform', 'pareto'):
+			raise ValueError("unknown size distribution '{}'".format(sizes))
+		if sessions not in ('uniform', 'pareto'):
+			raise ValueError("unknown session distribution '{}'".format(sessions))
+		self.sizes = sizes
+		self.sessions = sessions
+		self.rng = np.random.RandomState(self.sc.SEED if seed is None else seed)
+		self.chunk = chunk or self.sc.TRACE_CHUNK
+		self.n_sess = 0
+
+
+	def generate(self, writer, simtime=None):
+		"""Generate the requests up to the provided simulated time and pass them to the
+		writer chunk by chunk.
+
+		Parameters
+		----------
+			writer : TraceWriter
+				instance of the TraceWriter class storing the requests
+			simtime : float
+				seconds of simulation covered by the trace, SIMTIME if None
+
+		Returns
+		-------
+			int
+				number of generated requests
+
+		"""
+		sc = self.sc
+		if simtime is None:
+			simtime = sc.SIMTIME
+		n_req = 0
+		for h in range(int(np.ceil(simtime/3600.))):
+			begin = h*3600.
+			end = min(begin + 3600., simtime)
+
+			# number of sessions started in the hour in each country
+			hour = (h + sc.START)%24
+			starts = []
+			regions = []
+			for i, u in enumerate(sc.COUNTRY):
+				local_time = (hour + sc.TIMEZONE[u])%24
+				avg = sc.DAILY_USERS[u]*sc.TRAFFIC[local_time]*(end - begin)/3600.
+				n = self.rng.poisson(avg)
+				starts.append(self.rng.uniform(begin, end, n))
+				regions.append(np.full(n, i, dtype=np.uint8))
+			starts = np.concatenate(starts)
+			regions = np.concatenate(regions)
+			if len(starts) == 0:
+				continue
+
+			# sessions of the hour sorted by start time
+			order = np.argsort(starts, kind='mergesort')
+			sess = np.empty(len(starts), dtype=TRACE_DTYPE)
+			sess['time'] = starts[order]
+			sess['region'] = regions[order]
+			sess['session'] = np.arange(self.n_sess, self.n_sess + len(starts))
+			lengths = self.sessionLengths(len(starts))
+			self.n_sess += len(starts)
+
+			# split the hour into chunks of at most 'chunk' requests. A session is
+			# never split
+			cum = np.cumsum(lengths)
+			bounds = np.searchsorted(
+				cum,
+				np.arange(self.chunk, cum[-1], self.chunk),
+				side = 'right'
+			)
+			bounds = np.unique(np.concatenate(([0], bounds, [len(lengths)])))
+			for first, last in zip(bounds[:-1], bounds[1:]):
+				# a single pass copies the session fields to all its requests
+				rec = np.repeat(sess[first:last], lengths[first:last])
+				rec['size'] = self.requestSizes(len(rec))
+				writer.write(rec)
+				n_req += len(rec)
+
+		return n_req
+
+
+	def sessionLengths(self, n):
+		"""Draw the number of requests of n sessions.
+
+		Parameters
+		----------
+			n : int
+				number of sessions
+
+		Returns
+		-------
+			numpy.ndarray
+				number of requests of each session
+
+		"""
+		if self.sessions == 'uniform':
+			return self.rng.randint(10, 101, n)
+		u = self.rng.random_sample(n)
+		return self.boundedPareto(u, 10, self.sc.MAX_TAIL_SESSION + 1).astype(np.int64)
+
+
+	def requestSizes(self, n):
+		"""Draw the size of n requests. The sizes are stored as float32, so a single 32 
+		bits random integer is drawn per request.
+
+		Parameters
+		----------
+			n : int
+				number of requests
+
+		Returns
+		-------
+			numpy.ndarray
+				request sizes in bits
+
+		"""
+		u = self.rng.randint(0, 2**32, n, dtype=np.uint32)
+		if self.sizes == 'uniform':
+			sizes = np.multiply(
+				u, np.float32((self.sc.MAX_REQ - self.sc.MIN_REQ)/2.**32), dtype=np.float32
+			)
+			sizes += np.float32(self.sc.MIN_REQ)
+			return sizes
+		return self.boundedPareto((u + .5)/2.**32, self.sc.MIN_REQ, self.sc.MAX_TAIL_REQ)
+
+
+	def boundedPareto(self, u, low, high):
+		"""Turn uniform samples into samples of a bounded Pareto distribution with shape
+		TAIL_ALPHA by inverting its cumulative distribution function.
+
+		Parameters
+		----------
+			u : numpy.ndarray
+				samples uniformly distributed in (0, 1)
+			low : float
+				lower bound
+			high : float
+				upper bound
+
+		Returns
+		-------
+			numpy.ndarray
+				samples in [low, high)
+
+		"""
+		alpha = self.sc.TAIL_ALPHA
+		tail = 1 - (float(low)/high)**alpha
+		return low*(1 - u*tail)**(-1./alpha)
@@ -0,0 +1,393 @@
+import math
+
+
+class Hybrid:
+	"""Hybrid fluid/discrete-event simulation of the synthetic workload. Each simulated
+	hour is advanced either event by event or with a fluid approximation, chosen at
+	the beginning of the hour from the expected load of the active servers:
+
+	- fluid, if in every country the expected in-flight requests per active server
+	  plus three standard deviations and one request of MAX_REQ bits use less than
+	  HYBRID_MARGIN times the capacity the servers can take before reaching their
+	  wake-up threshold (dynamic) or their SERVER_LIMIT (static)
+	- discrete-event otherwise
+
+	In a fluid hour the arrivals of each country are drawn every HYBRID_STEP seconds.
+	The requests are served locally with the mean service time of the M/G/inf fixed
+	point of the local servers, so the session times and the request counters are
+	updated without creating any client, and the time-weighted usage of the active
+	servers gets the mean in-flight load of the fixed point. The server states do not
+	change, apart from the dynamic servers which could go idle: in the discrete-event
+	simulation they do it at their next request, so they do it at the first fluid step.
+	When the simulation goes back to the discrete-event engine, the sessions still
+	running at the end of the fluid hour become clients sending their remaining
+	requests, so the servers see the same in-flight load. Their session time is
+	measured from the switch. The clients of a discrete-event hour finish their
+	sessions even if the next hour is fluid.
+
+	The dataframe is updated every HYBRID_STEP seconds instead of at the Japan
+	arrivals. The caches and the replay of a request log are not supported.
+
+	Parameters
+	----------
+		net : Network
+			instance of the Network class
+		kind : str
+			'static' (fixed number of servers) or 'dynamic' (dynamic server allocation)
+		exp : int
+			deploy strategy identification number (static). Ignored by the dynamic
+			simulator, whose strategy is given to its Network
+
+	Attributes
+	----------
+		net : Network
+			instance of the Network class
+		stat : instance
+			instance of the Stats class of the network
+		sc : Scenario
+			simulation configuration
+		kind : str
+			simulator kind
+		exp : int
+			deploy strategy identification number
+		plan : dict
+			the keys are the hours from the start, the values are True for the fluid
+			hours and False for the discrete-event ones
+		cnt : dict
+			client identification numbers of each country
+
+	Methods
+	-------
+		start(env)
+			start the arrival processes and the fluid steps
+		rate(h, key)
+			session arrival rate of a country in an hour
+		active(key)
+			number of servers of a country accepting requests
+		isFluid(h)
+			choose the engine of an hour
+		serviceTime(key, rate)
+			mean service time and in-flight requests per server of a country
+		arrival(env, key)
+			discrete-event arrivals of a country
+		clock(env)
+			fluid steps and dataframe updates
+		fluidStep(env, dt, handover)
+			advance the system of dt seconds with the fluid approximation
+		settle(env)
+			put in idle the dynamic servers which would go idle
+		newClient(env, key)
+			initialize a new client
+		report()
+			summary of the engines used
+
+	Raises
+	------
+		ValueError
+			if the caches are enabled or the simulator kind is unknown
+
+	"""
+	def __init__(self, net, kind, exp=1):
+		if kind not in ('static', 'dynamic'):
+			raise ValueError("unknown simulator: {}".format(kind))
+		if net.sc.CACHE_POLICY is not None:
+			raise ValueError("the hybrid simulation requires CACHE_POLICY = None")
+		self.net = net
+		self.stat = net.stat
+		self.sc = net.sc
+		self.kind = kind
+		self.exp = exp
+		self.plan = {}
+		self.cnt = dict((u, 0) for u in self.sc.COUNTRY)
+
+
+	def start(self, env):
+		"""Start a discrete-event arrival process for each country and the process of
+		the fluid steps.
+
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SimPy Environment class
+
+		"""
+		for u in self.sc.COUNTRY:
+			env.process(self.arrival(env, u))
+		env.process(self.clock(env))
+
+
+	def rate(self, h, key):
+		"""Session arrival rate of a country in the h-th hour from the start."""
+		local_time = (h + self.sc.START + self.sc.TIMEZONE[key]) % 24
+		return self.sc.DAILY_USERS[key]*self.sc.TRAFFIC[local_time]/3600.
+
+
+	def active(self, key):
+		"""Number of servers of a country accepting requests, at least one."""
+		if self.kind == 'static':
+			return max(len(self.net.s[key]), 1)
+		n = 0
+		for server in self.net.s[key]:
+			if not server.in_idle and not server.completing:
+				n += 1
+		return max(n, 1)
+
+
+	def serviceTime(self, key, rate):
+		"""Mean service time of a request and mean in-flight requests per active server
+		of a country. Each session keeps one request in flight, which takes the mean
+		request size from the available capacity of a local server, so the service
+		time is the fixed point of T = E[t1] + E[size]/(capacity - m*E[size]) with
+		m = rate*E[k]*T/active.
+
+		Parameters
+		----------
+			key : str
+				country
+			rate : float
+				session arrival rate
+
+		Returns
+		-------
+			tuple
+				mean service time in seconds and mean in-flight requests per server
+
+		"""
+		size = (self.sc.MIN_REQ + self.sc.MAX_REQ)/2.
+		if self.kind == 'static':
+			capacity = self.sc.SERVER_LIMIT*self.sc.CAPACITY
+		else:
+			capacity = self.sc.CAPACITY
+		per_server = rate*55./self.active(key)
+		time = 5.5e-3 + size/capacity
+		for i in range(50):
+			m = per_server*time
+			if m*size >= capacity:
+				return float('inf'), m
+			time = 5.5e-3 + size/(capacity - m*size)
+		return time, per_server*time
+
+
+	def isFluid(self, h):
+		"""Choose the engine of the h-th hour from the start. The choice is made the first
+		time the hour is queried, from the current active servers.
+
+		Parameters
+		----------
+			h : int
+				hours from the start of the simulation
+
+		Returns
+		-------
+			bool
+				True if the hour is advanced with the fluid approximation
+
+		"""
+		if h in self.plan:
+			return self.plan[h]
+		if self.kind == 'static':
+			headroom = self.sc.SERVER_LIMIT*self.sc.CAPACITY
+		else:
+			hour = (h + self.sc.START) % 24
+			if hour >= 4 and hour < 13:
+				headroom = self.sc.CAPACITY - self.sc.MAX_H
+			else:
+				headroom = self.sc.CAPACITY - self.sc.MAX_L
+
+		fluid = True
+		for u in self.sc.COUNTRY:
+			time, m = self.serviceTime(u, self.rate(h, u))
+			peak = (m + 3*math.sqrt(m) + 1)*self.sc.MAX_REQ
+			if peak > self.sc.HYBRID_MARGIN*headroom:
+				fluid = False
+				break
+		self.plan[h] = fluid
+		return fluid
+
+
+	def newClient(self, env, key):
+		"""Initialize a new client of a country.
+
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SimPy Environment class
+			key : str
+				country of the client
+
+		Returns
+		-------
+			Client
+				the new client
+
+		"""
+		self.cnt[key] += 1
+		if self.kind == 'static':
+			from lib.client_static import Client
+			cl = Client(env, key, self.cnt[key], self.net.s, self.stat, self.exp,
+				scenario=self.sc, planner=self.net.planner(self.exp))
+		else:
+			from lib.client_dynamic import Client
+			cl = Client(env, key, self.cnt[key], self.net.s, self.stat,
+				scenario=self.sc)
+		self.net.s = cl.rack_list
+		return cl
+
+
+	def arrival(self, env, key):
+		"""Discrete-event arrivals of a country, as in Network.arrival. The process waits
+		for the end of the fluid hours, an arrival falling in a fluid hour is dropped as
+		the fluid steps account for it.
+
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SimPy Environment class
+			key : str
+				country name
+
+		Yields
+		------
+			simpy.events.Timeout
+				after the inter_arrival delay, or until the end of a fluid hour
+
+		"""
+		while True:
+			h = int(env.now/3600)
+			if self.isFluid(h):
+				yield env.timeout((h + 1)*3600 - env.now)
+				continue
+
+			inter_arrival = self.sc.streams.arrival(key).poisson(1/self.rate(h, key))
+			yield env.timeout(inter_arrival)
+
+			if not self.isFluid(int(env.now/3600)):
+				self.newClient(env, key)
+				self.stat.n_clients[key]+=1
+
+
+	def clock(self, env):
+		"""Every HYBRID_STEP seconds advance the fluid hours and update the dataframe.
+
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SimPy Environment class
+
+		Yields
+		------
+			simpy.events.Timeout
+				after HYBRID_STEP seconds
+
+		"""
+		while True:
+			yield env.timeout(self.sc.HYBRID_STEP)
+			h = int((env.now - self.sc.HYBRID_STEP)/3600)
+			if self.isFluid(h):
+				handover = (int(env.now/3600) != h
+					and not self.isFluid(int(env.now/3600)))
+				self.fluidStep(env, self.sc.HYBRID_STEP, handover)
+
+			if self.kind == 'static':
+				self.net.acquire(env, self.exp)
+			else:
+				self.net.acquire(env)
+
+
+	def fluidStep(self, env, dt, handover):
+		"""Advance the system of dt seconds with the fluid approximation. The arrivals
+		are Poisson, the number of requests of a session is uniform in [10, 100] and
+		its duration is the number of requests times the mean service time.
+
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SimPy Environment class
+			dt : float
+				length of the step in seconds
+			handover : bool
+				True if the next step is simulated event by event. The sessions still
+				running at the end of the step become clients
+
+		"""
+		h = int((env.now - dt)/3600)
+		size = (self.sc.MIN_REQ + self.sc.MAX_REQ)/2.
+		if self.kind == 'dynamic':
+			self.settle(env)
+
+		for u in self.sc.COUNTRY:
+			rng = self.sc.streams.fluid(u)
+			rate = self.rate(h, u)
+			time, queue = self.serviceTime(u, rate)
+			for server in self.net.s[u]:
+				if server.usage is not None and (self.kind == 'static'
+				  or not (server.in_idle or server.completing)):
+					server.usage.load(dt, queue*size, queue)
+			n = rng.poisson(rate*dt)
+			if n == 0:
+				continue
+			k = rng.randint(10, 101, n)
+			self.stat.n_clients[u] += n
+
+			if handover:
+				# a session started at a uniform instant of the step is still running
+				# if it lasts more than the time left, its elapsed requests are uniform
+				elapsed = rng.uniform(0, dt, n)
+				running = k*time > elapsed
+				done = (elapsed[running]/time).astype(int)
+				for left in (k[running] - done).tolist():
+					cl = self.newClient(env, u)
+					cl.k = left
+				n_req = int(k[~running].sum() + done.sum())
+				k = k[~running]
+			else:
+				n_req = int(k.sum())
+
+			self.stat.n_req += n_req
+			self.stat.local_req += n_req
+			if self.stat.n_req > 0:
+				self.stat.local_req_perc = 100*self.stat.local_req/self.stat.n_req
+			self.stat.sess_sum += float(k.sum())*time
+			self.stat.sess_cnt += len(k)
+			if self.stat.sess_times is not None:
+				self.stat.sess_times.extend((k*time).tolist())
+
+
+	def settle(self, env):
+		"""Put in idle the dynamic servers which would go idle at their next request, as
+		long as the minimum number of active servers of their country is ensured.
+
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SimPy Environment class
+
+		"""
+		for u in self.sc.COUNTRY:
+			for server in self.net.s[u]:
+				if server.can_idle and not server.in_idle and not server.completing \
+				  and server.minActiveServ():
+					if server.finish_queue:
+						server.completing = True
+						env.process(server.endService(env))
+					else:
+						server.in_idle = True
+						server.can_idle = False
+						server.account(env.now)
+
+
+	def report(self):
+		"""Summary of the engines used.
+
+		Returns
+		-------
+			str
+				number of fluid hours and their list
+
+		"""
+		fluid = sorted(h for h in self.plan if self.plan[h])
+		return "hybrid: {} of {} hours fluid ({})".format(
+			len(fluid),
+			len(self.plan),
+			", ".join("{:02d}h".format((h + self.sc.START) % 24) for h in fluid) or "none"
+		)
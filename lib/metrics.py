@@ -0,0 +1,326 @@
+from timeit import default_timer as timer
+
+import numpy as np
+
+import tempfile
+import fcntl
+import mmap
+import time
+import os
+
+# Slot of a run in the shared region. seq is odd while the run is writing the slot,
+# pid is 0 for a free slot, beat is the wall clock time of the last update
+SLOT = np.dtype([
+	('seq', '<i8'),
+	('pid', '<i8'),
+	('label', 'S40'),
+	('beat', '<f8'),
+	('simtime', '<f8'),
+	('horizon', '<f8'),
+	('sessions', '<f8'),
+	('local', '<f8'),
+	('cost', '<f8'),
+	('active', '<f8'),
+	('events', '<f8'),
+	('eps', '<f8')
+])
+
+# Dataframe column of the active servers of each simulator
+ACTIVE = ['tot.act.s.', 'tot.servers']
+
+
+def defaultPath():
+	"""Path of the shared region, in the RAM-backed /dev/shm if available.
+
+	Returns
+	-------
+		str
+			path of the region file
+
+	"""
+	folder = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+	return os.path.join(folder, 'cdn-metrics')
+
+
+def alive(pid):
+	"""True if a process exists."""
+	try:
+		os.kill(pid, 0)
+	except OSError:
+		return False
+	return True
+
+
+class Region:
+	"""Memory-mapped region of METRICS_SLOTS slots, shared by all the runs of the
+	machine. The slots are a NumPy view of the mapping, so the writes of a run are
+	seen by the readers without any copy or system call. A run claims a free slot,
+	or the slot of a dead process, under a file lock.
+	Python 2 has no multiprocessing.shared_memory, the region is a file mapped by
+	every process, in /dev/shm when available, so it stays in memory.
+
+	Parameters
+	----------
+		path : str
+			path of the region file, created if missing
+		slots : int
+			number of slots
+
+	Attributes
+	----------
+		path : str
+			path of the region file
+		mm : mmap.mmap
+			mapping of the file
+		slots : numpy.ndarray
+			view of the slots, with the SLOT dtype
+
+	Methods
+	-------
+		claim(label, horizon)
+			take a free slot for the current process
+		snapshot()
+			consistent copy of the slots in use
+		close()
+			unmap the region
+
+	"""
+	def __init__(self, path, slots):
+		self.path = path
+		size = slots*SLOT.itemsize
+		fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+		try:
+			fcntl.flock(fd, fcntl.LOCK_EX)
+			if os.fstat(fd).st_size < size:
+				os.ftruncate(fd, size)
+			fcntl.flock(fd, fcntl.LOCK_UN)
+			self.mm = mmap.mmap(fd, size)
+		finally:
+			os.close(fd)
+		self.slots = np.frombuffer(self.mm, dtype=SLOT, count=slots)
+
+
+	def claim(self, label, horizon):
+		"""Take a free slot, or the slot of a dead process, for the current process.
+
+		Parameters
+		----------
+			label : str
+				name of the run shown by the monitor
+			horizon : float
+				simulated seconds of the run
+
+		Returns
+		-------
+			int
+				index of the slot, None if all the slots are taken
+
+		"""
+		fd = os.open(self.path, os.O_RDWR)
+		try:
+			fcntl.flock(fd, fcntl.LOCK_EX)
+			for i in range(len(self.slots)):
+				pid = int(self.slots[i]['pid'])
+				if pid == 0 or not alive(pid):
+					slot = self.slots[i:i + 1]
+					slot['seq'] += 1
+					slot['pid'] = os.getpid()
+					slot['label'] = label[:SLOT['label'].itemsize]
+					slot['beat'] = time.time()
+					slot['horizon'] = horizon
+					for name in ('simtime', 'sessions', 'local', 'cost', 'active', 'events', 'eps'):
+						slot[name] = 0.
+					slot['seq'] += 1
+					return i
+			return None
+		finally:
+			os.close(fd)
+
+
+	def snapshot(self, retries=100):
+		"""Consistent copy of the slots in use. A slot being written is read again.
+
+		Parameters
+		----------
+			retries : int
+				reads of a slot before giving up on it
+
+		Returns
+		-------
+			numpy.ndarray
+				copy of the slots whose process is alive
+
+		"""
+		rows = []
+		for i in np.nonzero(self.slots['pid'])[0]:
+			for attempt in range(retries):
+				before = int(self.slots[i]['seq'])
+				row = self.slots[i].copy()
+				if before % 2 == 0 and int(self.slots[i]['seq']) == before:
+					break
+			else:
+				continue
+			if alive(int(row['pid'])):
+				rows.append(row)
+		return np.array(rows, dtype=SLOT)
+
+
+	def close(self):
+		"""Unmap the region."""
+		self.slots = None
+		self.mm.close()
+
+
+class EventCounter:
+	"""Number of events processed by a SimPy environment since the counter was created.
+	The step method of the environment is wrapped, as the Profiler does.
+
+	Parameters
+	----------
+		env : simpy.core.Environment
+			instance of the SimPy Environment class
+
+	Attributes
+	----------
+		count : int
+			number of processed events
+
+	"""
+	def __init__(self, env):
+		self.count = 0
+		step = env.step
+		def countedStep():
+			self.count += 1
+			step()
+		env.step = countedStep
+
+
+class Publisher:
+	"""Publish the counters of a run in a slot of the shared region: simulated time,
+	sessions, percentage of local requests, cost, active servers and events per wall
+	clock second. The dataframe values are updated with each new row, the time and the
+	events every METRICS_PERIOD simulated seconds.
+
+	Parameters
+	----------
+		label : str
+			name of the run shown by the monitor
+		scenario : Scenario
+			simulation configuration
+
+	Attributes
+	----------
+		label : str
+			name of the run
+		sc : Scenario
+			simulation configuration
+		region : Region
+			shared region, None if no slot was free
+		slot : numpy.ndarray
+			view of the slot of the run
+		counter : EventCounter
+			events processed by the simulation
+
+	Methods
+	-------
+		attach(env, stat)
+			publish the counters of a simulation
+		update(row)
+			publish a new dataframe row
+		tick(env)
+			publish the simulated time and the events
+		close()
+			release the slot
+
+	"""
+	def __init__(self, label, scenario):
+		self.label = label
+		self.sc = scenario
+		self.counter = None
+		self.region = Region(scenario.METRICS_FILE or defaultPath(), scenario.METRICS_SLOTS)
+		i = self.region.claim(label, scenario.SIMTIME)
+		if i is None:
+			self.region.close()
+			self.region = None
+			self.slot = None
+		else:
+			self.slot = self.region.slots[i:i + 1]
+
+
+	def attach(self, env, stat):
+		"""Publish the counters of a simulation.
+
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SimPy Environment class
+			stat : instance
+				instance of the Stats class
+
+		"""
+		if self.slot is None:
+			return
+		self.counter = EventCounter(env)
+		stat.listeners.append(self.update)
+		env.process(self.tick(env))
+
+
+	def update(self, row):
+		"""Publish a new dataframe row.
+
+		Parameters
+		----------
+			row : dict
+				new dataframe row
+
+		"""
+		slot = self.slot
+		slot['seq'] += 1
+		slot['sessions'] += row['tot.cl']
+		slot['local'] = row['local.req']
+		slot['cost'] = row['tot.cost']
+		for col in ACTIVE:
+			if col in row:
+				slot['active'] = row[col]
+		slot['beat'] = time.time()
+		slot['seq'] += 1
+
+
+	def tick(self, env):
+		"""Every METRICS_PERIOD simulated seconds publish the simulated time, the events
+		processed and their rate.
+
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SimPy Environment class
+
+		Yields
+		------
+			simpy.events.Timeout
+				after METRICS_PERIOD seconds
+
+		"""
+		slot = self.slot
+		last, last_events = timer(), self.counter.count
+		while True:
+			yield env.timeout(self.sc.METRICS_PERIOD)
+			now, n = timer(), self.counter.count
+			slot['seq'] += 1
+			slot['simtime'] = env.now
+			slot['events'] = n
+			if now > last:
+				slot['eps'] = (n - last_events)/(now - last)
+			slot['beat'] = time.time()
+			slot['seq'] += 1
+			last, last_events = now, n
+
+
+	def close(self):
+		"""Release the slot."""
+		if self.slot is not None:
+			self.slot['seq'] += 1
+			self.slot['pid'] = 0
+			self.slot['seq'] += 1
+			self.slot = None
+			self.region.close()
@@ -1,18 +1,19 @@
 from client_dynamic import Client
 from server_dynamic import Server
-from config import *
+from scenario import default
+from cache import Catalog
+
+from collections import deque
 
 import simpy as sp
 import numpy as np
 import datetime
 
-np.random.seed(SEED)
-
 class Network:
 	""" Implementation of a Content Delivery Network. Server racks are located in five
 	countries: India, China, USA, Japan, Brazil. A rack with x servers is initially 
 	placed in each contry and the total CDN mantaining cost is calculated every 'x' minutes.
-	The value of 'x' is stored in the lib.config file.
+	The value of 'x' is stored in the simulation scenario.
 	
 	Parameters
 	----------
@@ -20,6 +21,8 @@ class Network:
 			instance of Stats class. It is used to analyze performances and results
 		exp : int
 			wake up strategy identification number
+		scenario : Scenario
+			simulation configuration. The lib.config values are used if None
 			
 	Attributes
 	----------
@@ -29,8 +32,10 @@ class Network:
 			instance of the Stats class used to analyze the simulator performances
 		s : dict
 			the keys are the countries, the values are the servers rack
-		cl : instance
-			instance of the Client class
+		sc : Scenario
+			simulation configuration
+		catalog : Catalog
+			catalog of the requested objects. None if the caches are disabled
 	
 	Methods
 	-------
@@ -38,24 +43,40 @@ class Network:
 			initialize a servers rack in each country.
 		arrival(env, avg_dly_cl, key)
 			simulate a request arrival
+		acquire(env)
+			every 'x' minutes the statistics are updated and saved
+		replay(env, trace)
+			replay a request log through the CDN
 		updateCost()
 			every 'x' minsutes the total mantaining cost of the CDN is updated
 		getTime(now)
 			manage the simulation time by turning the seconds into hh:mm:ss format.
 	
 	"""
-	def __init__(self, stat, exp):
+	def __init__(self, stat, exp, scenario=None):
 		self.s = {}
 		self.total_cost = 0
 		self.stat = stat
 		self.exp = exp
+		self.sc = scenario or default()
+		self.acquisition = 0
+		if self.sc.CACHE_POLICY is None:
+			self.catalog = None
+		else:
+			self.catalog = Catalog(
+				self.sc.CATALOG_SIZE, 
+				self.sc.ZIPF_ALPHA, 
+				self.sc.SEED, 
+				self.sc.MIN_REQ, 
+				self.sc.MAX_REQ
+			)
 				
 		self.startServers()
 		
 
 	def startServers(self):
 		"""Initialize a servers rack in each country. The starting number of servers in a
-		 rack is stored in the lib.config file.
+		 rack is stored in the simulation scenario.
 		
 		Attributes
 		----------
@@ -64,25 +85,27 @@ class Network:
 		"""
 		cnt = 0
 		# Deploy servers rack
-		for u in COUNTRY:
+		for u in self.sc.COUNTRY:
 			self.rack = []
-			for i in range(SERVERS_DYN[u]):
+			for i in range(self.sc.SERVERS_DYN[u]):
 				cnt+=1
-				self.rack.append(Server(u, cnt, self.exp))
+				self.rack.append(Server(u, cnt, self.exp, self.sc))
 				self.s[u] = self.rack
 		
 		# Provide the server list to each server
-		for u in COUNTRY:
+		for u in self.sc.COUNTRY:
 			for server in self.s[u]:
 				server.server_list = self.s
-			for i in range(START_ACTIVE[u]):
-				self.s[u][i].inIdle = False				
+			for i in range(self.sc.START_ACTIVE[u]):
+				self.s[u][i].in_idle = False				
+				# the simulation starts at time 0
+				self.s[u][i].account(0.)
 		
 		
 	def arrival(self, env, avg_dly_cl, key):
 		"""Cyclically initialize new clients after an exponentially distributed time 
 		interval. Every 'x' minutes the total mantaining cost of the CDN is evaluated.
-		The value of 'x' is stored in the lib.config file.
+		The value of 'x' is stored in the simulation scenario.
 		
 		Parameters
 		----------
@@ -100,82 +123,201 @@ class Network:
 			
 		"""
 		cnt = 0
-		hour = START
-		acquisition = 0
+		hour = self.sc.START
 
 		while True:
 			# time manager
-			if int(env.now/(INTERACQ*60))!=acquisition:
-				acquisition = int(env.now/(INTERACQ*60))
-				# update the cost every 'x' minutes
-				if key == "Japan":
-					# update the average session time
-					self.stat.avgSessionTime()
-					cost = self.updateCost()
-					timing = self.getTime(env.now)
-					active = self.stat.nActive(self.s)
-					act_ch = self.stat.singActive(self.s['China'])
-					act_ja = self.stat.singActive(self.s['Japan'])
-					act_br = self.stat.singActive(self.s['Brazil'])
-					act_us = self.stat.singActive(self.s['USA'])
-					act_in = self.stat.singActive(self.s['India'])
-					print """------------------------------
-					{} - avg.sess.time: {}
-						   local requests: {}%
-						   tot.cost: {} USD
-						   active: {}""".format(
-						timing, 
-						self.stat.avg_sess_time,
-						self.stat.local_req_perc,
-						cost,
-						active
-					)
-
-					self.stat.createDF(
-						timing, 
-						self.stat.avg_sess_time,
-						self.stat.local_req_perc,
-						cost,
-						act_ch,
-						act_ja,
-						act_br,
-						act_us,
-						act_in,
-						active,
-						self.exp
-					)
-			# update the simulated hours
-			if int(env.now/3600)+START!=hour:
-				hour = int(env.now/3600)+START
-				if hour >=24:
-					hour = hour-24
+			if key == "Japan":
+				self.acquire(env)
+			# update the simulated hours, the runs can last several days
+			hour = (int(env.now/3600)+self.sc.START)%24
 			# timezone managing
-			if hour+TIMEZONE[key]<0:
-				local_time = 24+(hour+TIMEZONE[key])
+			if hour+self.sc.TIMEZONE[key]<0:
+				local_time = 24+(hour+self.sc.TIMEZONE[key])
 			else:
-				local_time = hour+TIMEZONE[key]
+				local_time = hour+self.sc.TIMEZONE[key]
 			# new day
 			if local_time >= 24:
 				local_time-=24
 			
 			# define the arrival rate and the arrival interval
-			avg_hly_cl = avg_dly_cl * TRAFFIC[local_time]
+			avg_hly_cl = avg_dly_cl * self.sc.TRAFFIC[local_time]
 			arrival_rate = avg_hly_cl/3600
-			inter_arrival = np.random.poisson(1/arrival_rate)
+			if self.sc.ARRIVAL_BUCKET is not None:
+				# batched arrivals: the sessions of the next bucket are drawn at once and
+				# started at their offsets, with a single wake up of the process
+				bucket = self.sc.ARRIVAL_BUCKET
+				rng = self.sc.streams.arrival(key)
+				n = rng.poisson(arrival_rate*bucket)
+				for offset in np.sort(rng.uniform(0, bucket, n)).tolist():
+					cnt+=1
+					cl = Client(
+						env,
+						key,
+						cnt,
+						self.s,
+						self.stat,
+						catalog=self.catalog,
+						scenario=self.sc,
+						delay=offset
+					)
+					self.s = cl.rack_list
+				self.stat.n_clients[key]+=n
+				yield env.timeout(bucket)
+				continue
+			
+			inter_arrival = self.sc.streams.arrival(key).poisson(1/arrival_rate)
 
 			yield env.timeout(inter_arrival)
 			
 			# initialize a new client
 			cnt+=1 #client id
-			self.cl = Client(env, key, cnt, self.s, self.stat)
-			self.s = self.cl.rack_list
+			# the client is not referenced by the network, so it is released at the end
+			# of its session
+			cl = Client(
+				env, 
+				key, 
+				cnt, 
+				self.s, 
+				self.stat, 
+				catalog=self.catalog, 
+				scenario=self.sc
+			)
+			self.s = cl.rack_list
 			self.stat.n_clients[key]+=1
 			
 	
+	def acquire(self, env):
+		"""Every 'x' minutes update the average session time, the total mantaining cost
+		of the CDN and the number of active servers, print them and save them to the 
+		dataframe. The value of 'x' is stored in the simulation scenario.
+		
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SymPi Environment class
+		
+		Attributes
+		----------
+			acquisition : int
+				index of the last acquisition interval
+		
+		"""
+		if int(env.now/(self.sc.INTERACQ*60))!=self.acquisition:
+			self.acquisition = int(env.now/(self.sc.INTERACQ*60))
+			# update the average session time
+			self.stat.avgSessionTime()
+			cost = self.updateCost()
+			timing = self.getTime(env.now)
+			active = self.stat.nActive(self.s)
+			act_ch = self.stat.singActive(self.s['China'])
+			act_ja = self.stat.singActive(self.s['Japan'])
+			act_br = self.stat.singActive(self.s['Brazil'])
+			act_us = self.stat.singActive(self.s['USA'])
+			act_in = self.stat.singActive(self.s['India'])
+			if self.sc.CACHE_POLICY is not None:
+				hit = self.stat.hitRatio(self.s)
+			if self.sc.SERVER_USAGE:
+				self.stat.serverUsage(self.s, env.now)
+			if self.sc.VERBOSE:
+				print """------------------------------
+			{} - avg.sess.time: {}
+				   local requests: {}%
+				   tot.cost: {} USD
+				   active: {}""".format(
+					timing, 
+					self.stat.avg_sess_time,
+					self.stat.local_req_perc,
+					cost,
+					active
+				)
+			if self.sc.CACHE_POLICY is not None and self.sc.VERBOSE:
+				print "\t\t\t\t   cache hits: {}%".format(hit)
+
+			self.stat.createDF(
+				timing, 
+				self.stat.avg_sess_time,
+				self.stat.local_req_perc,
+				cost,
+				act_ch,
+				act_ja,
+				act_br,
+				act_us,
+				act_in,
+				active,
+				self.exp
+			)
+	
+	
+	def replay(self, env, trace):
+		"""Replay a request log instead of generating synthetic clients. The log is
+		streamed chunk by chunk through the same routing and server logic.
+		The first request of a session starts a new client at the logged timestamp. The
+		following requests of the same session are queued to that client with their
+		timestamps, the client sends each one when the previous one is served and its
+		timestamp is reached, so the logged arrivals are kept. A request of an already
+		ended session starts a new client.
+		
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SymPi Environment class
+			trace : TraceReader
+				instance of the TraceReader class streaming the request log
+		
+		Attributes
+		----------
+			sessions : dict
+				the keys are the session ids, the values are the replayed clients
+		
+		Yields
+		------
+			simpy.events.Timeout
+				until the timestamp of the next request
+		
+		"""
+		self.sessions = {}
+		
+		for chunk in trace.chunks():
+			times = chunk['time'].tolist()
+			regions = chunk['region'].tolist()
+			sessions = chunk['session'].tolist()
+			sizes = chunk['size'].tolist()
+			
+			for i in range(len(times)):
+				if times[i] > env.now:
+					yield env.timeout(times[i] - env.now)
+				self.acquire(env)
+				
+				client = self.sessions.get(sessions[i])
+				if client is not None and client.k > 0:
+					# the session is still running, queue the request
+					client.requests.append((times[i], sizes[i]))
+					client.k += 1
+				else:
+					key = self.sc.COUNTRY[regions[i]]
+					self.sessions[sessions[i]] = Client(
+						env, 
+						key, 
+						sessions[i], 
+						self.s, 
+						self.stat, 
+						deque([(times[i], sizes[i])]),
+						self.catalog,
+						self.sc
+					)
+					self.stat.n_clients[key]+=1
+			
+			# forget the ended sessions
+			self.sessions = dict(
+				(s, cl) for s, cl in self.sessions.items() if cl.k > 0
+			)
+			
+	
 	def updateCost(self):
 		"""Update the total mantaining cost of the CDN. The total cost is determined as the
 		summation of the local cost of the rack. The hourily local cost of a server is stored
-		in the lib.config file.
+		in the simulation scenario.
 		
 		Attributes
 		----------
@@ -191,15 +333,16 @@ class Network:
 		self.total_cost = 0
 		for country in self.s:
 			for server in self.s[country]:
-				if not server.inIdle:
-					self.total_cost += COSTS[country]
+				if not server.in_idle:
+					self.total_cost += self.sc.COSTS[country]
 		
 		return self.total_cost
 	
 	
 	def getTime(self, now):
 		"""Manage the simulation time by turning the seconds into hh:mm:ss format. The 
-		starting hour is specified in the lib.config file
+		starting hour is specified in the simulation scenario. From the second day on
+		the day is prepended, so the labels of a multi-week run stay distinct
 	
 		Parameters
 		----------
@@ -218,15 +361,13 @@ class Network:
 		Returns
 		-------
 			str
-				datetime. hh:mm:ss format
+				datetime. hh:mm:ss format, 'Nd hh:mm:ss' on the day N > 0
 				
 		"""
 		self.H = int(now/3600)
 		self.M = int((now - self.H*3600)/60)
 		self.S = int((now - self.H*3600 - self.M*60))
-		self.H+=START
-		if self.H >= 24:
-			self.H-=24
+		day, self.H = divmod(self.H + self.sc.START, 24)
 				
 		if self.H < 10:
 			self.H = "0{}".format(self.H)
@@ -235,6 +376,8 @@ class Network:
 		if self.S < 10:
 			self.S = "0{}".format(self.S)
 	
+		if day > 0:
+			return "{}d {}:{}:{}".format(day,self.H,self.M,self.S)
 		return "{}:{}:{}".format(self.H,self.M,self.S)
 
 
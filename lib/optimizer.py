@@ -0,0 +1,370 @@
+from multiprocessing import Pool
+
+import random
+import math
+
+from lib.scenario import Scenario, simulate
+
+# Thresholds searched by the optimizer, as fractions of CAPACITY. In each traffic
+# period the wake-up threshold is below the idle threshold, which is below the
+# threshold putting the servers in idle
+THRESHOLDS = [('MAX_L', 'CANIDLE_L', 'MIN_L'), ('MAX_H', 'CANIDLE_H', 'MIN_H')]
+
+
+class Abort:
+	"""Early abort of an evaluation whose average session time is clearly over the
+	constraint. It has the interface of the Convergence class, so it is given to
+	simulate() as the output analysis of the run.
+
+	Parameters
+	----------
+		limit : float
+			maximum average session time in seconds
+		factor : float
+			the run is aborted when the mean of the average session times exceeds
+			factor times the limit
+		min_rows : int
+			number of rows collected before the first check
+
+	Attributes
+	----------
+		aborted : bool
+			True if the run was aborted
+		done : simpy.events.Event
+			triggered at the abort or at the end of the run
+
+	Methods
+	-------
+		attach(env, stat, simtime)
+			collect the rows of a Stats instance and return the event ending the run
+		update(row)
+			collect a row and check the session time
+
+	"""
+	def __init__(self, limit, factor, min_rows):
+		self.limit = limit
+		self.factor = factor
+		self.min_rows = min_rows
+		self.total = 0.
+		self.rows = 0
+		self.aborted = False
+		self.done = None
+
+
+	def attach(self, env, stat, simtime):
+		"""Collect the rows of a Stats instance.
+
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SimPy Environment class
+			stat : instance
+				instance of the Stats class
+			simtime : float
+				seconds of simulation, the run ends there if it is not aborted
+
+		Returns
+		-------
+			simpy.events.Event
+				event ending the run, to be used as env.run(until=...)
+
+		"""
+		self.done = env.event()
+		stat.listeners.append(self.update)
+
+		def horizon():
+			yield env.timeout(simtime)
+			if not self.done.triggered:
+				self.done.succeed()
+		env.process(horizon())
+		return self.done
+
+
+	def update(self, row):
+		"""Collect a row and abort the run if the session time is over the limit.
+
+		Parameters
+		----------
+			row : dict
+				new dataframe row
+
+		"""
+		self.total += row['avg.sess.time']
+		self.rows += 1
+		if self.rows >= self.min_rows and not self.done.triggered and \
+		  self.total/self.rows > self.factor*self.limit:
+			self.aborted = True
+			self.done.succeed()
+
+
+def evaluate(job):
+	"""Simulate a candidate configuration of the dynamic server allocation. Module
+	level function, so it can be run by the worker processes.
+
+	Parameters
+	----------
+		job : tuple
+			candidate id, lib.config overrides, exp, hybrid flag, abort parameters
+			(limit, factor, min_rows) and path of the database recording the run
+
+	Returns
+	-------
+		dict
+			'id', 'cost' (mean total cost per hour), 'session' (mean average session
+			time), 'aborted' and 'rows'
+
+	"""
+	cand_id, values, exp, hybrid, abort, database = job
+	values = dict(values)
+	values['VERBOSE'] = False
+	sc = Scenario(**values)
+	check = Abort(*abort)
+	res = simulate(sc, 'dynamic', exp, convergence=check, hybrid=hybrid,
+		database=database)
+	rows = len(res['time'])
+	return {
+		'id':cand_id,
+		'cost':float(res['tot.cost'].mean()) if rows else float('inf'),
+		'session':float(res['avg.sess.time'].mean()) if rows else float('inf'),
+		'aborted':check.aborted,
+		'rows':rows
+	}
+
+
+def peakHour(scenario):
+	"""Hour of the simulation clock with the largest arrival rate of the whole CDN,
+	from the daily users and the TRAFFIC at the local time of each country.
+
+	Parameters
+	----------
+		scenario : Scenario
+			simulation configuration
+
+	Returns
+	-------
+		int
+			busiest hour, in [0, 24)
+
+	"""
+	def rate(hour):
+		return sum(
+			scenario.DAILY_USERS[u]*scenario.TRAFFIC[(hour + scenario.TIMEZONE[u])%24]
+			for u in scenario.COUNTRY
+		)
+	return max(range(24), key=rate)
+
+
+def pareto(results):
+	"""Non-dominated results with respect to the total cost and the session time, both
+	minimized. The aborted evaluations are never part of the front.
+
+	Parameters
+	----------
+		results : list
+			evaluation results, as returned by evaluate()
+
+	Returns
+	-------
+		list
+			non-dominated results sorted by cost
+
+	"""
+	valid = sorted(
+		(r for r in results if not r['aborted']),
+		key = lambda r:(r['cost'], r['session'])
+	)
+	front = []
+	for r in valid:
+		if not front or r['session'] < front[-1]['session']:
+			front.append(r)
+	return front
+
+
+class Optimizer:
+	"""Search of the dynamic allocation thresholds and rack sizing minimizing the total
+	cost under a session time constraint, by successive halving. All the candidates
+	are simulated for a fraction of SIMTIME, the best 1/eta of them are simulated again
+	for eta times longer, and so on until the last rung runs the whole SIMTIME. The
+	shortened rungs start so that they end with the busiest hour of the day, so every
+	candidate is ranked after facing the peak load, not only the quiet night hours.
+	The candidates are ranked by feasibility first, then by cost. A run whose session
+	time exceeds the constraint by far is aborted, which drops the candidate.
+	The candidates are random configurations of the thresholds, START_ACTIVE and
+	MIN_ACTIVE, plus the scenario one. The evaluations of a rung run in parallel.
+
+	Parameters
+	----------
+		scenario : Scenario
+			base configuration, the thresholds and rack sizes are searched around it
+		exp : int
+			wake up strategy identification number
+		workers : int
+			number of worker processes
+		hybrid : bool
+			True to simulate the candidates with the hybrid fluid/discrete-event engine
+		database : str
+			path of a lib.database SQLite file where the evaluations are recorded, None
+			to record nothing
+
+	Attributes
+	----------
+		sc : Scenario
+			base configuration
+		candidates : list
+			lib.config overrides of each candidate
+		rungs : list
+			for each rung, the simulated seconds and the evaluation results
+		front : list
+			Pareto front of the candidates evaluated on the whole SIMTIME
+
+	Methods
+	-------
+		sample(rng)
+			random candidate configuration
+		run()
+			run the successive halving
+		report()
+			summary of the search
+
+	"""
+	def __init__(self, scenario, exp=1, workers=None, hybrid=False, database=None):
+		self.sc = scenario
+		self.exp = exp
+		self.workers = workers
+		self.hybrid = hybrid
+		self.database = database
+		self.candidates = []
+		self.rungs = []
+		self.front = []
+
+
+	def sample(self, rng):
+		"""Random candidate configuration. The thresholds are sorted uniform fractions of
+		CAPACITY, the starting active servers are uniform between 1 and the deployed
+		servers and the minimum active servers between 1 and the starting ones.
+
+		Parameters
+		----------
+			rng : random.Random
+				random number generator
+
+		Returns
+		-------
+			dict
+				lib.config overrides
+
+		"""
+		values = {}
+		for names in THRESHOLDS:
+			levels = sorted(rng.uniform(.05, .99) for name in names)
+			for name, level in zip(names, levels):
+				values[name] = level*self.sc.CAPACITY
+		values['START_ACTIVE'] = {}
+		values['MIN_ACTIVE'] = {}
+		for u in self.sc.COUNTRY:
+			start = rng.randint(1, self.sc.SERVERS_DYN[u])
+			values['START_ACTIVE'][u] = start
+			values['MIN_ACTIVE'][u] = rng.randint(1, start)
+		return values
+
+
+	def rank(self, result):
+		"""Sort key of the results: feasible first, then by cost."""
+		feasible = not result['aborted'] and result['session'] <= self.sc.OPT_MAX_SESSION
+		return (not feasible, result['cost'], result['session'])
+
+
+	def run(self):
+		"""Run the successive halving.
+
+		Returns
+		-------
+			list
+				Pareto front of the candidates evaluated on the whole SIMTIME
+
+		"""
+		rng = random.Random(self.sc.SEED)
+		base = dict(self.sc.values)
+		current = dict(base)
+		for names in THRESHOLDS:
+			for name in names:
+				current[name] = getattr(self.sc, name)
+		current['START_ACTIVE'] = dict(self.sc.START_ACTIVE)
+		current['MIN_ACTIVE'] = dict(self.sc.MIN_ACTIVE)
+		self.candidates = [current]
+		while len(self.candidates) < self.sc.OPT_CANDIDATES:
+			values = dict(base)
+			values.update(self.sample(rng))
+			self.candidates.append(values)
+
+		abort = (self.sc.OPT_MAX_SESSION, self.sc.OPT_ABORT, self.sc.OPT_ABORT_ROWS)
+		alive = range(len(self.candidates))
+		peak = peakHour(self.sc)
+		pool = Pool(self.workers)
+		try:
+			for r in range(self.sc.OPT_RUNGS):
+				simtime = self.sc.SIMTIME/self.sc.OPT_ETA**(self.sc.OPT_RUNGS - 1 - r)
+				jobs = []
+				for i in alive:
+					values = dict(self.candidates[i])
+					values['SIMTIME'] = simtime
+					if simtime < self.sc.SIMTIME:
+						# the shortened run ends with the peak hour
+						values['START'] = (peak + 1 - int(math.ceil(simtime/3600.)))%24
+					jobs.append((i, values, self.exp, self.hybrid, abort, self.database))
+				results = pool.map(evaluate, jobs, chunksize=1)
+				self.rungs.append((simtime, results))
+
+				results = sorted(results, key=self.rank)
+				keep = max(len(results)//self.sc.OPT_ETA, 1)
+				alive = [res['id'] for res in results[:keep] if not res['aborted']] \
+					or [results[0]['id']]
+		finally:
+			pool.close()
+			pool.join()
+
+		self.front = pareto(self.rungs[-1][1])
+		return self.front
+
+
+	def report(self):
+		"""Summary of the search.
+
+		Returns
+		-------
+			str
+				evaluations of each rung, Pareto front and best feasible configuration
+
+		"""
+		lines = []
+		for simtime, results in self.rungs:
+			lines.append("rung {:>8.0f} s: {} candidates, {} aborted".format(
+				simtime,
+				len(results),
+				sum(1 for res in results if res['aborted'])
+			))
+		lines.append("Pareto front (cost [USD/h], avg.sess.time [s]):")
+		for res in self.front:
+			lines.append("  #{:<4}{:>10.4f}{:>10.4f}{}".format(
+				res['id'],
+				res['cost'],
+				res['session'],
+				"" if res['session'] <= self.sc.OPT_MAX_SESSION else "  (over the limit)"
+			))
+		best = sorted(self.rungs[-1][1], key=self.rank)[0]
+		if self.rank(best)[0]:
+			lines.append("no candidate meets avg.sess.time <= {} s".format(
+				self.sc.OPT_MAX_SESSION
+			))
+		else:
+			values = self.candidates[best['id']]
+			lines.append("best candidate #{}{}:".format(
+				best['id'], " (current configuration)" if best['id'] == 0 else ""
+			))
+			for names in THRESHOLDS:
+				lines.append("  " + ", ".join("{} = {:.2f}*CAPACITY".format(
+					name, values[name]/self.sc.CAPACITY
+				) for name in names))
+			for key in ('START_ACTIVE', 'MIN_ACTIVE'):
+				lines.append("  {} = {}".format(key, values[key]))
+		return "\n".join(lines)
@@ -0,0 +1,317 @@
+import numpy as np
+
+
+class Policy:
+	"""Placement and wake up strategy of the CDN. The static simulator asks the policy
+	where to deploy a new server, the dynamic one in which countries to look for a
+	server in idle. The country orderings depend only on the scenario, so they are
+	computed once and shared by all the clients and servers through get().
+	The base policy ranks the countries as in COUNTRY. A new strategy is a subclass
+	overriding rank(), deploy() or wakeOrder(), added to the POLICIES registry.
+	The static simulator places the new servers through the Planner of its rack,
+	returned by planner(), which keeps the rack sizes incrementally. A strategy
+	overriding deploy() overrides planner() too, or keeps the base Planner, which calls
+	deploy() at each placement.
+
+	Parameters
+	----------
+		scenario : Scenario
+			simulation configuration
+
+	Attributes
+	----------
+		sc : Scenario
+			simulation configuration
+		nearest : dict
+			the keys are the countries, the values are all the countries sorted by
+			their distance from it, the country itself first
+		order : list
+			countries sorted by preference
+
+	Methods
+	-------
+		rank()
+			sort the countries by preference
+		deploy(key, rack)
+			country where a new server is deployed
+		wakeOrder(key)
+			countries where a server in idle is looked for
+		planner(rack)
+			placement of the new servers of a rack
+
+	"""
+	def __init__(self, scenario):
+		self.sc = scenario
+		self.nearest = {}
+		for i, u in enumerate(self.sc.COUNTRY):
+			self.nearest[u] = [
+				self.sc.COUNTRY[j] for j in np.argsort(self.sc.DISTANCES[i], kind='mergesort')
+			]
+		self.order = self.rank()
+
+
+	def rank(self):
+		"""Sort the countries by preference.
+
+		Returns
+		-------
+			list
+				countries, the preferred one first
+
+		"""
+		return list(self.sc.COUNTRY)
+
+
+	def deploy(self, key, rack):
+		"""Country where a new server is deployed, when all the servers are busy. The
+		countries are chosen by preference, roundly, so no country gets a second server
+		more than the others until all of them have the same number of servers.
+
+		Parameters
+		----------
+			key : str
+				country of the client which found all the servers busy
+			rack : dict
+				list of servers located in each country
+
+		Returns
+		-------
+			str
+				country of the new server
+
+		"""
+		max_n_serv = max(len(rack[u]) for u in self.order)
+		for u in self.order:
+			if len(rack[u]) < max_n_serv:
+				return u
+		return self.order[0]
+
+
+	def wakeOrder(self, key):
+		"""Countries where a server in idle is looked for, when a server serving a client
+		exceeds its maximum threshold.
+
+		Parameters
+		----------
+			key : str
+				country of the client which is being served
+
+		Returns
+		-------
+			list
+				countries in the order in which they are checked
+
+		"""
+		return self.order
+
+
+	def planner(self, rack):
+		"""Placement of the new servers of a rack, following the strategy. The countries
+		are chosen roundly as in deploy(), in O(1) amortized time. A subclass
+		overriding only deploy() gets a planner asking it at each placement.
+
+		Parameters
+		----------
+			rack : dict
+				list of servers located in each country
+
+		Returns
+		-------
+			Planner
+				planner of the rack
+
+		"""
+		if self.deploy.im_func is not Policy.deploy.im_func:
+			return Planner(self, rack)
+		return RoundRobinPlanner(self, rack)
+
+
+class DistancePolicy(Policy):
+	"""Distance-based strategy (exp 1). New servers are deployed in the country of the
+	client, idle servers are woken up in the nearest country having one.
+
+	"""
+	def deploy(self, key, rack):
+		return key
+
+
+	def wakeOrder(self, key):
+		return self.nearest[key]
+
+
+	def planner(self, rack):
+		if self.deploy.im_func is not DistancePolicy.deploy.im_func:
+			return Planner(self, rack)
+		return LocalPlanner(self, rack)
+
+
+class CostPolicy(Policy):
+	"""Cost-based strategy (exp 2). The countries are preferred by increasing
+	mantaining cost of a server.
+
+	"""
+	def rank(self):
+		return sorted(self.sc.COUNTRY, key=lambda u:self.sc.COSTS[u])
+
+
+class PeoplePolicy(Policy):
+	"""People-based strategy (exp 3). The countries are preferred by decreasing number of
+	daily users.
+
+	"""
+	def rank(self):
+		return sorted(self.sc.COUNTRY, key=lambda u:-self.sc.DAILY_USERS[u])
+
+
+class Planner:
+	"""Placement of the new servers of a static CDN. A rack has a single planner, shared
+	by all its clients, which gives the new servers ids unique in the whole CDN. The
+	base planner asks the policy at each placement.
+
+	Parameters
+	----------
+		policy : Policy
+			placement strategy
+		rack : dict
+			list of servers located in each country
+
+	Attributes
+	----------
+		policy : Policy
+			placement strategy
+		rack : dict
+			list of servers located in each country
+		next_id : int
+			id of the next server
+
+	Methods
+	-------
+		country(key)
+			country of the next server
+		place(key)
+			country and id of the next server
+
+	"""
+	def __init__(self, policy, rack):
+		self.policy = policy
+		self.rack = rack
+		self.next_id = max([0] + [
+			server.serv_id for u in rack for server in rack[u]
+		]) + 1
+
+
+	def country(self, key):
+		"""Country of the next server.
+
+		Parameters
+		----------
+			key : str
+				country of the client which found all the servers busy
+
+		Returns
+		-------
+			str
+				country of the new server
+
+		"""
+		return self.policy.deploy(key, self.rack)
+
+
+	def place(self, key):
+		"""Country and id of the next server, which the caller adds to the rack.
+
+		Parameters
+		----------
+			key : str
+				country of the client which found all the servers busy
+
+		Returns
+		-------
+			tuple
+				country and id of the new server
+
+		"""
+		serv_id = self.next_id
+		self.next_id += 1
+		return self.country(key), serv_id
+
+
+class LocalPlanner(Planner):
+	"""Planner deploying the new servers in the country of the client."""
+	def country(self, key):
+		return key
+
+
+class RoundRobinPlanner(Planner):
+	"""Planner choosing the countries roundly by the preference of the policy, as
+	Policy.deploy(), with the rack sizes kept incrementally. The countries before the
+	pointer have reached the largest rack size, so the next country is the first one
+	after the pointer under that size. The pointer only moves forward until all the
+	countries reach the size, then the first country starts a larger size.
+
+	Attributes
+	----------
+		sizes : dict
+			number of servers of each country
+		level : int
+			largest rack size
+		pos : int
+			index in the policy order of the first country which can be under the level
+
+	"""
+	def __init__(self, policy, rack):
+		Planner.__init__(self, policy, rack)
+		self.sizes = dict((u, len(rack[u])) for u in policy.order)
+		self.level = max(self.sizes.values())
+		self.pos = 0
+
+
+	def country(self, key):
+		order = self.policy.order
+		while self.pos < len(order) and self.sizes[order[self.pos]] >= self.level:
+			self.pos += 1
+		if self.pos == len(order):
+			# all the countries have the same size, start a larger one
+			self.level += 1
+			self.pos = 0
+		u = order[self.pos]
+		self.sizes[u] += 1
+		return u
+
+
+# Strategies selectable with the exp argument of the simulators. A new strategy gets
+# a new id, e.g. POLICIES[4] = MyPolicy
+POLICIES = {
+	1: DistancePolicy,
+	2: CostPolicy,
+	3: PeoplePolicy
+}
+
+
+def get(exp, scenario):
+	"""Policy of a scenario, created on the first call and shared by all its clients
+	and servers.
+
+	Parameters
+	----------
+		exp : int
+			strategy identification number, a key of POLICIES
+		scenario : Scenario
+			simulation configuration
+
+	Returns
+	-------
+		Policy
+			shared policy
+
+	Raises
+	------
+		ValueError
+			if the strategy is unknown
+
+	"""
+	if exp not in scenario.policies:
+		if exp not in POLICIES:
+			raise ValueError("unknown strategy: {}".format(exp))
+		scenario.policies[exp] = POLICIES[exp](scenario)
+	return scenario.policies[exp]
@@ -0,0 +1,278 @@
+from timeit import default_timer as timer
+
+import inspect
+import sys
+import os
+
+# Hot-path methods timed by the profiler. Each entry is (phase, class, method), a
+# method missing in the provided classes is skipped.
+PHASES = [
+	('arrival', 'Network', 'arrival'),
+	('arrival', 'Network', 'replay'),
+	('stats', 'Network', 'acquire'),
+	('routing', 'Client', 'startSession'),
+	('process', 'Server', 'process'),
+	('wakeUp', 'Server', 'wakeUp'),
+	('minActiveServ', 'Server', 'minActiveServ'),
+	('endService', 'Server', 'endService'),
+	('createDF', 'Stats', 'createDF')
+]
+
+
+def residentMemory():
+	"""Resident memory of the process. It is read from /proc on Linux, elsewhere the
+	peak resident memory is returned.
+
+	Returns
+	-------
+		float
+			resident memory in MB
+
+	"""
+	try:
+		with open('/proc/self/statm') as f:
+			pages = int(f.read().split()[1])
+		return pages*os.sysconf('SC_PAGE_SIZE')/1048576.
+	except (IOError, OSError, ValueError, IndexError):
+		import resource
+		peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+		# bytes on macOS, kB elsewhere
+		return peak/1048576. if sys.platform == 'darwin' else peak/1024.
+
+
+class Profiler:
+	"""Low-overhead instrumentation of the simulator hot paths. The methods listed in
+	PHASES are wrapped with call counters and timers, the SimPy environment is wrapped
+	to count the processed events. Nothing is wrapped until attach() is called, so the
+	simulation does not pay any cost when it is not profiled.
+	The methods running as SimPy processes are generators: each resume of the generator
+	is timed, so the time spent waiting for simulated events is not counted. The time of
+	a phase is reported both in total and excluding the nested phases (self time).
+
+	Attributes
+	----------
+		calls : dict
+			number of calls (or generator resumes) per phase
+		total : dict
+			cumulative wall time per phase, nested phases included
+		own : dict
+			cumulative wall time per phase, nested phases excluded
+		events : int
+			number of processed SimPy events
+		stack : list
+			time spent in nested phases for each running timer
+		patched : list
+			original methods replaced by the wrappers
+		wall : float
+			wall time of the profiled run
+		start : float
+			wall time at the beginning of the profiled run
+
+	Methods
+	-------
+		attach(env, classes)
+			wrap the environment and the hot-path methods
+		detach()
+			restore the original methods
+		instrument(cls, name, phase)
+			wrap a method with a counter and a timer
+		begin()
+			start the wall clock of the profiled run
+		end()
+			stop the wall clock of the profiled run
+		report(env)
+			per-phase breakdown of the profiled run
+
+	"""
+	def __init__(self):
+		self.calls = {}
+		self.total = {}
+		self.own = {}
+		self.events = 0
+		self.stack = []
+		self.patched = []
+		self.wall = 0.
+		self.start = None
+
+
+	def attach(self, env, classes):
+		"""Wrap the environment and the hot-path methods.
+
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SimPy Environment class
+			classes : dict
+				the keys are the class names used in PHASES, the values are the classes
+
+		"""
+		step = env.step
+		def countedStep():
+			self.events += 1
+			step()
+		env.step = countedStep
+
+		for phase, cls, name in PHASES:
+			if cls in classes and hasattr(classes[cls], name):
+				self.instrument(classes[cls], name, phase)
+
+
+	def detach(self):
+		"""Restore the original methods.
+
+		"""
+		for cls, name, func in reversed(self.patched):
+			setattr(cls, name, func)
+		self.patched = []
+
+
+	def instrument(self, cls, name, phase):
+		"""Wrap a method with a call counter and a timer.
+
+		Parameters
+		----------
+			cls : class
+				class owning the method
+			name : str
+				method name
+			phase : str
+				phase the method time is accounted to
+
+		"""
+		func = cls.__dict__[name]
+		self.patched.append((cls, name, func))
+		self.calls.setdefault(phase, 0)
+		self.total.setdefault(phase, 0.)
+		self.own.setdefault(phase, 0.)
+
+		if inspect.isgeneratorfunction(func):
+			def wrapper(*args, **kwargs):
+				return self.timedGenerator(func(*args, **kwargs), phase)
+		else:
+			def wrapper(*args, **kwargs):
+				self.stack.append(0.)
+				t0 = timer()
+				try:
+					return func(*args, **kwargs)
+				finally:
+					self.stop(phase, t0)
+
+		wrapper.__name__ = func.__name__
+		wrapper.__doc__ = func.__doc__
+		setattr(cls, name, wrapper)
+
+
+	def timedGenerator(self, gen, phase):
+		"""Forward the values and the exceptions sent by SimPy to a generator, timing each
+		resume.
+
+		Parameters
+		----------
+			gen : generator
+				generator of a SimPy process
+			phase : str
+				phase the generator time is accounted to
+
+		Yields
+		------
+			simpy.events.Event
+				the events yielded by the wrapped generator
+
+		"""
+		value = None
+		exc = None
+		while True:
+			self.stack.append(0.)
+			t0 = timer()
+			try:
+				if exc is None:
+					event = gen.send(value)
+				else:
+					event = gen.throw(*exc)
+			except StopIteration:
+				return
+			finally:
+				self.stop(phase, t0)
+
+			exc = None
+			try:
+				value = yield event
+			except BaseException:
+				exc = sys.exc_info()
+
+
+	def stop(self, phase, t0):
+		"""Stop a timer and account its time to the phase and to the enclosing one.
+
+		Parameters
+		----------
+			phase : str
+				phase of the timer
+			t0 : float
+				wall time at which the timer was started
+
+		"""
+		elapsed = timer() - t0
+		nested = self.stack.pop()
+		self.calls[phase] += 1
+		self.total[phase] += elapsed
+		self.own[phase] += elapsed - nested
+		if self.stack:
+			self.stack[-1] += elapsed
+
+
+	def begin(self):
+		"""Start the wall clock of the profiled run.
+
+		"""
+		self.start = timer()
+
+
+	def end(self):
+		"""Stop the wall clock of the profiled run.
+
+		"""
+		self.wall += timer() - self.start
+
+
+	def report(self, env):
+		"""Per-phase breakdown of the profiled run, with the processed events per simulated
+		second and the ratio between simulated and wall time.
+
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SimPy Environment class
+
+		Returns
+		-------
+			str
+				breakdown table
+
+		"""
+		wall = max(self.wall, 1e-9)
+		lines = ["{:<15}{:>12}{:>12}{:>12}{:>8}{:>12}".format(
+			'phase', 'calls', 'total [s]', 'self [s]', 'self%', 'us/call'
+		)]
+		for phase in sorted(self.own, key=lambda p:self.own[p], reverse=True):
+			lines.append("{:<15}{:>12}{:>12.3f}{:>12.3f}{:>8.1f}{:>12.2f}".format(
+				phase,
+				self.calls[phase],
+				self.total[phase],
+				self.own[phase],
+				100*self.own[phase]/wall,
+				1e6*self.own[phase]/max(self.calls[phase], 1)
+			))
+		other = wall - sum(self.own.values())
+		lines.append("{:<15}{:>12}{:>12}{:>12.3f}{:>8.1f}".format(
+			'other', '', '', other, 100*other/wall
+		))
+		lines.append("")
+		lines.append("wall time: {:.3f} s - simulated time: {:.0f} s".format(wall, env.now))
+		lines.append("events: {} - {:.1f} events/simulated s - {:.0f} events/s".format(
+			self.events,
+			self.events/max(env.now, 1e-9),
+			self.events/wall
+		))
+		lines.append("speed: {:.1f} simulated s/wall s".format(env.now/wall))
+		return "\n".join(lines)
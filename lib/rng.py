@@ -0,0 +1,134 @@
+import hashlib
+import struct
+import random
+
+import numpy as np
+
+
+def spawn(seed, *path):
+	"""Seed of an independent stream, derived from a parent seed and from the path of
+	the stream, e.g. spawn(126, 'session', 'China', 42). Different paths give
+	unrelated seeds, whatever their length.
+
+	Parameters
+	----------
+		seed : int
+			parent seed
+		path : tuple
+			names and numbers identifying the stream
+
+	Returns
+	-------
+		int
+			32-bit seed
+
+	"""
+	digest = hashlib.sha1(repr((seed,) + path)).digest()
+	return struct.unpack('<I', digest[:4])[0]
+
+
+class Streams:
+	"""Random streams of the entities of a simulation. With spawning enabled each
+	country arrival process, each session and each server draws from its own stream,
+	seeded by spawn() from the scenario seed and the entity identity, so a draw does
+	not depend on the order in which the other entities draw. A run is then reproduced
+	by any engine creating the same entities, serial or parallel. Without spawning all
+	the streams are the shared generators of the scenario, as in the original
+	simulators.
+	The arrival, fluid and server streams are kept, the session streams are created
+	with the session and released with it.
+
+	Parameters
+	----------
+		seed : int
+			seed of the simulation
+		spawning : bool
+			True to give each entity its own stream
+		shared : random.Random
+			generator of the sessions and the servers without spawning
+		np_shared : numpy.random.RandomState
+			generator of the arrivals without spawning
+
+	Attributes
+	----------
+		seed : int
+			seed of the simulation
+		spawning : bool
+			True if each entity has its own stream
+		kept : dict
+			the keys are the stream paths, the values the arrival, fluid and server
+			streams created so far
+
+	Methods
+	-------
+		arrival(key)
+			inter-arrival times of a country
+		fluid(key)
+			fluid steps of the hybrid engine in a country
+		session(key, cl_id)
+			number and size of the requests of a session
+		server(key, serv_id)
+			latencies of a server
+		reseed(seed)
+			restart the kept streams from a new seed
+
+	"""
+	def __init__(self, seed, spawning, shared, np_shared):
+		self.seed = seed
+		self.spawning = spawning
+		self.shared = shared
+		self.np_shared = np_shared
+		self.kept = {}
+
+
+	def keep(self, path, factory):
+		"""Stream of a path, created on the first call."""
+		rng = self.kept.get(path)
+		if rng is None:
+			rng = self.kept[path] = factory(spawn(self.seed, *path))
+		return rng
+
+
+	def arrival(self, key):
+		"""NumPy stream of the inter-arrival times of a country."""
+		if not self.spawning:
+			return self.np_shared
+		return self.keep(('arrival', key), np.random.RandomState)
+
+
+	def fluid(self, key):
+		"""NumPy stream of the fluid steps of the hybrid engine in a country."""
+		if not self.spawning:
+			return self.np_shared
+		return self.keep(('fluid', key), np.random.RandomState)
+
+
+	def session(self, key, cl_id):
+		"""Stream of the number and the size of the requests of a session, identified by
+		its country and its client id."""
+		if not self.spawning:
+			return self.shared
+		return random.Random(spawn(self.seed, 'session', key, cl_id))
+
+
+	def server(self, key, serv_id):
+		"""Stream of the latencies of a server, identified by its country and its id."""
+		if not self.spawning:
+			return self.shared
+		return self.keep(('server', key, serv_id), random.Random)
+
+
+	def reseed(self, seed):
+		"""Restart the kept streams from a new simulation seed, in place, so the entities
+		holding them draw from the new streams. The sessions already running keep their
+		streams.
+
+		Parameters
+		----------
+			seed : int
+				new seed of the simulation
+
+		"""
+		self.seed = seed
+		for path, rng in self.kept.items():
+			rng.seed(spawn(seed, *path))
@@ -0,0 +1,214 @@
+import random
+import copy
+
+import numpy as np
+
+import lib.config as config
+from lib.rng import Streams
+
+
+class Scenario:
+	"""Configuration of a simulation. The attributes mirror the lib.config parameters
+	and take their values, apart from the ones provided as keyword arguments. Each
+	scenario owns its random number generators, so several simulations can run in the
+	same process without sharing any state.
+	DAILY_USERS is recomputed from POPULATION when CONV or POPULATION are provided, and
+	the thresholds of the dynamic allocation are rescaled when CAPACITY is provided.
+
+	Parameters
+	----------
+		values : dict
+			lib.config parameters overridden by the scenario
+
+	Attributes
+	----------
+		values : dict
+			lib.config parameters overridden by the scenario
+		random : random.Random
+			random number generator of the clients and the servers
+		np_random : numpy.random.RandomState
+			random number generator of the arrivals
+		streams : Streams
+			random streams of the entities. They are random and np_random unless
+			RNG_STREAMS is True
+		policies : dict
+			placement and wake up strategies of the scenario, created by lib.policy.get()
+
+	Methods
+	-------
+		copy(values)
+			new scenario with some parameters changed
+
+	Raises
+	------
+		ValueError
+			if a keyword is not a lib.config parameter
+
+	"""
+	def __init__(self, **values):
+		for key in dir(config):
+			if key.isupper():
+				setattr(self, key, copy.deepcopy(getattr(config, key)))
+		for key, value in values.items():
+			if not (key.isupper() and hasattr(config, key)):
+				raise ValueError("unknown configuration parameter: {}".format(key))
+			if isinstance(getattr(config, key), np.ndarray):
+				value = np.asarray(value)
+			setattr(self, key, value)
+
+		if ('CONV' in values or 'POPULATION' in values) and 'DAILY_USERS' not in values:
+			self.DAILY_USERS = dict(
+				(u, int(self.POPULATION[u]*self.CONV)) for u in self.POPULATION
+			)
+		if 'CAPACITY' in values:
+			scale = self.CAPACITY/config.CAPACITY
+			for key in ('MAX_L', 'MIN_L', 'CANIDLE_L', 'MAX_H', 'MIN_H', 'CANIDLE_H'):
+				if key not in values:
+					setattr(self, key, getattr(config, key)*scale)
+
+		self.values = values
+		self.random = random.Random(self.SEED)
+		self.np_random = np.random.RandomState(self.SEED)
+		self.streams = Streams(self.SEED, self.RNG_STREAMS, self.random, self.np_random)
+		self.policies = {}
+
+
+	def copy(self, **values):
+		"""New scenario with the same parameters apart from the provided ones. The random
+		number generators of the new scenario start from their seed.
+
+		Parameters
+		----------
+			values : dict
+				lib.config parameters changed in the new scenario
+
+		Returns
+		-------
+			Scenario
+				new scenario
+
+		"""
+		merged = dict(self.values)
+		merged.update(values)
+		return Scenario(**merged)
+
+
+# Scenario shared by the objects created without one, set by default()
+shared = None
+
+
+def default():
+	"""Scenario with the lib.config values, shared by all the objects created without
+	a scenario. It is created on the first call, so changes of the lib.config values
+	made before the simulation starts are kept.
+
+	Returns
+	-------
+		Scenario
+			shared scenario
+
+	"""
+	global shared
+	if shared is None:
+		shared = Scenario()
+	return shared
+
+
+def simulate(scenario, kind='static', exp=1, trace=None, listener=None, convergence=None,
+		hybrid=False, database=None, live=False):
+	"""Run a simulation without touching the disk, except for reading the request log
+	and recording the run in a database, and return the acquired statistics. The
+	progress messages are printed only if the VERBOSE parameter of the scenario is True.
+	The run is closed in the database even if the simulation raises.
+
+	Parameters
+	----------
+		scenario : Scenario
+			simulation configuration
+		kind : str
+			'static' (fixed number of servers) or 'dynamic' (dynamic server allocation)
+		exp : int
+			deploy or wake up strategy identification number
+		trace : str
+			path of a request log replacing the synthetic workload, None to generate it
+		listener : callable
+			function called with each new dataframe row while the simulation runs
+		convergence : Convergence
+			output analysis of the run, which can stop it before SIMTIME. None to run
+			until SIMTIME
+		hybrid : bool
+			True to advance the low-traffic hours with the fluid approximation of the
+			Hybrid class. The request log is not supported
+		database : str
+			path of a lib.database SQLite file where the run is recorded, None to
+			record nothing
+		live : bool
+			True to publish the progress of the run in the shared region read by
+			monitor.py
+
+	Returns
+	-------
+		dict
+			the keys are the dataframe columns, the values are NumPy arrays with a value
+			per acquisition interval. The 'time' column holds the hh:mm:ss timestamps
+
+	"""
+	import simpy
+	from lib.trace import TraceReader
+	if kind == 'static':
+		from lib.network_static import Network
+		from lib.stats_static import Stats
+	elif kind == 'dynamic':
+		from lib.network_dynamic import Network
+		from lib.stats_dynamic import Stats
+	else:
+		raise ValueError("unknown simulator: {}".format(kind))
+
+	env = simpy.Environment()
+	stat = Stats(scenario)
+	stat.export = False
+	if listener is not None:
+		stat.listeners.append(listener)
+	if database is not None:
+		from lib.database import Database
+		db = Database(database, scenario.DB_BATCH, scenario.DB_TIMEOUT)
+		run = db.begin(scenario, kind, exp)
+		stat.listeners.append(db.listener(run))
+	publisher = None
+	try:
+		if kind == 'static':
+			net = Network(stat, scenario)
+			args = (exp,)
+		else:
+			net = Network(stat, exp, scenario)
+			args = ()
+
+		if trace is not None:
+			env.process(net.replay(env, TraceReader(trace, scenario=scenario), *args))
+		elif hybrid:
+			from lib.hybrid import Hybrid
+			Hybrid(net, kind, exp).start(env)
+		else:
+			for u in scenario.COUNTRY:
+				env.process(net.arrival(env, scenario.DAILY_USERS[u], u, *args))
+		if live:
+			from lib.metrics import Publisher
+			publisher = Publisher("{} {} seed {}".format(kind, exp, scenario.SEED), scenario)
+			publisher.attach(env, stat)
+		if convergence is not None:
+			env.run(until=convergence.attach(env, stat, scenario.SIMTIME))
+		else:
+			env.run(until=scenario.SIMTIME)
+	finally:
+		if publisher is not None:
+			publisher.close()
+		if database is not None:
+			db.end(run)
+			db.close()
+
+	results = dict(
+		(col, np.array(stat.data[col])) for col in stat.data
+		if len(stat.data[col]) == len(stat.index)
+	)
+	results['time'] = np.array(stat.index)
+	return results
@@ -1,17 +1,18 @@
-import random
 import simpy
 
-from lib.config import *
-
-random.seed(SEED)
+from lib.scenario import default
+from lib.cache import CACHES
+from lib.sharing import SharedLink
+from lib.usage import Usage
+from lib import policy
 
 class Server:
 	""" Create a server located in the provided country and labelled with the provided ID.
-	The maximum capacity of the server is stored in the lib.config file. 
+	The maximum capacity of the server is stored in the simulation scenario. 
 	When a request is sent to the server, it determines the sevice time and reduces its 
 	available capacity until the client (request) does not leave the system.
 	If the available capacity is near to the max_th threshold, a new server is woken up by 
-	following three different criteria:
+	following the strategy of the lib.policy registry:
 	exp : 1 - Distance-based one.
 	exp : 2 - Cost-based one
 	exp : 3 - People-based one.
@@ -27,6 +28,8 @@ class Server:
 			server identification number
 		exp : int
 			wake up strategy identification number
+		scenario : Scenario
+			simulation configuration. The lib.config values are used if None
 	
 	Attributes
 	----------
@@ -36,53 +39,65 @@ class Server:
 			server identification number
 		exp : int
 			wake up strategy identification number
+		sc : Scenario
+			simulation configuration
+		rng : random.Random
+			stream of the latencies of the server
 		available_capacity : float
 			available capacity of servers
 		server_list : list
 			list of all the servers deployed in the CDN
-		best_list : list
-			list of the deployed servers sorted with three different criteria. The criterium
-			is indicated by the exp attribute
+		policy : Policy
+			wake up strategy, shared by all the servers of the scenario
 		canIdle : bool
 			True if the server can be in idle, False otherwise
 		completing : bool
 			True if the server cannot accept more request and it is emptying the queues
-		inIdle : bool
+		in_idle : bool
 			True if the server is in idle, False otherwise
 		size_queue : list
 			server's packet queue storing the requests size
 		finish_queue : list
-			server's packet queue storing the instant at which the request is served
+			server's packet queue storing the instant at which the request is served. With
+			the processor-sharing model it stores the events ending the transfers
+		link : SharedLink
+			processor-sharing link of the server, None with the fixed transfer times
+		drained : simpy.events.Event
+			triggered when the last request of a completing server is served with the
+			processor-sharing model
+		cache : Cache
+			cache of the requested objects. None if the caches are disabled
+		usage : Usage
+			time-weighted utilization, in-flight requests and state occupancy. None
+			unless SERVER_USAGE is True
 			
 	Methods
 	-------
-		process(size, env, cl_host)
+		process(size, env, cl_host, obj)
 			serves the request and update the server available capacity
 		estimateRTT(row, col)
 			estimate the packet Round Trip Time (RTT)
-		wakeUp(host)
-			wake up a server with three different criteria. The criterion is indicated by
-			the exp attribute
+		wakeUp(host, env)
+			wake up a server following the strategy indicated by the exp attribute
+		account(now)
+			record the current capacity, queue and state in the time-weighted usage
 		minActiveServ()
 			check if the minimum number of active servers per region is ensured
 		endService(env)
 			the server stops receiving new requests, serves the ones in the queues and
 			is goes in idle
-		orderCost()
-			sort the deployed servers in the whole CDN with respect to the minimum cost
-		orderPeople()
-			sort the deployed servers in the whole CDN with respect to the maximum number
-			of people in the hosting countries
 	
 	"""
-	def __init__(self, country, serv_id, exp):
+	def __init__(self, country, serv_id, exp, scenario=None):
 		self.country = country
 		self.serv_id = serv_id
 		self.exp = exp
-		self.available_capacity = CAPACITY
+		self.sc = scenario or default()
+		self.rng = self.sc.streams.server(country, serv_id)
+		self.available_capacity = self.sc.CAPACITY
 		# Servers list
 		self.server_list = []
-		self.best_list = []
+		self.policy = policy.get(exp, self.sc)
 		# Dynamic allocation flags
 		self.can_idle = False
 		self.completing = False
@@ -90,14 +105,21 @@ class Server:
 		# Server packets queue
 		self.size_queue = []
 		self.finish_queue = []
-		
-		if self.exp == 2:
-			self.orderCost()
-		elif self.exp == 3:
-			self.orderPeople()
+		self.link = None
+		self.drained = None
+		# Objects cache
+		if self.sc.CACHE_POLICY is None:
+			self.cache = None
+		else:
+			self.cache = CACHES[self.sc.CACHE_POLICY](self.sc.CACHE_SIZE)
+		# Time-weighted usage
+		if self.sc.SERVER_USAGE:
+			self.usage = Usage(self.sc.CAPACITY, state='idle')
+		else:
+			self.usage = None
 		
 		
-	def process(self, reqsize, env, cl_host):	
+	def process(self, reqsize, env, cl_host, obj=None):	
 		"""The server processes the request by determining the service time and updating 
 		the	available capacity.
 		The RTT is composed by three terms:
@@ -106,6 +128,11 @@ class Server:
 		2 - Estimated RTT based on the client-server distance
 		3 - Transfer delay, which is determined by the size of the response divided by 
 		the capacity allocated to the request in the server.
+		If the caches are enabled and the requested object is not cached, the time needed
+		to fetch it from the origin is added.
+		If BANDWIDTH_SHARING is True, the transfer delay is not fixed at the arrival: the
+		concurrent transfers share the server capacity fairly through the SharedLink of
+		the server, and the other two terms are added at the end of the transfer.
 		
 		When a request arrives at the server, its size is stored in a queue and the istant 
 		at which the request should be served is stored in a second queue. The server 
@@ -119,6 +146,8 @@ class Server:
 				instance of the SymPi Environment class
 			cl_host : str
 				country the client belongs to
+			obj : int
+				requested object of the catalog. None if the caches are disabled
 		
 		Attributes
 		----------
@@ -140,30 +169,43 @@ class Server:
 		
 		"""
 		hour = int(env.now/3600)
-		hour += START
+		hour += self.sc.START
 		if hour >= 24:
 			hour -= 24
 		if hour >= 4 and hour < 13:
-			self.idle_th = CANIDLE_H
-			self.min_th =  MIN_H
-			self.max_th = MAX_H
+			self.idle_th = self.sc.CANIDLE_H
+			self.min_th =  self.sc.MIN_H
+			self.max_th = self.sc.MAX_H
 		else:
-			self.idle_th = CANIDLE_L
-			self.min_th = MIN_L
-			self.max_th = MAX_L
+			self.idle_th = self.sc.CANIDLE_L
+			self.min_th = self.sc.MIN_L
+			self.max_th = self.sc.MAX_L
 		
-		RTT_row = COUNTRY.index(cl_host)
-		RTT_col = COUNTRY.index(self.country)
+		RTT_row = self.sc.COUNTRY.index(cl_host)
+		RTT_col = self.sc.COUNTRY.index(self.country)
 		
 		# Determine the service time
-		t1 = random.uniform(1e-3, 1e-2)
+		t1 = self.rng.uniform(1e-3, 1e-2)
 		t2 = self.estimateRTT(RTT_row, RTT_col)
-		t3 = reqsize/self.available_capacity
-		time = t1 + t2 + t3
+		if self.sc.BANDWIDTH_SHARING:
+			# the transfer delay depends on the concurrent transfers
+			time = t1 + t2
+		else:
+			t3 = reqsize/self.available_capacity
+			time = t1 + t2 + t3
+		# Fetch the missing object from the origin
+		if self.cache is not None and not self.cache.lookup(obj):
+			time += self.sc.ORIGIN_RTT + reqsize/self.sc.ORIGIN_CAPACITY
 		
 		# Add the new request to the queues
 		self.size_queue.append(reqsize)
-		self.finish_queue.append(env.now + time)
+		if self.sc.BANDWIDTH_SHARING:
+			if self.link is None:
+				self.link = SharedLink(env, self.sc.CAPACITY)
+			transfer = self.link.transfer(reqsize)
+			self.finish_queue.append(transfer)
+		else:
+			self.finish_queue.append(env.now + time)
 		# Update the server available capacity
 		self.available_capacity -= reqsize
 		
@@ -174,7 +216,7 @@ class Server:
 		# The maximum capacity is exceeded. A server in idle can be woken up
 		if self.available_capacity <= self.max_th:
 			#print '{}:{} - Waking up a server'.format(self.country, self.serv_id)
-			self.wakeUp(cl_host)
+			self.wakeUp(cl_host, env)
 			self.can_wake = False
 			
 		# The available capacity is over the minimum capacity.
@@ -185,21 +227,31 @@ class Server:
 				#print '{}:{} server can be idle'.format(self.country, self.serv_id)
 				self.completing = True
 				env.process(self.endService(env))
+		self.account(env.now)
 
-		yield env.timeout(time)
-		
-		# Update the server available capacity
-		to_remove = self.finish_queue.index(env.now)
+		if self.sc.BANDWIDTH_SHARING:
+			yield transfer
+			yield env.timeout(time)
+			to_remove = self.finish_queue.index(transfer)
+		else:
+			yield env.timeout(time)
+			# Update the server available capacity
+			to_remove = self.finish_queue.index(env.now)
 		# After the request processing update the available capacity
 		self.available_capacity += self.size_queue[to_remove]
 		# Remove the served requests from the queue
 		self.size_queue.pop(to_remove)
 		self.finish_queue.pop(to_remove)
+		self.account(env.now)
+		# A completing server waits for its last request
+		if self.drained is not None and not self.size_queue:
+			self.drained.succeed()
+			self.drained = None
 		
 		
 	def estimateRTT(self, row, col):
 		"""Estimate the packet Round Trip Time (RTT) by using the Distances matrix stored in
-		the lib.config file. The RTT is estimated by dividing the distance in km between 
+		the simulation scenario. The RTT is estimated by dividing the distance in km between 
 		the server location and the request sender one times 3*1e5.
 		
 		Parameters
@@ -215,14 +267,15 @@ class Server:
 				estimated RTT in seconds
 		
 		"""
-		dist = DISTANCES[row][col]
+		dist = self.sc.DISTANCES[row][col]
 		dist_delay = dist/(3*1e5)
 		
 		return dist_delay
 	
 	
-	def wakeUp(self, cl_host):
-		""" Wake up a server by using three different criteria:
+	def wakeUp(self, cl_host, env=None):
+		""" Wake up a server by using the strategy of the lib.policy registry indicated by
+		the exp attribute:
 		exp : 1 - Firstly the local servers are checked. If all the local servers are
 			active, the nearest country is checked and so on until a server in idle is not 
 			found
@@ -235,70 +288,31 @@ class Server:
 		----------
 			cl_host : string
 				country of the client which is being served
+			env : simpy.core.Environment
+				instance of the SimPy Environment class, to account the woken up server
 		Attributes
 		----------
 			triggered : bool
 				True if a server is woken up, False otherwise
 		"""
-		active_cnt = 0
 		self.triggered = False
 		
-		# exp 1
-		if self.exp == 1:
-			# Wake up a local server first
-			for serv in self.server_list[cl_host]:
-				if serv.inIdle:
-					serv.inIdle = False
+		for country in self.policy.wakeOrder(cl_host):
+			for serv in self.server_list[country]:
+				if serv.in_idle:
+					serv.in_idle = False
 					self.triggered = True
+					if env is not None:
+						serv.account(env.now)
 					"""
-					print '{}:{} locally wake up'.format(
+					print '{}:{} wake up'.format(
 						serv.country, 
 						serv.serv_id
 					)
 					"""
 					break
-		
-			# If local servers cannot be woken up, wake up a foreign server
-			if self.triggered == False:
-				# sort the countries in an ascending way with respect to their distance 
-				# from the client region
-				cl_row = COUNTRY.index(cl_host)
-				temp_row = np.sort(DISTANCES[cl_row,:])
-				# look for available foreign servers
-				for item in temp_row:
-					if item != 0:
-						foreign = COUNTRY[np.where(temp_row == item)[0][0]]
-						for serv in self.server_list[foreign]:
-							if serv.inIdle:
-								serv.inIdle = False
-								self.triggered = True
-								"""
-								print '{}:{} foreign wake up'.format(
-									serv.country, 
-									serv.serv_id
-								)
-								"""
-								break
-						if self.triggered == True:
-							break
-		
-		# exp 2 or 3
-		else:
-			for i in range(5):
-				best_country = self.best_list[i][1]
-				for serv in self.server_list[best_country]:
-					if serv.inIdle:
-						serv.inIdle = False
-						self.triggered = True
-						"""
-						print '{}:{} wake up'.format(
-							self.country, 
-							best_country
-						)
-						"""
-						break
-				if self.triggered:
-					break	
+			if self.triggered:
+				break
 			
 										
 	def minActiveServ(self):
@@ -318,10 +332,10 @@ class Server:
 		self.active_cnt = 0
 		
 		for serv in self.server_list[self.country]:	
-			if not serv.inIdle and not serv.completing:
+			if not serv.in_idle and not serv.completing:
 				self.active_cnt+=1
 		
-		if self.active_cnt > MIN_ACTIVE[self.country]:
+		if self.active_cnt > self.sc.MIN_ACTIVE[self.country]:
 			return True
 		else:
 			return False
@@ -338,15 +352,22 @@ class Server:
 		Yields
 		------
 			simpy.events.Timeout
-				after the service time nedded to empty the queue 
+				after the service time nedded to empty the queue. With the processor-sharing
+				model the end of the transfers is not known in advance, so the server waits
+				for the drained event, triggered when its last request is served
 		"""
-		temp = sorted(
-			self.finish_queue,
-			reverse = True
-		)
-		wait = temp[0]-env.now
-		
-		yield env.timeout(wait)
+		if self.sc.BANDWIDTH_SHARING:
+			if self.size_queue:
+				self.drained = env.event()
+				yield self.drained
+		else:
+			temp = sorted(
+				self.finish_queue,
+				reverse = True
+			)
+			wait = temp[0]-env.now
+			
+			yield env.timeout(wait)
 		
 		self.available_capacity += sum(self.size_queue)
 		#print '{}:{} server in idle'.format(self.country, self.serv_id)
@@ -359,29 +380,31 @@ class Server:
 		self.completing = False
 		self.in_idle = True
 		self.can_idle = False
-		
-		
-	def orderCost(self):	
-		"""Sort the deployed servers in the whole CDN with respect to the minimum mantaining
-		cost.
-		"""	
-		for u in COUNTRY:
-			self.best_list.append([COSTS[u], u])
-		
-		self.best_list = sorted(
-			self.best_list,
-			key = lambda x:x[0]
-		)		
+		self.account(env.now)
 	
 	
-	def orderPeople(self):		
-		"""Sort the deployed servers in the whole CDN with respect to the maximum number of 
-		people in the countries hosting the servers.
-		"""	
-		for u in COUNTRY:
-			self.best_list.append([DAILY_USERS[u], u])
+	def account(self, now):
+		"""Record the current used capacity, in-flight requests and state in the
+		time-weighted usage, if enabled.
+		
+		Parameters
+		----------
+			now : float
+				simulated time
 		
-		self.best_list = sorted(
-			self.best_list,
-			key = lambda x:x[0]
+		"""
+		if self.usage is None:
+			return
+		if self.in_idle:
+			state = 'idle'
+		elif self.completing:
+			state = 'completing'
+		else:
+			state = 'active'
+		self.usage.update(
+			now,
+			self.sc.CAPACITY - self.available_capacity,
+			len(self.size_queue),
+			state,
+			state != 'idle' and self.available_capacity <= getattr(self, 'max_th', 0.)
 		)
@@ -1,13 +1,13 @@
-from lib.config import *
+from lib.scenario import default
+from lib.cache import CACHES
+from lib.sharing import SharedLink
+from lib.usage import Usage
 
 import simpy
-import random
-
-random.seed(SEED)
 
 class Server:
 	""" Create a server located in the provided country and labelled with the provided ID.
-	The maximum capacity of the server is stored in the lib.config file. 
+	The maximum capacity of the server is stored in the simulation scenario. 
 	When a request is sent to the server, it determines the sevice time and reduces its 
 	available capacity until the client (request) does not leave the system.
 	
@@ -17,6 +17,10 @@ class Server:
 			contry where the server is located
 		serv_id : int
 			server identification number
+		scenario : Scenario
+			simulation configuration. The lib.config values are used if None
+		created : float
+			simulated time of the deployment of the server
 	
 	Attributes
 	----------
@@ -24,30 +28,57 @@ class Server:
 			contry where the server is located
 		serv_id : int
 			server identification number
+		sc : Scenario
+			simulation configuration
+		rng : random.Random
+			stream of the latencies of the server
 		available_capacity : float
 			available capacity of servers
 		size_queue : list
 			server's packet queue storing the requests size
 		finish_queue : list
-			server's packet queue storing the instant at which the request is served
+			server's packet queue storing the instant at which the request is served. With
+			the processor-sharing model it stores the events ending the transfers
+		link : SharedLink
+			processor-sharing link of the server, None with the fixed transfer times
+		cache : Cache
+			cache of the requested objects. None if the caches are disabled
+		usage : Usage
+			time-weighted utilization and in-flight requests. None unless SERVER_USAGE
+			is True
 			
 	Methods
 	-------
-		process(size, env, cl_host)
+		process(size, env, cl_host, obj)
 			serves the request and update the server available capacity
 		estimateRTT(row, col)
 			estimate the packet Round Trip Time (RTT)
+		account(now)
+			record the current capacity and queue in the time-weighted usage
 	
 	"""
-	def __init__(self, country, serv_id):
+	def __init__(self, country, serv_id, scenario=None, created=0.):
 		self.country = country
 		self.serv_id = serv_id
-		self.available_capacity = SERVER_LIMIT*CAPACITY
+		self.sc = scenario or default()
+		self.rng = self.sc.streams.server(country, serv_id)
+		self.available_capacity = self.sc.SERVER_LIMIT*self.sc.CAPACITY
 		# Server packets queue
 		self.size_queue = []
 		self.finish_queue = []
+		self.link = None
+		# Objects cache
+		if self.sc.CACHE_POLICY is None:
+			self.cache = None
+		else:
+			self.cache = CACHES[self.sc.CACHE_POLICY](self.sc.CACHE_SIZE)
+		# Time-weighted usage
+		if self.sc.SERVER_USAGE:
+			self.usage = Usage(self.sc.SERVER_LIMIT*self.sc.CAPACITY, created)
+		else:
+			self.usage = None
 		
-	def process(self, reqsize, env, cl_host):	
+	def process(self, reqsize, env, cl_host, obj=None):	
 		"""The server processes the request by determining the service time and updating the 
 		available capacity.
 		The RTT is composed by three terms:
@@ -56,6 +87,11 @@ class Server:
 		2. Estimated RTT based on the client-server distance
 		3. Transfer delay, which is determined by the size of the response divided by the
 		   capacity allocated to the request in the server.
+		If the caches are enabled and the requested object is not cached, the time needed
+		to fetch it from the origin is added.
+		If BANDWIDTH_SHARING is True, the transfer delay is not fixed at the arrival: the
+		concurrent transfers share the server capacity fairly through the SharedLink of
+		the server, and the other two terms are added at the end of the transfer.
 		
 		When a request arrives at the server, its size is stored in a queue and the istant 
 		at which the request should be served is stored in a second queue. The server 
@@ -69,6 +105,8 @@ class Server:
 				instance of the SymPi Environment class
 			cl_host : str
 				country the client belongs to
+			obj : int
+				requested object of the catalog. None if the caches are disabled
 			
 		Yields
 		------
@@ -76,34 +114,53 @@ class Server:
 				after the service time in seconds
 		
 		"""
-		RTT_row = COUNTRY.index(cl_host)
-		RTT_col = COUNTRY.index(self.country)
+		RTT_row = self.sc.COUNTRY.index(cl_host)
+		RTT_col = self.sc.COUNTRY.index(self.country)
 		
 		# Determine the service time
-		t1 = random.uniform(1e-3, 1e-2)
+		t1 = self.rng.uniform(1e-3, 1e-2)
 		t2 = self.estimateRTT(RTT_row, RTT_col)
-		t3 = reqsize/self.available_capacity
-		time = t1 + t2 + t3
+		if self.sc.BANDWIDTH_SHARING:
+			# the transfer delay depends on the concurrent transfers
+			time = t1 + t2
+		else:
+			t3 = reqsize/self.available_capacity
+			time = t1 + t2 + t3
+		# Fetch the missing object from the origin
+		if self.cache is not None and not self.cache.lookup(obj):
+			time += self.sc.ORIGIN_RTT + reqsize/self.sc.ORIGIN_CAPACITY
 		
 		# Add the new request to the queues
 		self.size_queue.append(reqsize)
-		self.finish_queue.append(env.now+time)
+		if self.sc.BANDWIDTH_SHARING:
+			if self.link is None:
+				self.link = SharedLink(env, self.sc.SERVER_LIMIT*self.sc.CAPACITY)
+			transfer = self.link.transfer(reqsize)
+			self.finish_queue.append(transfer)
+		else:
+			self.finish_queue.append(env.now+time)
 		# Update the server available capacity
 		self.available_capacity -= self.size_queue[-1]
+		self.account(env.now)
 		
-		yield env.timeout(time)
-		
-		# Update the server available capacity
-		to_remove = self.finish_queue.index(env.now)
+		if self.sc.BANDWIDTH_SHARING:
+			yield transfer
+			yield env.timeout(time)
+			to_remove = self.finish_queue.index(transfer)
+		else:
+			yield env.timeout(time)
+			# Update the server available capacity
+			to_remove = self.finish_queue.index(env.now)
 		# After the request processing update the available capacity
 		self.available_capacity += self.size_queue[to_remove]
 		# Remove the served requests from the queue
 		self.size_queue.pop(to_remove)
 		self.finish_queue.pop(to_remove)
+		self.account(env.now)
 		
 	def estimateRTT(self, row, col):
 		"""Estimate the packet Round Trip Time (RTT) by using the Distances matrix stored in
-		the lib.config file. The RTT is estimated by dividing the distance in km between 
+		the simulation scenario. The RTT is estimated by dividing the distance in km between 
 		the server location and the request sender one times 3*1e5.
 		
 		Parameters
@@ -119,7 +176,27 @@ class Server:
 				estimated RTT in seconds
 		
 		"""
-		dist = DISTANCES[row][col]
+		dist = self.sc.DISTANCES[row][col]
 		dist_delay = dist/(3*1e5)
 		
 		return dist_delay
+	
+	
+	def account(self, now):
+		"""Record the current used capacity and in-flight requests in the time-weighted
+		usage, if enabled.
+		
+		Parameters
+		----------
+			now : float
+				simulated time
+		
+		"""
+		if self.usage is not None:
+			self.usage.update(
+				now,
+				self.sc.SERVER_LIMIT*self.sc.CAPACITY - self.available_capacity,
+				len(self.size_queue),
+				'active',
+				False
+			)
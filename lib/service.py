@@ -0,0 +1,314 @@
+from timeit import default_timer as timer
+from multiprocessing import Pool, Queue, Manager
+
+import threading
+import itertools
+import Queue as queue
+import os
+
+from lib.scenario import Scenario, simulate
+from lib.metrics import alive
+from lib import policy
+
+# Simulator modules loaded by the workers when they start
+MODULES = [
+	'lib.network_static',
+	'lib.network_dynamic',
+	'lib.stats_static',
+	'lib.stats_dynamic'
+]
+
+# Seconds a job may wait for its start while a worker is free, after which it is taken
+# as lost by a worker which died before starting it
+START_TIMEOUT = 10.
+
+# Queue of the messages sent to the service and ids of the cancelled jobs, set by
+# initWorker()
+results = None
+cancelled = None
+
+
+class Cancelled(Exception):
+	"""Raised in a worker to stop a job cancelled by the service."""
+
+
+def initWorker(res, cancel):
+	"""Warm up a worker process by importing the simulators.
+
+	Parameters
+	----------
+		res : multiprocessing.Queue
+			queue of the messages sent to the service
+		cancel : multiprocessing.managers.DictProxy
+			the keys are the ids of the jobs cancelled by the service
+
+	"""
+	global results, cancelled
+	results = res
+	cancelled = cancel
+	for name in MODULES:
+		__import__(name)
+
+
+def runJob(job):
+	"""Run a simulation and send its dataframe rows to the service as soon as they are
+	produced. The messages are (job id, kind, content) tuples, where kind is 'start'
+	(with the pid of the worker), 'row', 'end' or 'error'. Each job has its own
+	scenario, so the jobs do not share any state. A cancelled job is stopped at its
+	next row.
+
+	Parameters
+	----------
+		job : dict
+			'id', 'kind' ('static' or 'dynamic'), 'exp', 'config' overrides and 'seed'
+
+	"""
+	job_id = job['id']
+
+	def listener(row):
+		if job_id in cancelled:
+			raise Cancelled("job {} cancelled".format(job_id))
+		results.put((job_id, 'row', row))
+
+	try:
+		if job_id in cancelled:
+			return
+		results.put((job_id, 'start', os.getpid()))
+		t0 = timer()
+		values = dict(job.get('config') or {})
+		if job.get('seed') is not None:
+			values['SEED'] = job['seed']
+		values['VERBOSE'] = False
+		sc = Scenario(**values)
+
+		res = simulate(
+			sc,
+			job['kind'],
+			job['exp'],
+			listener = listener
+		)
+		results.put((job_id, 'end', {
+			'rows':len(res['time']),
+			'simtime':sc.SIMTIME,
+			'wall':timer() - t0
+		}))
+	except Exception as e:
+		results.put((job_id, 'error', "{}: {}".format(type(e).__name__, e)))
+	finally:
+		cancelled.pop(job_id, None)
+
+
+class Service:
+	"""Pool of warm simulation workers. The workers import the simulators once, so a
+	submitted scenario starts without paying the interpreter start up and the imports.
+	The dataframe rows of each simulation are streamed back while it runs. A job whose
+	worker dies ends with an error, a job whose client leaves can be cancelled.
+
+	Parameters
+	----------
+		workers : int
+			number of worker processes
+
+	Attributes
+	----------
+		workers : int
+			number of worker processes
+		pool : multiprocessing.Pool
+			worker processes
+		results : multiprocessing.Queue
+			messages sent by the workers
+		manager : multiprocessing.managers.SyncManager
+			process holding the cancelled jobs
+		cancelled : multiprocessing.managers.DictProxy
+			the keys are the ids of the cancelled jobs, read by the workers
+		jobs : dict
+			the keys are the job ids, the values are the queues of their messages
+		handles : dict
+			the keys are the job ids, the values are their multiprocessing.AsyncResult
+		running : set
+			ids of the jobs started by a worker and not yet ended
+		ids : itertools.count
+			job id generator
+		lock : threading.Lock
+			protect the jobs dictionary
+		dispatcher : threading.Thread
+			route the worker messages to the job queues
+
+	Methods
+	-------
+		submit(kind, exp, values, seed)
+			queue a simulation
+		stream(job_id)
+			iterate over the messages of a job
+		cancel(job_id)
+			stop a job
+		status()
+			number of workers and of jobs not yet ended
+		close()
+			stop the workers
+
+	"""
+	def __init__(self, workers):
+		self.workers = workers
+		self.results = Queue()
+		self.manager = Manager()
+		self.cancelled = self.manager.dict()
+		self.pool = Pool(workers, initWorker, (self.results, self.cancelled))
+		self.jobs = {}
+		self.handles = {}
+		self.running = set()
+		self.ids = itertools.count(1)
+		self.lock = threading.Lock()
+		self.dispatcher = threading.Thread(target=self.dispatch)
+		self.dispatcher.daemon = True
+		self.dispatcher.start()
+
+
+	def dispatch(self):
+		"""Route the worker messages to the job queues.
+
+		"""
+		while True:
+			msg = self.results.get()
+			with self.lock:
+				if msg[1] == 'start':
+					self.running.add(msg[0])
+				elif msg[1] != 'row':
+					self.running.discard(msg[0])
+				jobq = self.jobs.get(msg[0])
+			if jobq is not None:
+				jobq.put(msg[1:])
+
+
+	def submit(self, kind, exp, values=None, seed=None):
+		"""Queue a simulation.
+
+		Parameters
+		----------
+			kind : str
+				'static' or 'dynamic'
+			exp : int
+				strategy identification number, a key of the lib.policy registry
+			values : dict
+				lib.config parameters overridden by the simulation
+			seed : int
+				seed of the random number generators, SEED if None
+
+		Returns
+		-------
+			int
+				job id
+
+		"""
+		if kind not in ('static', 'dynamic'):
+			raise ValueError("unknown simulator: {}".format(kind))
+		if exp not in policy.POLICIES:
+			raise ValueError("unknown strategy: {}".format(exp))
+		job_id = next(self.ids)
+		with self.lock:
+			self.jobs[job_id] = queue.Queue()
+			self.handles[job_id] = self.pool.apply_async(runJob, ({
+				'id':job_id,
+				'kind':kind,
+				'exp':exp,
+				'config':values or {},
+				'seed':seed
+			},))
+		return job_id
+
+
+	def stream(self, job_id):
+		"""Iterate over the messages of a job until it ends. The job ends with an error if
+		the worker running it dies, or if it does not start within START_TIMEOUT seconds
+		of a worker being free, as the pool does not run again the job of a worker which
+		died before starting it.
+
+		Parameters
+		----------
+			job_id : int
+				job id
+
+		Yields
+		------
+			tuple
+				(kind, content) where kind is 'row', 'end' or 'error'
+
+		"""
+		with self.lock:
+			jobq = self.jobs[job_id]
+			handle = self.handles[job_id]
+		pid = None
+		free = None
+		try:
+			while True:
+				# a timeout keeps the thread interruptible and checks the worker
+				try:
+					msg = jobq.get(timeout=1)
+				except queue.Empty:
+					if pid is not None:
+						if not alive(pid):
+							yield ('error', "worker {} running the job died".format(pid))
+							return
+						continue
+					with self.lock:
+						busy = len(self.running) >= self.workers
+					if busy and not handle.ready():
+						free = None
+					elif free is None:
+						free = timer()
+					elif timer() - free > START_TIMEOUT:
+						if handle.ready() and not handle.successful():
+							try:
+								handle.get()
+							except Exception as e:
+								yield ('error', "{}: {}".format(type(e).__name__, e))
+								return
+						yield ('error', "the job was lost before starting")
+						return
+					continue
+				if msg[0] == 'start':
+					pid = msg[1]
+					continue
+				yield msg
+				if msg[0] != 'row':
+					return
+		finally:
+			with self.lock:
+				del self.jobs[job_id]
+				del self.handles[job_id]
+				self.running.discard(job_id)
+
+
+	def cancel(self, job_id):
+		"""Stop a job, e.g. when its client disconnects. A running job stops at its next
+		row, a queued one does not start.
+
+		Parameters
+		----------
+			job_id : int
+				job id
+
+		"""
+		self.cancelled[job_id] = True
+
+
+	def status(self):
+		"""Number of workers and of submitted jobs not yet ended.
+
+		Returns
+		-------
+			dict
+				'workers' and 'jobs'
+
+		"""
+		with self.lock:
+			return {'workers':self.workers, 'jobs':len(self.jobs)}
+
+
+	def close(self):
+		"""Stop the workers.
+
+		"""
+		self.pool.terminate()
+		self.pool.join()
+		self.manager.shutdown()
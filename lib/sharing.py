@@ -0,0 +1,118 @@
+import heapq
+
+
+class SharedLink:
+	"""Processor-sharing link of a server: the transfers in progress share the capacity
+	fairly, each one receiving capacity/n bits per second. The completion times are
+	tracked with a virtual time V, which grows at capacity/n, so a transfer of size s
+	arriving at virtual time V0 ends when V reaches its tag V0 + s, whatever the later
+	arrivals and departures. The tags are kept in a heap and only the earliest
+	departure is scheduled, so an arrival or a departure costs O(log n).
+	Rescheduling leaves the previous departure event in the SimPy queue; it is ignored
+	when it fires as its generation is stale.
+
+	Parameters
+	----------
+		env : simpy.core.Environment
+			instance of the SimPy Environment class
+		capacity : float
+			capacity of the link in bits per second
+
+	Attributes
+	----------
+		env : simpy.core.Environment
+			instance of the SimPy Environment class
+		capacity : float
+			capacity of the link in bits per second
+		vtime : float
+			virtual time at the last update
+		last : float
+			simulation time of the last update
+		heap : list
+			(tag, sequence number, event) of the transfers in progress
+		gen : int
+			generation of the scheduled departure
+
+	Methods
+	-------
+		transfer(size)
+			start a transfer and return the event triggered at its end
+		advance()
+			bring the virtual time to the current time
+
+	"""
+	def __init__(self, env, capacity):
+		self.env = env
+		self.capacity = capacity
+		self.vtime = 0.
+		self.last = env.now
+		self.heap = []
+		self.seq = 0
+		self.gen = 0
+
+
+	def __len__(self):
+		return len(self.heap)
+
+
+	def advance(self):
+		"""Bring the virtual time to the current simulation time."""
+		now = self.env.now
+		if self.heap:
+			self.vtime += (now - self.last)*self.capacity/len(self.heap)
+		self.last = now
+
+
+	def transfer(self, size):
+		"""Start a transfer.
+
+		Parameters
+		----------
+			size : float
+				bits to transfer
+
+		Returns
+		-------
+			simpy.events.Event
+				triggered at the end of the transfer, with its tag as value
+
+		"""
+		self.advance()
+		done = self.env.event()
+		heapq.heappush(self.heap, (self.vtime + size, self.seq, done))
+		self.seq += 1
+		self.schedule()
+		return done
+
+
+	def schedule(self):
+		"""Schedule the earliest departure, invalidating the previous one."""
+		self.gen += 1
+		gen = self.gen
+		delay = (self.heap[0][0] - self.vtime)*len(self.heap)/self.capacity
+		event = self.env.timeout(max(delay, 0.))
+		event.callbacks.append(lambda event:self.depart(gen))
+
+
+	def depart(self, gen):
+		"""End the transfers whose tag is reached, if the departure is still valid.
+
+		Parameters
+		----------
+			gen : int
+				generation of the departure
+
+		"""
+		if gen != self.gen:
+			return
+		self.advance()
+		# The earliest transfer ends by construction: with the rounding of the time the
+		# virtual time can stay slightly below its tag
+		tag, seq, done = heapq.heappop(self.heap)
+		self.vtime = max(self.vtime, tag)
+		done.succeed(tag)
+		while self.heap and self.heap[0][0] <= self.vtime:
+			tag, seq, done = heapq.heappop(self.heap)
+			done.succeed(tag)
+		if self.heap:
+			self.schedule()
@@ -0,0 +1,396 @@
+import math
+import os
+import sys
+import tempfile
+
+from lib.convergence import tQuantile
+from lib.rng import spawn
+
+
+class Splitting:
+	"""Rare-event estimator based on fixed splitting. The importance function is the
+	global utilization of the CDN, i.e. one minus the available capacity of all the
+	servers over their total capacity. Whenever a trajectory crosses a level for the
+	first time it is split in 'factor' copies, which continue independently from the
+	same state with new random streams, and each copy carries 1/factor of its weight.
+	The probability of the rare event within the horizon is the sum of the weights of
+	the trajectories reaching it, averaged over independent root trajectories.
+
+	The simulation state is cloned with os.fork(): the process which crosses a level
+	is frozen and each copy is a child process sharing its memory until it is written,
+	so a clone costs the same whatever the number of clients in the system. The
+	copies are run one at a time, at most one process per level is alive. os.fork()
+	is only available on Unix systems.
+
+	The rare event is the deployment of a new server for the static simulator and a
+	client retrying because all the servers are busy for the dynamic one.
+
+	Parameters
+	----------
+		scenario : Scenario
+			simulation configuration. The horizon is its SIMTIME
+		kind : str
+			'static' (fixed number of servers) or 'dynamic' (dynamic server allocation)
+		exp : int
+			deploy or wake up strategy identification number
+
+	Attributes
+	----------
+		sc : Scenario
+			simulation configuration
+		kind : str
+			simulator kind
+		exp : int
+			deploy or wake up strategy identification number
+		levels : list
+			increasing utilization levels at which the trajectories are split
+		factor : int
+			number of copies of a trajectory crossing a level
+		dt : float
+			seconds between two checks of the utilization
+		estimates : list
+			estimated probability of the rare event for each root trajectory
+		reached : list
+			for each root trajectory, estimated probability of crossing each level
+
+	Methods
+	-------
+		utilization(net)
+			global utilization of the CDN
+		occurred(net, stat)
+			check whether the rare event occurred
+		root(seed)
+			run a root trajectory and its copies
+		estimate(n_roots, confidence)
+			estimate the probability of the rare event with a confidence interval
+		report(confidence)
+			summary of the estimation
+
+	Raises
+	------
+		ValueError
+			if the simulator kind is unknown
+
+	"""
+	def __init__(self, scenario, kind='static', exp=1):
+		if kind not in ('static', 'dynamic'):
+			raise ValueError("unknown simulator: {}".format(kind))
+		self.sc = scenario
+		self.kind = kind
+		self.exp = exp
+		self.levels = sorted(scenario.SPLIT_LEVELS)
+		self.factor = scenario.SPLIT_FACTOR
+		self.dt = scenario.SPLIT_DT
+		self.estimates = []
+		self.reached = []
+
+
+	def utilization(self, net):
+		"""Global utilization of the CDN. The capacity of a static server is limited to
+		SERVER_LIMIT times CAPACITY, idle dynamic servers count as fully available.
+
+		Parameters
+		----------
+			net : Network
+				instance of the Network class
+
+		Returns
+		-------
+			float
+				used capacity over the total capacity of the servers
+
+		"""
+		total = 0.
+		available = 0.
+		for u in net.s:
+			for server in net.s[u]:
+				available += server.available_capacity
+				total += 1
+		if self.kind == 'static':
+			total *= self.sc.SERVER_LIMIT*self.sc.CAPACITY
+		else:
+			total *= self.sc.CAPACITY
+		return 1 - available/total
+
+
+	def occurred(self, net, stat):
+		"""Check whether the rare event occurred.
+
+		Parameters
+		----------
+			net : Network
+				instance of the Network class
+			stat : Stats
+				instance of the Stats class
+
+		Returns
+		-------
+			bool
+				True if a server was deployed (static) or a request found all the servers
+				busy (dynamic)
+
+		"""
+		if self.kind == 'static':
+			return sum(len(net.s[u]) for u in net.s) > self.n_servers
+		return stat.n_retry > 0
+
+
+	def monitor(self, env, net, stat, done):
+		"""Check the rare event and the level crossings every dt seconds. At a crossing
+		the process forks a copy per branch and waits for each of them, then it stops
+		its own run as its future is covered by the copies.
+
+		Parameters
+		----------
+			env : simpy.core.Environment
+				instance of the SimPy Environment class
+			net : Network
+				instance of the Network class
+			stat : Stats
+				instance of the Stats class
+			done : simpy.events.Event
+				event ending the trajectory, its value is 'hit', 'split' or 'end'
+
+		Yields
+		------
+			simpy.events.Timeout
+				after dt seconds
+
+		"""
+		level = 0
+		while not done.triggered:
+			yield env.timeout(self.dt)
+			if done.triggered:
+				return
+			if self.occurred(net, stat):
+				done.succeed('hit')
+				return
+			u = self.utilization(net)
+			while level < len(self.levels) and u >= self.levels[level]:
+				level += 1
+				self.record('L', level)
+				if self.split(net):
+					done.succeed('split')
+					return
+
+
+	def split(self, net):
+		"""Clone the trajectory in 'factor' copies.
+
+		Parameters
+		----------
+			net : Network
+				instance of the Network class
+
+		Returns
+		-------
+			bool
+				True in the frozen process once all the copies ended, False in a copy
+
+		"""
+		sys.stdout.flush()
+		for branch in range(self.factor):
+			pid = os.fork()
+			if pid == 0:
+				self.child = True
+				self.path = self.path + (branch,)
+				self.weight /= self.factor
+				self.reseed(net)
+				return False
+			os.waitpid(pid, 0)
+		return True
+
+
+	def reseed(self, net):
+		"""Give a copy its own random streams, derived from the seed of the scenario and
+		from the branches followed since the root.
+
+		Parameters
+		----------
+			net : Network
+				instance of the Network class
+
+		"""
+		seed = spawn(self.seed, *self.path)
+		self.sc.random.seed(seed)
+		self.sc.np_random.seed(seed)
+		self.sc.streams.reseed(seed)
+		if net.catalog is not None:
+			net.catalog.rng.seed(seed)
+			net.catalog.batch = []
+
+
+	def record(self, kind, level=0):
+		"""Append an outcome to the results file. The writes are shorter than the pipe
+		buffer and the file is opened in append mode, so they are not interleaved.
+
+		Parameters
+		----------
+			kind : str
+				'L' for a level crossing, 'H' for the rare event, 'E' for a failed copy
+			level : int
+				crossed level, starting from 1
+
+		"""
+		os.write(self.out, "{} {} {!r}\n".format(kind, level, self.weight))
+
+
+	def root(self, seed):
+		"""Run a root trajectory from the beginning of the simulation, together with all
+		its copies.
+
+		Parameters
+		----------
+			seed : int
+				seed of the random number generators of the root trajectory
+
+		Returns
+		-------
+			tuple
+				estimated probability of the rare event and list of the estimated
+				probabilities of crossing each level
+
+		Raises
+		------
+			RuntimeError
+				if a copy of the trajectory failed
+
+		"""
+		import simpy
+		if self.kind == 'static':
+			from lib.network_static import Network
+			from lib.stats_static import Stats
+		else:
+			from lib.network_dynamic import Network
+			from lib.stats_dynamic import Stats
+
+		self.seed = seed
+		self.sc.random.seed(seed)
+		self.sc.np_random.seed(seed)
+		self.sc.streams.reseed(seed)
+		self.child = False
+		self.path = ()
+		self.weight = 1.
+
+		env = simpy.Environment()
+		stat = Stats(self.sc)
+		stat.export = False
+		if self.kind == 'static':
+			net = Network(stat, self.sc)
+			args = (self.exp,)
+		else:
+			net = Network(stat, self.exp, self.sc)
+			args = ()
+		self.n_servers = sum(len(net.s[u]) for u in net.s)
+		for u in self.sc.COUNTRY:
+			env.process(net.arrival(env, self.sc.DAILY_USERS[u], u, *args))
+
+		done = env.event()
+		def horizon():
+			yield env.timeout(self.sc.SIMTIME)
+			if not done.triggered:
+				done.succeed('end')
+		env.process(horizon())
+		env.process(self.monitor(env, net, stat, done))
+
+		fd, name = tempfile.mkstemp(prefix='splitting')
+		os.close(fd)
+		self.out = os.open(name, os.O_WRONLY | os.O_APPEND)
+		try:
+			try:
+				env.run(until=done)
+				if done.value == 'hit':
+					self.record('H')
+			except Exception:
+				if not self.child:
+					raise
+				self.record('E')
+		finally:
+			# The copies never return to the caller
+			if self.child:
+				os._exit(0)
+			os.close(self.out)
+
+		hit = 0.
+		reached = [0.]*len(self.levels)
+		failed = False
+		with open(name) as f:
+			for line in f:
+				kind, level, weight = line.split()
+				if kind == 'H':
+					hit += float(weight)
+				elif kind == 'L':
+					reached[int(level) - 1] += float(weight)
+				else:
+					failed = True
+		os.remove(name)
+		if failed:
+			raise RuntimeError("a copy of the trajectory with seed {} failed".format(seed))
+		return hit, reached
+
+
+	def estimate(self, n_roots, confidence):
+		"""Estimate the probability of the rare event within the horizon over n_roots
+		independent root trajectories.
+
+		Parameters
+		----------
+			n_roots : int
+				number of root trajectories
+			confidence : float
+				confidence level of the interval
+
+		Returns
+		-------
+			tuple
+				estimated probability and half-width of the confidence interval. The
+				half-width is infinite with a single root trajectory
+
+		"""
+		for i in range(n_roots):
+			hit, reached = self.root(self.sc.SEED + len(self.estimates))
+			self.estimates.append(hit)
+			self.reached.append(reached)
+		return self.interval(self.estimates, confidence)
+
+
+	def interval(self, values, confidence):
+		"""Mean and half-width of the confidence interval of the root estimates."""
+		n = len(values)
+		mean = sum(values)/n
+		if n < 2:
+			return mean, float('inf')
+		var = sum((v - mean)**2 for v in values)/(n - 1)
+		return mean, tQuantile((1 + confidence)/2, n - 1)*math.sqrt(var/n)
+
+
+	def report(self, confidence):
+		"""Summary of the estimation.
+
+		Parameters
+		----------
+			confidence : float
+				confidence level of the intervals
+
+		Returns
+		-------
+			str
+				estimated probability of crossing each level and of the rare event
+
+		"""
+		lines = ["{} root trajectories, {} copies per crossing, horizon {} s".format(
+			len(self.estimates), self.factor, self.sc.SIMTIME
+		)]
+		for k, level in enumerate(self.levels):
+			mean, half = self.interval([r[k] for r in self.reached], confidence)
+			lines.append("P(utilization >= {:<5}){:>14.4e} +/- {:.4e}".format(
+				level, mean, half
+			))
+		mean, half = self.interval(self.estimates, confidence)
+		lines.append("P(rare event)            {:>14.4e} +/- {:.4e} ({} at {:.0%})".format(
+			mean,
+			half,
+			"{:.1%}".format(half/mean) if mean else "no hits",
+			confidence
+		))
+		return "\n".join(lines)
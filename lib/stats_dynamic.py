@@ -1,9 +1,22 @@
-import pandas as pd
-from config import *
+from scenario import default
+from profiler import residentMemory
+
+from collections import deque
+
+import math
+import csv
+
+# Columns of the per-server usage table
+SERVER_COLUMNS = ['interval', 'country', 'server', 'util', 'queue', 'active', 'completing', 'idle', 'near.max']
 
 class Stats():
 	"""Create a .csv dataframe to analyze the simulation performances and results.
 	
+	Parameters
+	----------
+		scenario : Scenario
+			simulation configuration. The lib.config values are used if None
+	
 	Attributes
 	----------
 		n_clients : dict
@@ -14,21 +27,51 @@ class Stats():
 			number of locally served requests 
 		local_req_perc : flaot
 			percentage of locally serverd requests
-		sess_time : list
-			when a client finishes its requests its session time is appended to the list
+		n_retry : int
+			number of requests which found all the servers busy
+		sess_sum : float
+			sum of the session times of the clients which finished in the interval
+		sess_cnt : int
+			number of clients which finished in the interval
 		avg_sess_time : float
 			average session time of the clients. The value is updated every 30 minutes
+		sess_times : list
+			session times of the clients which finished in the interval, None without a
+			SESSION_QUANTILE
+		q_sess_time : float
+			SESSION_QUANTILE quantile of the session times of the last interval
 		data : dict
-			dataframe
+			dataframe. With a WINDOW, each column is a deque of the last WINDOW rows
 		index : list
 			dataframe row names
+		window : int
+			number of rows kept in memory, None to keep the whole dataframe
+		spilled : int
+			number of rows appended to the .csv file
+		hits : dict
+			number of cache hits per country at the last acquisition
+		lookups : dict
+			number of cache lookups per country at the last acquisition
+		sc : Scenario
+			simulation configuration
+		listeners : list
+			functions called with each new dataframe row, e.g. to stream the results
+		export : bool
+			if False the dataframe is not saved to the .csv file
+		servers : list
+			per-server usage of the last interval, a row with the SERVER_COLUMNS per
+			server. Without SERVER_USAGE it stays empty
+		intervals : int
+			number of intervals whose server usage was collected
+		servers_spilled : bool
+			True once the header of the per-server usage table is written
 			
 	Methods
 	-------
 		estimateSessionTime(time)
 			estimate the client session time
 		avgSessionTime()
-			determine the average session time
+			determine the average session time and its quantile
 		nOfReq()
 			count the number of generated requests
 		localReq()
@@ -39,13 +82,22 @@ class Stats():
 			count the total number of active servers in the CDN.
 		avgAvailCapacity(s):
 			determine the average available capacity of all the active servers in the CDN.
+		hitRatio(s)
+			determine the cache hit ratio of the last interval
+		serverUsage(s, now)
+			determine the time-weighted server usage of the last interval
+		spill(now, path)
+			append the last row of the dataframe to the .csv file
+		spillServers(now, path)
+			append the per-server usage of the last interval to its .csv file
 		createDF(self, now, avg, req, cost, 
 			act_ch, act_ja,	act_br, act_us, act_in, tot_act, exp
 		)
 			save the dataframe to a .csv file
 			
 	"""
-	def __init__(self):
+	def __init__(self, scenario=None):
+		self.sc = scenario or default()
 		self.n_clients = {
 			'China':0,
 			'India':0,
@@ -56,7 +108,9 @@ class Stats():
 		self.n_req = 0
 		self.local_req = 0
 		self.local_req_perc = 0
-		self.sess_time = []
+		self.n_retry = 0
+		self.sess_sum = 0
+		self.sess_cnt = 0
 		self.avg_sess_time = 0
 		self.data = {
 			'avg.sess.time':[], 
@@ -76,6 +130,42 @@ class Stats():
 			'tot.cl':[]
 		}
 		self.index = []
+		# cache hit ratio columns
+		self.hits = {}
+		self.lookups = {}
+		if self.sc.CACHE_POLICY is not None:
+			self.data['cache.hit'] = []
+			for country in self.sc.COUNTRY:
+				self.data[country+'.hit'] = []
+				self.hits[country] = 0
+				self.lookups[country] = 0
+		# time-weighted server usage columns
+		if self.sc.SERVER_USAGE:
+			self.data['tot.util'] = []
+			for country in self.sc.COUNTRY:
+				self.data[country+'.util'] = []
+				self.data[country+'.queue'] = []
+				self.data[country+'.idle'] = []
+				self.data[country+'.near.max'] = []
+		# session time quantile column
+		self.sess_times = None
+		self.q_sess_time = 0
+		if self.sc.SESSION_QUANTILE is not None:
+			self.data['q.sess.time'] = []
+			self.sess_times = []
+		self.servers = []
+		self.intervals = 0
+		self.servers_spilled = False
+		self.listeners = []
+		self.export = True
+		# bounded memory: rolling window of the last rows and resident memory column
+		self.window = self.sc.WINDOW
+		self.spilled = 0
+		if self.window is not None:
+			self.data['rss'] = []
+			for col in self.data:
+				self.data[col] = deque(maxlen=self.window)
+			self.index = deque(maxlen=self.window)
 
 	
 	def estimateSessionTime(self, time):
@@ -87,15 +177,29 @@ class Stats():
 				session time of the clients
 				
 		"""
-		self.sess_time.append(time)
+		self.sess_sum += time
+		self.sess_cnt += 1
+		if self.sess_times is not None:
+			self.sess_times.append(time)
 	
 	
 	def avgSessionTime(self):
-		"""Determine the average session time.
+		"""Determine the average session time and, with a SESSION_QUANTILE, its quantile
+		(nearest rank). If no session ended in the last interval, the previous values are
+		kept.
 		
 		"""
-		self.avg_sess_time = (sum(self.sess_time))/len(self.sess_time)
-		self.sess_time = []
+		if self.sess_cnt > 0:
+			self.avg_sess_time = self.sess_sum/self.sess_cnt
+		self.sess_sum = 0
+		self.sess_cnt = 0
+		if self.sess_times is not None:
+			if self.sess_times:
+				times = sorted(self.sess_times)
+				rank = int(math.ceil(self.sc.SESSION_QUANTILE*len(times)))
+				self.q_sess_time = times[min(max(rank, 1), len(times)) - 1]
+				self.sess_times = []
+			self.data['q.sess.time'].append(self.q_sess_time)
 	
 	
 	def nOfReq(self):
@@ -123,7 +227,7 @@ class Stats():
 		"""
 		self.n_active = 0
 		for server in serv:
-			if not server.inIdle and not server.completing:
+			if not server.in_idle and not server.completing:
 				self.n_active+=1
 		return self.n_active
 	
@@ -139,7 +243,7 @@ class Stats():
 		self.n_active = 0
 		for country in s:
 			for server in s[country]:
-				if not server.inIdle and not server.completing:
+				if not server.in_idle and not server.completing:
 					self.n_active+=1
 		return self.n_active
 	
@@ -155,11 +259,107 @@ class Stats():
 		self.avg_cap = 0.0
 		for country in s:
 			for server in s[country]:
-				if not server.inIdle and not server.completing:
+				if not server.in_idle and not server.completing:
 					self.avg_cap += server.available_capacity
 					self.n_active+=1
 		return self.avg_cap/self.n_active
 		
+	def hitRatio(self, s):
+		"""Determine the percentage of requests served from the caches in the last 
+		interval, in the whole CDN and in each country.
+		
+		Parameters
+		----------
+			s : dict
+				list of servers deployed in each country
+		
+		Returns
+		-------
+			float
+				percentage of cache hits in the whole CDN
+				
+		"""
+		tot_hits = 0
+		tot_lookups = 0
+		for country in self.sc.COUNTRY:
+			hits = 0
+			lookups = 0
+			for server in s[country]:
+				hits += server.cache.hits
+				lookups += server.cache.lookups
+			hits, self.hits[country] = hits - self.hits[country], hits
+			lookups, self.lookups[country] = lookups - self.lookups[country], lookups
+			if lookups > 0:
+				self.data[country+'.hit'].append(100.*hits/lookups)
+			else:
+				self.data[country+'.hit'].append(0.)
+			tot_hits += hits
+			tot_lookups += lookups
+		
+		if tot_lookups > 0:
+			self.data['cache.hit'].append(100.*tot_hits/tot_lookups)
+		else:
+			self.data['cache.hit'].append(0.)
+		return self.data['cache.hit'][-1]
+	
+	
+	def serverUsage(self, s, now):
+		"""Determine the time-weighted usage of the servers of each country in the last
+		interval: utilization (used over total capacity) and in-flight requests per
+		server, fraction of time in idle and fraction of time under the wake-up
+		threshold, averaged over the time each server existed in the interval. The
+		same values of each server, with its fraction of time in every state, are kept
+		in servers.
+		
+		Parameters
+		----------
+			s : dict
+				list of servers deployed in each country
+			now : float
+				simulated time in seconds
+		
+		Returns
+		-------
+			float
+				utilization of the whole CDN
+				
+		"""
+		tot_time = 0.
+		tot_used = 0.
+		self.servers = []
+		for country in self.sc.COUNTRY:
+			res = [server.usage.collect(now) for server in s[country]]
+			for server, r in zip(s[country], res):
+				if r['time'] > 0:
+					self.servers.append([
+						self.intervals, country, server.serv_id,
+						r['used']/r['time'], r['queue']/r['time'],
+						r['active']/r['time'], r['completing']/r['time'],
+						r['idle']/r['time'], r['near']/r['time']
+					])
+			time = sum(r['time'] for r in res)
+			used = sum(r['used'] for r in res)
+			if time > 0:
+				self.data[country+'.util'].append(used/time)
+				self.data[country+'.queue'].append(sum(r['queue'] for r in res)/time)
+				self.data[country+'.idle'].append(sum(r['idle'] for r in res)/time)
+				self.data[country+'.near.max'].append(sum(r['near'] for r in res)/time)
+			else:
+				self.data[country+'.util'].append(0.)
+				self.data[country+'.queue'].append(0.)
+				self.data[country+'.idle'].append(0.)
+				self.data[country+'.near.max'].append(0.)
+			tot_time += time
+			tot_used += used
+		
+		if tot_time > 0:
+			self.data['tot.util'].append(tot_used/tot_time)
+		else:
+			self.data['tot.util'].append(0.)
+		self.intervals += 1
+		return self.data['tot.util'][-1]
+	
+	
 	def createDF(self, now, avg, req, cost, 
 			act_ch, act_ja,	act_br, act_us, act_in, tot_act, exp
 		):
@@ -202,13 +402,76 @@ class Stats():
 		self.data["Brazil.act.s."].append(act_br)
 		self.data["Japan.act.s."].append(act_ja)
 		self.data["tot.act.s."].append(tot_act)
-		for country in COUNTRY:
+		for country in self.sc.COUNTRY:
 			self.data['{}.cl'.format(country)].append(self.n_clients[country])
 			tot_cl+=self.n_clients[country]
 			self.n_clients[country]=0
 		self.data['tot.cl'].append(tot_cl)
 		
+		if self.window is not None:
+			self.data['rss'].append(residentMemory())
+		
+		# notify the new row to the listeners
+		if self.listeners:
+			row = dict((col, self.data[col][-1]) for col in self.data if self.data[col])
+			row['time'] = now
+			for listener in self.listeners:
+				listener(row)
+		if not self.export:
+			return
+		if self.servers:
+			self.spillServers(now, "output/2_dynamic0{}_servers.csv".format(exp))
+		if self.window is not None:
+			self.spill(now, "output/2_dynamic0{}.csv".format(exp))
+			return
+		
+		# imported here to keep the simulator start up fast
+		import pandas as pd
 		# creates pandas DataFrame. 
 		df = pd.DataFrame(self.data, self.index) 
 		# export data
 		df.to_csv("output/2_dynamic0{}.csv".format(exp))
+	
+	
+	def spill(self, now, path):
+		"""Append the last row of the dataframe to the .csv file, in the format of the
+		pandas export. The header is written with the first row.
+		
+		Parameters
+		----------
+			now : str
+				simulated time
+			path : str
+				path of the .csv file
+		
+		"""
+		columns = sorted(self.data)
+		with open(path, 'wb' if self.spilled == 0 else 'ab') as f:
+			writer = csv.writer(f)
+			if self.spilled == 0:
+				writer.writerow([''] + columns)
+			row = [self.data[col][-1] for col in columns]
+			writer.writerow([now] + [repr(v) if isinstance(v, float) else v for v in row])
+		self.spilled += 1
+	
+	
+	def spillServers(self, now, path):
+		"""Append the per-server usage of the last interval to its .csv file, a long
+		table with a row per server and interval. The header is written with the first
+		rows.
+		
+		Parameters
+		----------
+			now : str
+				simulated time
+			path : str
+				path of the .csv file
+		
+		"""
+		with open(path, 'ab' if self.servers_spilled else 'wb') as f:
+			writer = csv.writer(f)
+			if not self.servers_spilled:
+				writer.writerow(['time'] + SERVER_COLUMNS)
+			for row in self.servers:
+				writer.writerow([now] + [repr(v) if isinstance(v, float) else v for v in row])
+		self.servers_spilled = True
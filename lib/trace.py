@@ -0,0 +1,198 @@
+import numpy as np
+import os
+
+from lib.scenario import default
+
+# Binary trace layout: a 16 bytes header (8 bytes magic string, 4 bytes format
+# version, 4 bytes reserved) followed by packed fixed-size records.
+TRACE_MAGIC = b'CDNTRACE'
+TRACE_VERSION = 1
+HEADER_SIZE = 16
+
+# One record per request. The region is the index of the client country in
+# the COUNTRY list of the scenario
+TRACE_DTYPE = np.dtype([
+	('time', '<f8'),
+	('region', 'u1'),
+	('session', '<u8'),
+	('size', '<f4')
+])
+
+
+class TraceReader:
+	"""Stream a request log in chunks. Each record describes a request by its
+	timestamp (seconds from the beginning of the simulation), the client region, the
+	session identification number and the request size in bits. The records must be
+	sorted by timestamp.
+	Two formats are supported:
+	- binary : the file is memory-mapped, so only the chunk being replayed is paged in
+	  and logs larger than the RAM can be replayed.
+	- csv : the file must have a 'time,region,session,size' header. The region is either
+	  the country name or its index in the COUNTRY list of the scenario. The file is
+	  parsed chunk by chunk.
+
+	Parameters
+	----------
+		path : str
+			path of the request log
+		chunk : int
+			number of records returned at once, TRACE_CHUNK if None
+		scenario : Scenario
+			simulation configuration. The lib.config values are used if None
+
+	Attributes
+	----------
+		path : str
+			path of the request log
+		chunk : int
+			number of records returned at once
+		binary : bool
+			True if the log is in the binary format, False if it is a .csv file
+		sc : Scenario
+			simulation configuration
+
+	Methods
+	-------
+		chunks()
+			iterate over the log returning a structured array per chunk
+		isBinary(path)
+			check if a file is a binary trace
+
+	"""
+	def __init__(self, path, chunk=None, scenario=None):
+		self.sc = scenario or default()
+		self.path = path
+		self.chunk = chunk or self.sc.TRACE_CHUNK
+		self.binary = self.isBinary(path)
+
+
+	def __len__(self):
+		if self.binary:
+			return (os.path.getsize(self.path) - HEADER_SIZE)//TRACE_DTYPE.itemsize
+
+		# the .csv lines are counted without parsing them
+		cnt = 0
+		with open(self.path, 'rb') as f:
+			for line in f:
+				cnt += 1
+		return max(cnt - 1, 0)
+
+
+	def chunks(self):
+		"""Iterate over the request log.
+
+		Yields
+		------
+			numpy.ndarray
+				structured array with TRACE_DTYPE records. In the binary format it is a
+				view of the memory-mapped file
+
+		Raises
+		------
+			ValueError
+				if a region name of a .csv log is not a country
+
+		"""
+		if self.binary:
+			n_rec = len(self)
+			if n_rec == 0:
+				return
+			trace = np.memmap(
+				self.path,
+				dtype = TRACE_DTYPE,
+				mode = 'r',
+				offset = HEADER_SIZE,
+				shape = (n_rec,)
+			)
+			for start in range(0, n_rec, self.chunk):
+				yield trace[start:start + self.chunk]
+		else:
+			# pandas is slow to import and it is only needed by the .csv logs
+			import pandas as pd
+			regions = dict((u, i) for i, u in enumerate(self.sc.COUNTRY))
+			for df in pd.read_csv(self.path, chunksize=self.chunk, memory_map=True):
+				rec = np.empty(len(df), dtype=TRACE_DTYPE)
+				rec['time'] = df['time'].values
+				rec['session'] = df['session'].values
+				rec['size'] = df['size'].values
+				if df['region'].dtype == object:
+					region = df['region'].map(regions)
+					if region.isnull().any():
+						unknown = sorted(set(df['region'][region.isnull()].astype(str)))
+						raise ValueError("unknown regions in {}: {}".format(
+							self.path, ", ".join(unknown)
+						))
+					rec['region'] = region.values
+				else:
+					rec['region'] = df['region'].values
+				yield rec
+
+
+	def isBinary(self, path):
+		"""Check if a file is a binary trace by reading its magic string.
+
+		Parameters
+		----------
+			path : str
+				path of the request log
+
+		Returns
+		-------
+			bool
+				True if the file is a binary trace, False otherwise
+
+		"""
+		with open(path, 'rb') as f:
+			header = f.read(HEADER_SIZE)
+		return header[:len(TRACE_MAGIC)] == TRACE_MAGIC
+
+
+class TraceWriter:
+	"""Write a binary request log chunk by chunk. The header is written when the file is
+	opened, the records are appended as they are provided.
+
+	Parameters
+	----------
+		path : str
+			path of the request log
+
+	Attributes
+	----------
+		f : file
+			binary file the records are written to
+		n_rec : int
+			number of written records
+
+	Methods
+	-------
+		write(rec)
+			append a chunk of records to the log
+		close()
+			close the log
+
+	"""
+	def __init__(self, path):
+		self.f = open(path, 'wb')
+		self.f.write(TRACE_MAGIC)
+		self.f.write(np.array([TRACE_VERSION, 0], dtype='<u4').tobytes())
+		self.n_rec = 0
+
+
+	def write(self, rec):
+		"""Append a chunk of records to the log.
+
+		Parameters
+		----------
+			rec : numpy.ndarray
+				structured array with TRACE_DTYPE records sorted by timestamp
+
+		"""
+		self.f.write(np.ascontiguousarray(rec, dtype=TRACE_DTYPE).tobytes())
+		self.n_rec += len(rec)
+
+
+	def close(self):
+		"""Close the log.
+
+		"""
+		self.f.close()
@@ -0,0 +1,144 @@
+class Usage:
+	"""Time-weighted accumulators of a server. The server reports its used capacity,
+	in-flight requests, state and whether it is beyond its wake-up threshold each time
+	one of them changes, the accumulators add the previous values times the time
+	elapsed since the last change, so an update costs O(1) and nothing happening
+	between two dataframe rows is missed.
+
+	Parameters
+	----------
+		capacity : float
+			capacity of the server in bits per second
+		now : float
+			simulated time of the deployment of the server
+		state : str
+			initial state: 'active', 'completing' or 'idle'
+
+	Attributes
+	----------
+		capacity : float
+			capacity of the server
+		start : float
+			beginning of the current interval
+		last : float
+			time of the last update
+		used : float
+			used capacity since the last update
+		queue : int
+			in-flight requests since the last update
+		state : str
+			state since the last update
+		near : bool
+			True if the available capacity is under the wake-up threshold since the last
+			update
+		used_area : float
+			integral of the used capacity over the interval
+		queue_area : float
+			integral of the in-flight requests over the interval
+		near_time : float
+			time spent under the wake-up threshold in the interval
+		state_time : dict
+			time spent in each state in the interval
+
+	Methods
+	-------
+		update(now, used, queue, state, near)
+			record a change of the server
+		load(dt, used, queue)
+			add a load the server does not report
+		collect(now)
+			integrals of the interval ending now, and start a new interval
+
+	"""
+	def __init__(self, capacity, now=0., state='active'):
+		self.capacity = capacity
+		self.start = now
+		self.last = now
+		self.used = 0.
+		self.queue = 0
+		self.state = state
+		self.near = False
+		self.used_area = 0.
+		self.queue_area = 0.
+		self.near_time = 0.
+		self.state_time = {'active':0., 'completing':0., 'idle':0.}
+
+
+	def update(self, now, used, queue, state, near):
+		"""Record a change of the server. The previous values are accumulated until now.
+
+		Parameters
+		----------
+			now : float
+				simulated time
+			used : float
+				used capacity in bits per second
+			queue : int
+				in-flight requests
+			state : str
+				'active', 'completing' or 'idle'
+			near : bool
+				True if the available capacity is under the wake-up threshold
+
+		"""
+		dt = now - self.last
+		if dt > 0:
+			self.used_area += dt*self.used
+			self.queue_area += dt*self.queue
+			self.state_time[self.state] += dt
+			if self.near:
+				self.near_time += dt
+			self.last = now
+		self.used = used
+		self.queue = queue
+		self.state = state
+		self.near = near
+
+
+	def load(self, dt, used, queue):
+		"""Add a load the server does not report, e.g. the requests of the fluid
+		approximation of the Hybrid class, on top of the reported values.
+
+		Parameters
+		----------
+			dt : float
+				duration of the load in seconds
+			used : float
+				mean used capacity in bits per second
+			queue : float
+				mean in-flight requests
+
+		"""
+		self.used_area += dt*used
+		self.queue_area += dt*queue
+
+
+	def collect(self, now):
+		"""Integrals of the interval ending now, and start a new interval.
+
+		Parameters
+		----------
+			now : float
+				simulated time
+
+		Returns
+		-------
+			dict
+				'time' (length of the interval the server existed in), 'used', 'queue',
+				'near' and one key per state with their integrals
+
+		"""
+		self.update(now, self.used, self.queue, self.state, self.near)
+		res = {
+			'time':now - self.start,
+			'used':self.used_area/self.capacity,
+			'queue':self.queue_area,
+			'near':self.near_time
+		}
+		res.update(self.state_time)
+		self.start = now
+		self.used_area = 0.
+		self.queue_area = 0.
+		self.near_time = 0.
+		self.state_time = {'active':0., 'completing':0., 'idle':0.}
+		return res
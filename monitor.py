@@ -0,0 +1,68 @@
+import time
+import sys
+
+# The --once option can be placed anywhere
+args = [a for a in sys.argv[1:] if a != '--once']
+once = '--once' in sys.argv
+
+if len(args) > 1:
+	print "usage: python monitor.py [<refresh>] [--once]"
+	print """
+Live table of the simulations started with the --live option, refreshed every
+<refresh> seconds (default 2). The runs publish their counters in a shared memory
+region (METRICS_* parameters in lib/config.py), which is read without copying the
+data or parsing any output. A run whose counters are not updated for METRICS_STALE
+seconds is marked as stale. The --once option prints the table once.
+	"""
+	exit()
+else:
+	import os
+
+	from lib.metrics import Region, defaultPath
+	from lib.scenario import Scenario
+
+	sc = Scenario()
+	refresh = float(args[0]) if args else 2.
+	path = sc.METRICS_FILE or defaultPath()
+	if not os.path.exists(path):
+		print "no live runs ({} not found)".format(path)
+		exit()
+	region = Region(path, sc.METRICS_SLOTS)
+
+	try:
+		while True:
+			rows = region.snapshot()
+			now = time.time()
+			lines = ["{:>7} {:<24}{:>9}{:>7}{:>11}{:>8}{:>10}{:>7}{:>10}  {}".format(
+				'pid', 'run', 'simtime', '%', 'sessions', 'local%', 'cost', 'active',
+				'events/s', ''
+			)]
+			for row in sorted(rows, key=lambda r:r['label']):
+				hours, rest = divmod(int(row['simtime']), 3600)
+				lines.append(
+					"{:>7} {:<24}{:>6}:{:02d}{:>7.1f}{:>11.0f}{:>8.1f}{:>10.3f}{:>7.0f}{:>10.0f}  {}".format(
+						row['pid'],
+						row['label'],
+						hours,
+						rest//60,
+						100*row['simtime']/row['horizon'] if row['horizon'] else 0.,
+						row['sessions'],
+						row['local'],
+						row['cost'],
+						row['active'],
+						row['eps'],
+						"stale" if now - row['beat'] > sc.METRICS_STALE else ""
+					)
+				)
+			lines.append("{} live runs - {}".format(len(rows), time.strftime("%H:%M:%S")))
+			if once:
+				print "\n".join(lines)
+				break
+			# clear the terminal and redraw the table
+			sys.stdout.write("\x1b[2J\x1b[H" + "\n".join(lines) + "\n")
+			sys.stdout.flush()
+			time.sleep(refresh)
+	except KeyboardInterrupt:
+		pass
+	finally:
+		region.close()
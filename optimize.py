@@ -0,0 +1,52 @@
+import time
+import csv
+import sys
+
+# The --hybrid and --db=<path> options can be placed anywhere
+args = [a for a in sys.argv[1:] if a != '--hybrid' and not a.startswith('--db=')]
+hybrid = '--hybrid' in sys.argv
+database = ([a[5:] for a in sys.argv[1:] if a.startswith('--db=')] or [None])[-1]
+
+if len(args) not in (1, 2):
+	print "usage: python optimize.py <exp> [<workers>] [--hybrid] [--db=<path>]"
+	print """
+Search the thresholds (MAX_L, CANIDLE_L, MIN_L, MAX_H, CANIDLE_H, MIN_H), START_ACTIVE
+and MIN_ACTIVE of the dynamic server allocation minimizing the total cost with an
+average session time below OPT_MAX_SESSION, by successive halving (OPT_* parameters
+in lib/config.py). The candidates of each rung are simulated in parallel by workers
+processes (one per CPU by default) with the wake up strategy exp. The shortened rungs
+end with the busiest hour of the day, so every candidate is ranked under peak load.
+The --hybrid option simulates the candidates with the hybrid fluid/discrete-event
+engine. The Pareto front is saved in the output folder.
+The --db option records every evaluation in a SQLite database, written concurrently
+by the workers.
+	"""
+	exit()
+else:
+	from lib.scenario import Scenario
+	from lib.optimizer import Optimizer, THRESHOLDS
+
+	exp = int(args[0])
+	workers = int(args[1]) if len(args) == 2 else None
+	sc = Scenario()
+	opt = Optimizer(sc, exp, workers, hybrid, database)
+
+	start = time.time()
+	front = opt.run()
+	print opt.report()
+	print "{:.2f} s".format(time.time() - start)
+
+	names = [name for names in THRESHOLDS for name in names]
+	with open("output/pareto_dynamic0{}.csv".format(exp), "wb") as f:
+		writer = csv.writer(f)
+		writer.writerow(['candidate', 'tot.cost', 'avg.sess.time'] + names + [
+			'START_ACTIVE.' + u for u in sc.COUNTRY] + [
+			'MIN_ACTIVE.' + u for u in sc.COUNTRY])
+		for res in front:
+			values = opt.candidates[res['id']]
+			writer.writerow(
+				[res['id'], res['cost'], res['session']]
+				+ [values[name] for name in names]
+				+ [values['START_ACTIVE'][u] for u in sc.COUNTRY]
+				+ [values['MIN_ACTIVE'][u] for u in sc.COUNTRY]
+			)
@@ -0,0 +1,47 @@
+import time
+import csv
+import sys
+
+# The --hybrid and --db=<path> options can be placed anywhere
+args = [a for a in sys.argv[1:] if a != '--hybrid' and not a.startswith('--db=')]
+hybrid = '--hybrid' in sys.argv
+database = ([a[5:] for a in sys.argv[1:] if a.startswith('--db=')] or [None])[-1]
+
+if len(args) not in (1, 2, 3):
+	print "usage: python plan.py <exp> [<target>] [<workers>] [--hybrid] [--db=<path>]"
+	print """
+Search the fewest servers per country of the dynamic CDN keeping the PLAN_QUANTILE
+quantile of the session time of every interval under target seconds (PLAN_TARGET by
+default), for the CONV and TRAFFIC of lib/config.py: SERVERS_DYN then MIN_ACTIVE, with
+the wake up strategy exp. The countries are bisected in parallel by workers processes
+(one per CPU by default), a candidate is aborted at its first interval over the target.
+The static CDN is not supported, as it deploys a new server whenever all of them are
+busy.
+The outcomes of the runs are kept in PLAN_CACHE, so the later searches of the same
+scenario, e.g. with another target, only simulate what they cannot deduce from them.
+The --hybrid option simulates the candidates with the hybrid fluid/discrete-event
+engine. The --db option records every run in a SQLite database.
+	"""
+	exit()
+else:
+	from lib.scenario import Scenario
+	from lib.capacity import CapacityPlanner
+
+	exp = int(args[0])
+	target = float(args[1]) if len(args) >= 2 else None
+	workers = int(args[2]) if len(args) == 3 else None
+	sc = Scenario()
+	planner = CapacityPlanner(sc, exp, target, workers, hybrid, database)
+
+	start = time.time()
+	best = planner.run()
+	print planner.report()
+	print "{:.2f} s".format(time.time() - start)
+
+	if best is not None:
+		with open("output/plan_dynamic0{}.csv".format(exp), "wb") as f:
+			writer = csv.writer(f)
+			writer.writerow(['parameter', 'country', 'servers'])
+			for key in sorted(best):
+				name, sep, u = key.partition('.')
+				writer.writerow([name, u, best[key]])
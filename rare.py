@@ -0,0 +1,28 @@
+import time
+import sys
+
+if len(sys.argv) not in (3, 4) or sys.argv[1] not in ('static', 'dynamic'):
+	print "usage: python rare.py <static|dynamic> <exp> [<horizon>]"
+	print """
+Estimate the probability of a rare event within the horizon (seconds, SIMTIME by
+default) by fixed splitting on the global utilization of the CDN:
+static  - a new server has to be deployed
+dynamic - a request finds all the servers busy and the client retries
+The trajectories are cloned at the SPLIT_LEVELS crossings (SPLIT_* parameters in
+lib/config.py). Unix systems only, the clones are forked processes.
+	"""
+	exit()
+else:
+	from lib.scenario import Scenario
+	from lib.splitting import Splitting
+
+	values = {'VERBOSE':False}
+	if len(sys.argv) == 4:
+		values['SIMTIME'] = float(sys.argv[3])
+	sc = Scenario(**values)
+	split = Splitting(sc, sys.argv[1], int(sys.argv[2]))
+
+	start = time.time()
+	split.estimate(sc.SPLIT_ROOTS, sc.SPLIT_CONFIDENCE)
+	print split.report(sc.SPLIT_CONFIDENCE)
+	print "{:.2f} s".format(time.time() - start)
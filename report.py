@@ -0,0 +1,57 @@
+import glob
+import csv
+import sys
+
+# The --plot option can be placed anywhere
+args = [a for a in sys.argv[1:] if a != '--plot']
+plot = '--plot' in sys.argv
+
+if any(not a.endswith(('.csv', '.db')) for a in args):
+	print "usage: python report.py [<file> ...] [--plot]"
+	print """
+Aggregate the runs of many simulations by strategy. The files are .csv dataframes
+saved by static.py and dynamic.py, grouped by name (e.g. the 2_static01.csv files of
+the output folders of a sweep), or databases written with the --db option. Without
+files the dataframes of the output folder are read.
+The runs of each strategy are aligned on the interval index. For avg.sess.time,
+local.req, tot.cost, the active servers and the clients, in total and per country,
+the mean over the runs with its confidence interval and the quantiles over all the
+intervals are printed and saved in output/summary.csv (REPORT_* parameters in
+lib/config.py).
+The --plot option saves a figure per global metric in the output folder, with the
+mean of each strategy per interval and its confidence band.
+	"""
+	exit()
+else:
+	from timeit import default_timer as timer
+
+	from lib.aggregate import loadCSV, loadDatabase, summarize, table, METRICS
+	from lib.aggregate import plot as plotMetrics
+	from lib.scenario import Scenario
+
+	sc = Scenario()
+	if not args:
+		args = sorted(glob.glob("output/2_*.csv"))
+
+	start = timer()
+	groups = loadCSV([a for a in args if a.endswith('.csv')])
+	for path in args:
+		if path.endswith('.db'):
+			for label, group in loadDatabase(path).items():
+				# the runs of a database are kept apart from the .csv ones
+				groups[label + (" (db)" if label in groups else "")] = group
+	summary = summarize(groups, sc.REPORT_CONFIDENCE, sc.REPORT_QUANTILES)
+	print table(summary, sc.REPORT_QUANTILES)
+	print "{} runs aggregated in {:.2f} s".format(
+		sum(len(g.values()[0]) for g in groups.values() if g), timer() - start
+	)
+
+	keys = ['q{:g}'.format(p) for p in sc.REPORT_QUANTILES]
+	with open("output/summary.csv", "wb") as f:
+		writer = csv.writer(f)
+		writer.writerow(['strategy', 'metric', 'runs', 'mean', 'ci'] + keys)
+		for res in summary:
+			writer.writerow([res[key] for key in ['strategy', 'metric', 'runs', 'mean', 'ci'] + keys])
+	if plot:
+		for path in plotMetrics(groups, METRICS, sc.REPORT_CONFIDENCE, "output"):
+			print "saved {}".format(path)
@@ -0,0 +1,105 @@
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+import multiprocessing
+import signal
+import json
+import sys
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+	daemon_threads = True
+
+
+class Handler(BaseHTTPRequestHandler):
+	"""POST /run submits a scenario and streams its results, GET /status reports the
+	number of workers and of running jobs.
+
+	"""
+	def do_GET(self):
+		if self.path != '/status':
+			self.send_error(404)
+			return
+		self.reply(200, service.status())
+
+
+	def do_POST(self):
+		if self.path != '/run':
+			self.send_error(404)
+			return
+		try:
+			length = int(self.headers.getheader('content-length', 0))
+			body = json.loads(self.rfile.read(length) or '{}')
+			job_id = service.submit(
+				body.get('kind', 'static'),
+				int(body.get('exp', 1)),
+				body.get('config'),
+				body.get('seed')
+			)
+		except ValueError as e:
+			self.reply(400, {'error':str(e)})
+			return
+
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/x-ndjson')
+		self.end_headers()
+		# one JSON object per line, flushed as soon as a row is produced
+		try:
+			for kind, content in service.stream(job_id):
+				self.wfile.write(json.dumps({kind:content}, default=toJSON) + '\n')
+				self.wfile.flush()
+		except IOError:
+			# the client disconnected, the simulation is not needed anymore
+			service.cancel(job_id)
+
+
+	def reply(self, code, content):
+		self.send_response(code)
+		self.send_header('Content-Type', 'application/json')
+		self.end_headers()
+		self.wfile.write(json.dumps(content) + '\n')
+
+
+	def log_message(self, format, *args):
+		pass
+
+
+def toJSON(obj):
+	"""Convert the NumPy scalars stored in the dataframe rows.
+
+	"""
+	return obj.item()
+
+
+if len(sys.argv) > 3:
+	print "usage: python serve.py [<port>] [<workers>]"
+	print """
+Run a local simulation service on 127.0.0.1:<port> (default 8000) with a pool of
+warm workers (default: number of CPUs), which import the simulators only once.
+POST /run with a JSON body submits a scenario:
+	{"kind": "static", "exp": 1, "config": {"CONV": 1e-5, "SIMTIME": 7200}, "seed": 1}
+config overrides the lib.config parameters, DAILY_USERS is recomputed from CONV.
+The response streams one JSON object per line: {"row": {...}} for each acquisition
+interval, then {"end": {...}} or {"error": "..."}. A run is stopped when its client
+disconnects, and ends with an error if its worker dies.
+GET /status returns the number of workers and of running jobs.
+	"""
+	exit()
+else:
+	from lib.service import Service
+
+	port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+	workers = int(sys.argv[2]) if len(sys.argv) > 2 else multiprocessing.cpu_count()
+
+	service = Service(workers)
+	# the workers are stopped on SIGTERM too
+	signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+	server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+	print "Serving on 127.0.0.1:{} with {} workers".format(port, workers)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		service.close()